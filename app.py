@@ -1,14 +1,156 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory
 from flask_cors import CORS
-import requests
+from werkzeug.wsgi import ClosingIterator
+import collections
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import logging
 import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from lib.apt_parser import AptParser
-import io
-import gzip
+from lib.cache import CacheEntry, IndexCache, ParsedCache, SingleFlight
+from lib.index_file import IndexFormatError, open_index, write_index
+from lib.metrics import BYTES_BUCKETS, Counter, Histogram, SampledLogger, TimedIterator, host_of, render
+from lib.package_index import INDEX_FIELDS, PackageIndex, SearchError, diff_indexes
+from lib.pdiff import PDiffError, PDiffIndex, apply_ed_patch
+from lib.prefetch import PrefetchScheduler, parse_targets
+from lib.upstream import (
+    CHUNK_SIZE, SharedStream, UpstreamError, compression_for_url, configure_pool, iter_decompress,
+    iter_gzip, open_stream, open_upstream
+)
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 CORS(app)
 
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+log = logging.getLogger('webapt')
+# Per-request messages are logged at debug level, and only a sample of them
+request_log = SampledLogger(log, rate=float(os.environ.get('LOG_SAMPLE_RATE', 1)))
+
+REQUEST_SECONDS = Histogram('webapt_request_seconds', 'Time until the response headers are ready',
+                            ['endpoint', 'status'])
+PROXY_REQUESTS = Counter('webapt_proxy_requests', 'Proxy requests by upstream host and cache result',
+                         ['host', 'cache'])
+PROXY_RESPONSE_BYTES = Histogram('webapt_proxy_response_bytes', 'Size of /proxy bodies sent to clients',
+                                 ['host', 'encoding'], BYTES_BUCKETS)
+FETCH_REQUESTS = Counter('webapt_fetch_requests', 'Upstream file lookups for the API by cache result',
+                         ['host', 'cache'])
+DOWNLOAD_SECONDS = Histogram('webapt_upstream_download_seconds', 'Time spent reading upstream bodies', ['host'])
+DOWNLOAD_BYTES = Histogram('webapt_upstream_download_bytes', 'Size of upstream bodies as transferred',
+                           ['host'], BYTES_BUCKETS)
+DECOMPRESS_SECONDS = Histogram('webapt_decompress_seconds', 'Time spent decompressing upstream bodies',
+                               ['host', 'compression'])
+PARSE_SECONDS = Histogram('webapt_parse_seconds', 'Time spent parsing Packages files in AptParser', ['host'])
+INDEX_BUILD_SECONDS = Histogram('webapt_index_build_seconds', 'Time spent building package indexes from records',
+                                ['host'])
+
+# Keep-alive connections to upstream mirrors are pooled and shared by all threads
+configure_pool(
+    pool_hosts=int(os.environ.get('UPSTREAM_POOL_HOSTS', 10)),
+    per_host=int(os.environ.get('UPSTREAM_POOL_PER_HOST', 20)),
+    pool_timeout=float(os.environ.get('UPSTREAM_POOL_TIMEOUT', 10))
+)
+
+# Upstream files are cached by URL and revalidated once older than CACHE_TTL
+index_cache = IndexCache(
+    ttl=int(os.environ.get('CACHE_TTL', 300)),
+    max_bytes=int(os.environ.get('CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    directory=os.environ.get('CACHE_DIR') or None
+)
+
+# Parsed package indexes, tied to the cache entry they were built from
+# (one per Packages file and one per merged selection); large enough for
+# every file of a Debian archive's "all" x "all" selection
+parsed_indexes = ParsedCache(max_entries=int(os.environ.get('INDEX_CACHE_ENTRIES', 64)))
+
+# Parsed Release files as (fields, checksums), tied to their cache entry
+parsed_releases = ParsedCache(max_entries=64)
+
+# Bounded pool used to fetch and parse several Packages files concurrently
+load_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('LOAD_WORKERS', 8)),
+    thread_name_prefix='loader'
+)
+
+# Variants of a Packages file that may be listed in a Release file
+PACKAGES_VARIANTS = (('', None), ('.gz', 'gz'), ('.xz', 'xz'), ('.bz2', 'bz2'))
+
+# Beyond this many PDiff patches a full download is usually cheaper
+MAX_PDIFF_PATCHES = 50
+
+# Release checksum fields and the matching hashlib names
+HASH_ALGORITHMS = {'SHA256': 'sha256', 'SHA1': 'sha1', 'MD5Sum': 'md5'}
+
+# Human readable names of the compressions, used in messages
+COMPRESSION_NAMES = {'gz': 'gzipped', 'xz': 'xz-compressed', 'bz2': 'bzip2-compressed'}
+
+# In-flight upstream requests and index builds, shared by concurrent callers
+proxy_flights = SingleFlight()
+fetch_flights = SingleFlight()
+index_flights = SingleFlight()
+discovery_flights = SingleFlight()
+
+# URL -> SharedStream of /proxy bodies that are being streamed
+proxy_streams = {}
+proxy_streams_lock = threading.Lock()
+
+# Smallest response body worth compressing for the browser
+MIN_COMPRESS_SIZE = 1024
+
+# Upper bound for the per_page parameter of the JSON API
+MAX_PAGE_SIZE = 500
+
+# Distributions probed on every repository, besides those in a /dists/ listing
+KNOWN_DISTS = (
+    'stable', 'testing', 'unstable', 'oldstable', 'experimental',
+    'forky', 'trixie', 'bookworm', 'bullseye', 'buster',
+    'questing', 'plucky', 'oracular', 'noble', 'jammy', 'focal', 'bionic',
+)
+
+# Companion suites probed for every distribution found
+DIST_SUFFIXES = ('-updates', '-backports', '-security')
+
+# Release fields that list files rather than describe the distribution
+RELEASE_FILE_LISTS = ('MD5Sum', 'SHA1', 'SHA256', 'SHA512')
+
+# Discovered distributions by repository, as (expiry, summaries); kept
+# for CACHE_TTL like the files they were read from
+discovered_dists = ParsedCache(max_entries=64)
+
+def start_prefetch():
+    """
+    Keep the repositories listed in PREFETCH_REPOS warm in the background
+
+    Every server process starts a scheduler, but only the one holding the
+    lock file (PREFETCH_LOCK, else prefetch.lock in CACHE_DIR) polls, so
+    mirrors are not polled once per worker. Without a lock file every
+    process polls on its own.
+    """
+    targets = parse_targets(os.environ.get('PREFETCH_REPOS', ''))
+    if not targets:
+        return None
+    lock_path = os.environ.get('PREFETCH_LOCK') or None
+    if lock_path is None and index_cache.directory:
+        lock_path = os.path.join(index_cache.directory, 'prefetch.lock')
+    scheduler = PrefetchScheduler(
+        targets,
+        fetch_release=lambda repo, dist: fetch_release(repo, dist, revalidate=True),
+        load=load_selection,
+        interval=float(os.environ.get('PREFETCH_INTERVAL', 600)),
+        jitter=float(os.environ.get('PREFETCH_JITTER', 0.1)),
+        max_workers=int(os.environ.get('PREFETCH_WORKERS', 2)),
+        lock_path=lock_path
+    )
+    scheduler.start()
+    return scheduler
+
 @app.route('/')
 def index():
     """Serve the main HTML page"""
@@ -18,65 +160,1157 @@ def index():
 def config():
     """Return configuration values from environment variables"""
     return jsonify({
-        'APTREPO': os.environ.get('APTREPO', '')
+        'APTREPO': os.environ.get('APTREPO', ''),
+        'PREFETCH_REPOS': [target._asdict() for target in parse_targets(os.environ.get('PREFETCH_REPOS', ''))]
     })
 
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('started', None)
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, request.endpoint or 'none', response.status_code)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """
+    Gzip larger buffered responses (JSON API, /config) for clients that
+    accept it, and answer If-None-Match with 304 using a strong ETag of
+    the body. Responses that set their own ETag, streams and static files
+    are left alone.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'ETag' in response.headers or 'Content-Encoding' in response.headers):
+        return response
+    compressible = response.mimetype == 'application/json' or response.mimetype.startswith('text/')
+    if compressible and accepts_gzip() and (response.content_length or 0) >= MIN_COMPRESS_SIZE:
+        response.set_data(b''.join(iter_gzip([response.get_data()])))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.headers.setdefault('Cache-Control', 'no-cache')
+    response.add_etag()
+    return response.make_conditional(request)
+
+def accepts_gzip():
+    """Whether the current request accepts a gzip-encoded response"""
+    return request.accept_encodings['gzip'] > 0
+
 @app.route('/proxy')
 def proxy():
     """
     Proxy requests to APT repositories to avoid CORS issues
+
+    The upstream body is streamed to the client chunk by chunk; compressed
+    files (.gz, .xz, .bz2) are decompressed on the fly, so memory use does
+    not grow with the size of the Packages file.
+
+    Clients that accept gzip get a gzip-encoded body instead: gzipped
+    upstream files are passed through without inflating them, other files
+    are compressed on the fly. Successful responses carry an ETag tied to
+    the cached copy, and a client that already has it gets a 304.
     """
     target_url = request.args.get('url')
     
     if not target_url:
         return jsonify({'error': 'Missing url parameter'}), 400
     
-    try:
-        print(f"Proxying request to: {target_url}")
-        response = requests.get(
-            target_url, 
-            headers={'User-Agent': 'APT-Repository-Previewer/1.0'},
-            timeout=(3.05, 10)  # (connect_timeout, read_timeout) in seconds
-        )
-        
-        # Pass through the original status code from the upstream server
-        status_code = response.status_code
-        print(f"Received status code {status_code} from {target_url}")
-        
-        # Check if the response is a gzipped file
-        if target_url.endswith('.gz') and status_code == 200:
+    headers = {
+        'Content-Type': 'text/plain',
+        'Access-Control-Allow-Origin': '*'
+    }
+
+    cached = index_cache.get(target_url)
+    if cached is not None and index_cache.is_fresh(cached):
+        request_log.debug("Serving %s from cache", target_url)
+        return _serve_cached(cached, 'HIT', headers)
+
+    # Concurrent requests for the same URL share one upstream request, and
+    # requests arriving while its body is streamed join that stream
+    reader = None
+    while reader is None:
+        flight, status_code = proxy_streams.get(target_url), 200
+        if flight is None:
             try:
-                print(f"Decompressing gzipped content from {target_url}")
-                # Decompress the gzipped content
-                gzip_content = io.BytesIO(response.content)
-                with gzip.GzipFile(fileobj=gzip_content, mode='rb') as f:
-                    decompressed_content = f.read().decode('utf-8')
-                print(f"Successfully decompressed content from {target_url}")
-                return decompressed_content, status_code, {
-                    'Content-Type': 'text/plain',
-                    'Access-Control-Allow-Origin': '*'
-                }
-            except Exception as gz_error:
-                print(f"Error decompressing content from {target_url}: {str(gz_error)}")
+                status_code, source, x_cache = proxy_flights.do(target_url, _open_proxy_stream, target_url, cached)
+            except UpstreamError as e:
+                log.warning("Error proxying request to %s: %s", target_url, e)
+                PROXY_REQUESTS.inc(host_of(target_url), 'ERROR')
+                return jsonify({'error': f'Error fetching from repository: {str(e)}'}), e.status_code
+            except Exception as e:
+                log.error("Error proxying request to %s: %s", target_url, e)
+                PROXY_REQUESTS.inc(host_of(target_url), 'ERROR')
                 return jsonify({
-                    'error': f'Error decompressing gzipped content: {str(gz_error)}'
+                    'error': f'Error fetching from repository: {str(e)}'
                 }), 500
-        
-        return response.text, status_code, {
-            'Content-Type': 'text/plain',
-            'Access-Control-Allow-Origin': '*'
+            if isinstance(source, dict):
+                return jsonify(source), status_code
+            if isinstance(source, CacheEntry):
+                return _serve_cached(source, x_cache, headers)
+            flight = source
+        # None if every reader left before the end and the download was
+        # abandoned, or if too much of the body has gone by to keep it for
+        # new readers; start over with a download of our own in that case
+        reader = flight[0].reader()
+        if reader is None:
+            _end_proxy_stream(target_url, flight[0])
+
+    headers['X-Cache'] = 'MISS'
+    host = host_of(target_url)
+    PROXY_REQUESTS.inc(host, 'MISS')
+    stream, version, gzipped = flight
+    if status_code != 200:
+        return Response(reader, status_code, headers)
+
+    use_gzip = accepts_gzip()
+    tag = version + ('-gz' if gzipped else '-gzip') if use_gzip else version
+    headers.update(_caching_headers(tag, index_cache.ttl))
+    if request.if_none_match.contains_weak(tag):
+        reader.close()
+        return '', 304, headers
+
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+        body = reader if gzipped else ClosingIterator(iter_gzip(reader), reader.close)
+    else:
+        body = ClosingIterator(_gunzip_for_client(reader, target_url), reader.close) if gzipped else reader
+    # Size is recorded once the body has been sent
+    sent = TimedIterator(body)
+    encoding = 'gzip' if use_gzip else 'identity'
+    body = ClosingIterator(sent, lambda: PROXY_RESPONSE_BYTES.observe(sent.bytes, host, encoding))
+    return Response(body, status_code, headers)
+
+def _serve_cached(entry, x_cache, headers):
+    """
+    Respond with a cached body, gzip-encoded if the client accepts it
+    """
+    headers = dict(headers, **{'X-Cache': x_cache})
+    host = host_of(entry.key)
+    PROXY_REQUESTS.inc(host, x_cache)
+    use_gzip = accepts_gzip()
+    gzip_entry = _gzip_entry(entry) if use_gzip else None
+    if gzip_entry is not None:
+        tag = gzip_entry.version
+    else:
+        tag = entry.version + '-gzip' if use_gzip else entry.version
+    headers.update(_caching_headers(tag, index_cache.ttl - (time.time() - entry.fetched_at)))
+    if request.if_none_match.contains_weak(tag):
+        return '', 304, headers
+
+    if not use_gzip:
+        PROXY_RESPONSE_BYTES.observe(entry.size, host, 'identity')
+        return entry.body, 200, headers
+    if gzip_entry is None:
+        # Compressed once and kept next to the plain copy
+        gzip_entry = index_cache.put(f'gzip:{entry.key}', b''.join(iter_gzip([entry.body])), version=tag)
+        body = gzip_entry.body if gzip_entry is not None else b''.join(iter_gzip([entry.body]))
+    else:
+        body = gzip_entry.body
+    headers['Content-Encoding'] = 'gzip'
+    PROXY_RESPONSE_BYTES.observe(len(body), host, 'gzip')
+    return body, 200, headers
+
+def _gzip_entry(entry):
+    """
+    The cached gzip encoding of ``entry``: the upstream .gz file
+    ("<version>-gz") or our own compression ("<version>-gzip")
+    """
+    gzip_entry = index_cache.get(f'gzip:{entry.key}')
+    if gzip_entry is None or gzip_entry.version.rsplit('-', 1)[0] != entry.version:
+        return None
+    return gzip_entry
+
+def _caching_headers(tag, max_age):
+    return {
+        'ETag': f'"{tag}"',
+        'Cache-Control': f'max-age={max(0, int(max_age))}',
+        'Vary': 'Accept-Encoding',
+    }
+
+def _gunzip_for_client(chunks, target_url):
+    """Inflate a passed-through gzip stream for clients without gzip support"""
+    try:
+        yield from iter_decompress(chunks, 'gz')
+    except Exception as e:
+        log.warning("Error decompressing content from %s: %s", target_url, e)
+
+def _open_proxy_stream(target_url, cached):
+    """
+    Open the upstream request for /proxy.
+
+    Returns the status code to send and either the revalidated cache
+    entry, an error payload or a (SharedStream, version, gzipped) tuple,
+    plus the X-Cache value. The stream carries the upstream bytes of
+    gzipped files and the decompressed body otherwise; ``version`` is the
+    version of the cache entry the body will be stored as.
+    """
+    request_log.debug("Proxying request to: %s", target_url)
+    response = open_upstream(
+        target_url,
+        headers=cached.conditional_headers() if cached is not None else None
+    )
+
+    # Pass through the original status code from the upstream server
+    status_code = response.status_code
+    request_log.debug("Received status code %d from %s", status_code, target_url)
+
+    if status_code == 304 and cached is not None:
+        # Our copy is still current upstream; skip download and decompression
+        response.close()
+        return 200, index_cache.touch(target_url) or cached, 'REVALIDATED'
+
+    cache_key = target_url if status_code == 200 else None
+    version = uuid.uuid4().hex
+
+    # Check if the response is a compressed file (.gz, .xz or .bz2)
+    compression = compression_for_url(target_url)
+    if compression and status_code == 200:
+        request_log.debug("Decompressing %s content from %s", COMPRESSION_NAMES[compression], target_url)
+        raw = TimedIterator(response.iter_content(CHUNK_SIZE))
+        # Upstream gzip bytes are forwarded as they are read
+        passthrough = collections.deque() if compression == 'gz' else None
+        chunks = TimedIterator(iter_decompress(
+            _tee_chunks(raw, passthrough) if passthrough is not None else raw, compression
+        ))
+        try:
+            # Decompress up to the first output block before committing
+            # to a 200 response, so corrupt files still yield an error
+            first_block = next(chunks, b'')
+        except Exception as gz_error:
+            response.close()
+            log.warning("Error decompressing content from %s: %s", target_url, gz_error)
+            return 500, {
+                'error': f'Error decompressing {COMPRESSION_NAMES[compression]} content: {str(gz_error)}'
+            }, None
+        body = _stream_body(response, chunks, first_block, target_url, cache_key, version, passthrough)
+    else:
+        raw = chunks = TimedIterator(response.iter_content(CHUNK_SIZE))
+        body = _stream_body(response, raw, b'', target_url, cache_key, version)
+
+    def finish(finished):
+        _end_proxy_stream(target_url, finished)
+        observe_download(target_url, raw, chunks, compression)
+
+    # Late joiners are only served from memory while the body is within
+    # the cache budget; beyond it chunks are dropped once everyone has them
+    if status_code != 200:
+        return status_code, (SharedStream(body, on_finish=finish, max_buffer=index_cache.max_bytes),
+                             version, False), 'MISS'
+    stream = SharedStream(body, on_finish=finish, max_buffer=index_cache.max_bytes)
+    flight = (stream, version, compression == 'gz')
+    with proxy_streams_lock:
+        proxy_streams[target_url] = flight
+    return status_code, flight, 'MISS'
+
+def observe_download(url, raw, decompressed, compression):
+    """
+    Record the transfer time and size of an upstream body read through
+    the TimedIterator ``raw``, and the decompression time measured by
+    ``decompressed`` (which reads from ``raw``)
+    """
+    host = host_of(url)
+    DOWNLOAD_SECONDS.observe(raw.seconds, host)
+    DOWNLOAD_BYTES.observe(raw.bytes, host)
+    if compression:
+        DECOMPRESS_SECONDS.observe(max(0.0, decompressed.seconds - raw.seconds), host, compression)
+
+def _end_proxy_stream(target_url, stream):
+    """Stop offering a finished, abandoned or full stream to new requests"""
+    with proxy_streams_lock:
+        flight = proxy_streams.get(target_url)
+        if flight is not None and flight[0] is stream:
+            del proxy_streams[target_url]
+
+def _tee_chunks(chunks, pending):
+    """Pass chunks on while also appending them to ``pending``"""
+    for chunk in chunks:
+        pending.append(chunk)
+        yield chunk
+
+def _stream_body(response, chunks, first_block, target_url, cache_key=None, version=None, passthrough=None):
+    """
+    Yield the proxied body and release the upstream connection when done.
+
+    When ``cache_key`` is set the body is also collected and stored in the
+    cache, as ``version``, once it has been streamed completely. With a
+    ``passthrough`` queue of upstream gzip chunks those are yielded (and
+    cached as the gzip encoding) while ``chunks`` is only decompressed
+    for the cache.
+    """
+    collected = [] if cache_key else None
+    passed = [] if cache_key and passthrough is not None else None
+    collected_size = 0
+    try:
+        for data in itertools.chain([first_block] if first_block else [], chunks):
+            if collected is not None:
+                collected_size += len(data)
+                if collected_size > index_cache.max_bytes:
+                    # Too large to cache; keep streaming without collecting
+                    collected = passed = None
+                else:
+                    collected.append(data)
+            if passthrough is None:
+                yield data
+            yield from _drain(passthrough, passed)
+        yield from _drain(passthrough, passed)
+        if collected is not None:
+            entry = index_cache.put(cache_key, b''.join(collected),
+                                    etag=response.headers.get('ETag'),
+                                    last_modified=response.headers.get('Last-Modified'),
+                                    version=version)
+            if entry is not None and passed is not None:
+                index_cache.put(f'gzip:{cache_key}', b''.join(passed), version=f'{version}-gz')
+    except Exception as e:
+        # Headers are already sent at this point, so the body is just cut short
+        log.warning("Error streaming content from %s: %s", target_url, e)
+    finally:
+        response.close()
+
+def _drain(pending, collected):
+    # Yield and empty a passthrough queue, optionally collecting its chunks
+    while pending:
+        chunk = pending.popleft()
+        if collected is not None:
+            collected.append(chunk)
+        yield chunk
+
+def fetch_file(url, compression='auto', cache_key=None, checksum=None, revalidate=False):
+    """
+    Fetch an upstream file through the cache.
+
+    ``compression`` defaults to guessing from the file extension. When an
+    ``(algorithm, digest)`` checksum from the Release file is given, the
+    download is verified against it and cached under that digest: such
+    content never changes, so it is served without revalidation.
+    ``revalidate`` checks a cached copy upstream even while it is fresh.
+
+    Returns the upstream status code and, on success, a cache entry holding
+    the decompressed body.
+    """
+    if compression == 'auto':
+        compression = compression_for_url(url)
+    if checksum is not None:
+        cache_key = '%s:%s' % checksum
+    cache_key = cache_key or url
+
+    cached = index_cache.get(cache_key)
+    if cached is not None and (checksum is not None or (index_cache.is_fresh(cached) and not revalidate)):
+        FETCH_REQUESTS.inc(host_of(url), 'HIT')
+        return 200, cached
+
+    # Concurrent callers for the same file wait for one download
+    return fetch_flights.do(cache_key, _download_file, url, compression, cache_key, checksum, cached)
+
+def _download_file(url, compression, cache_key, checksum, cached):
+    """Download (or revalidate) a file for fetch_file and cache it"""
+    response = open_upstream(url, headers=cached.conditional_headers() if cached is not None else None)
+    try:
+        if response.status_code == 304 and cached is not None:
+            FETCH_REQUESTS.inc(host_of(url), 'REVALIDATED')
+            # The entry may have been evicted while upstream was asked
+            return 200, index_cache.touch(cache_key) or cached
+        FETCH_REQUESTS.inc(host_of(url), 'MISS' if response.status_code == 200 else 'ERROR')
+        if response.status_code != 200:
+            return response.status_code, None
+        raw = TimedIterator(response.iter_content(CHUNK_SIZE))
+        chunks = raw
+        if checksum is not None:
+            hasher = hashlib.new(HASH_ALGORITHMS[checksum[0]])
+            chunks = _hash_chunks(chunks, hasher)
+        decompressed = TimedIterator(iter_decompress(chunks, compression))
+        body = b''.join(decompressed)
+    finally:
+        response.close()
+    observe_download(url, raw, decompressed, compression)
+
+    if checksum is not None and hasher.hexdigest() != checksum[1]:
+        # Usually a mirror in the middle of a sync
+        raise UpstreamError(url, 502, f'Checksum mismatch for {url}')
+
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    entry = index_cache.put(cache_key, body, etag=etag, last_modified=last_modified)
+    return 200, entry or CacheEntry(cache_key, body, etag, last_modified)
+
+def _hash_chunks(chunks, hasher):
+    """Feed each chunk to ``hasher`` while passing it on"""
+    for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+
+def load_release_checksums(repo, dist):
+    """
+    Return the checksum algorithm, the path -> (size, hash) index and
+    whether by-hash downloads are supported, from the Release file of a
+    distribution. Returns None if there is no usable Release file.
+    """
+    try:
+        return _load_release(repo, dist)[1]
+    except UpstreamError:
+        return None
+
+def _release_checksums(release_info):
+    for algorithm in ('SHA256', 'SHA1', 'MD5Sum'):
+        checksums = AptParser.parse_release_checksums(release_info, algorithm)
+        if checksums:
+            return algorithm, checksums, release_info.get('Acquire-By-Hash') == 'yes'
+    return None
+
+def select_packages_sources(repo, dist, component, arch, release_checksums=None):
+    """
+    List the Packages variants the Release file advertises.
+
+    Variants already in the cache come first, then the rest smallest
+    first. Each candidate is a dict with the url to download (by-hash when
+    the repository supports it), the canonical url, the compression, the
+    (algorithm, digest) checksum and the size of the uncompressed file
+    if the Release file lists it. Returns an empty list when the Release
+    file is unavailable or does not list the Packages file.
+    ``release_checksums`` is the result of load_release_checksums, if the
+    caller already has it.
+    """
+    if release_checksums is None:
+        release_checksums = load_release_checksums(repo, dist)
+    if release_checksums is None:
+        return []
+    algorithm, checksums, by_hash = release_checksums
+
+    packages_url = AptParser.build_packages_url(repo, dist, component, arch)
+    path = f"{component}/binary-{arch}/Packages"
+    uncompressed_size = checksums[path][0] if path in checksums else None
+    candidates = []
+    for extension, compression in PACKAGES_VARIANTS:
+        if path + extension not in checksums:
+            continue
+        size, digest = checksums[path + extension]
+        url = packages_url + extension
+        candidates.append({
+            'size': size,
+            'url': url,
+            'fetch_url': f"{url.rsplit('/', 1)[0]}/by-hash/{algorithm}/{digest}" if by_hash else url,
+            'compression': compression,
+            'checksum': (algorithm, digest),
+            'uncompressed_size': uncompressed_size,
+            'cached': index_cache.contains('%s:%s' % (algorithm, digest)),
+        })
+    candidates.sort(key=lambda candidate: (not candidate['cached'], candidate['size']))
+    return candidates
+
+def _packages_version(candidates):
+    # Every variant has the same content, so the index of a Packages file
+    # is kept under one checksum whichever variant is downloaded
+    return '%s:%s' % min(candidates, key=lambda candidate: (candidate['size'], candidate['url']))['checksum']
+
+def fetch_packages_file(repo, dist, component, arch, candidates=None, release_checksums=None):
+    """
+    Fetch the Packages file for one component/architecture.
+
+    Uses the smallest variant listed in the Release file, preferring its
+    by-hash location. When only an older copy is cached, it is brought up
+    to date with PDiffs if the repository publishes them. Repositories
+    without usable checksums fall back to probing Packages and
+    Packages.gz. ``candidates`` are the variants from
+    select_packages_sources and ``release_checksums`` the result of
+    load_release_checksums, if already known. Returns the URL used and
+    the cache entry.
+    """
+    index_key = AptParser.build_packages_url(repo, dist, component, arch)
+    if candidates is None:
+        candidates = select_packages_sources(repo, dist, component, arch, release_checksums)
+
+    if candidates and not candidates[0]['cached']:
+        entry = update_with_pdiff(repo, dist, component, arch, '%s:%s' % candidates[0]['checksum'],
+                                  release_checksums)
+        if entry is not None:
+            return candidates[0]['url'], entry
+
+    for candidate in candidates:
+        urls = [candidate['fetch_url']]
+        if candidate['fetch_url'] != candidate['url']:
+            urls.append(candidate['url'])
+        for url in urls:
+            try:
+                status_code, entry = fetch_file(url, compression=candidate['compression'],
+                                                checksum=candidate['checksum'])
+            except UpstreamError as e:
+                log.warning("Skipping %s: %s", url, e)
+                continue
+            if status_code == 200:
+                # Remember the newest copy as the base for future PDiff
+                # updates; usually it already is, and is not written again
+                pointer = index_cache.get(f'latest:{index_key}')
+                if pointer is None or pointer.body != entry.key.encode('utf-8'):
+                    index_cache.put(f'latest:{index_key}', entry.key.encode('utf-8'))
+                return candidate['url'], entry
+        # Listed in Release but not served (e.g. the uncompressed file on
+        # Ubuntu mirrors); try the next variant
+
+    packages_url = index_key
+    status_code, entry = fetch_file(packages_url)
+    if status_code == 404:
+        packages_url += '.gz'
+        status_code, entry = fetch_file(packages_url)
+    if status_code != 200:
+        raise UpstreamError(packages_url, status_code)
+    return packages_url, entry
+
+def update_with_pdiff(repo, dist, component, arch, cache_key, release_checksums=None):
+    """
+    Bring the last cached copy of a Packages file up to date with PDiffs.
+
+    Only the patches missing from the cached copy are downloaded. The
+    result must match the SHA256 of the uncompressed Packages file in the
+    Release file before it is stored under ``cache_key``. Returns the new
+    cache entry, or None if a full download is needed instead.
+    """
+    if release_checksums is None:
+        release_checksums = load_release_checksums(repo, dist)
+    if release_checksums is None or release_checksums[0] != 'SHA256':
+        return None
+    checksums = release_checksums[1]
+    path = f"{component}/binary-{arch}/Packages"
+    if path not in checksums or f"{path}.diff/Index" not in checksums:
+        return None
+
+    index_key = AptParser.build_packages_url(repo, dist, component, arch)
+    pointer = index_cache.get(f'latest:{index_key}')
+    base = index_cache.get(pointer.body.decode('utf-8')) if pointer is not None else None
+    if base is None:
+        return None
+
+    target_digest = checksums[path][1]
+    try:
+        base_digest = hashlib.sha256(base.body).hexdigest()
+        status_code, index_entry = fetch_file(
+            f"{index_key}.diff/Index", compression=None,
+            checksum=('SHA256', checksums[f"{path}.diff/Index"][1])
+        )
+        if status_code != 200:
+            return None
+        diff_index = PDiffIndex.parse(index_entry.body.decode('utf-8'))
+        names = diff_index.plan(base_digest)
+        if names is None or len(names) > MAX_PDIFF_PATCHES or diff_index.current[0] != target_digest:
+            return None
+
+        log.info("Updating %s with %d PDiff patch(es)", index_key, len(names))
+        lines = base.body.splitlines(keepends=True)
+        for name in names:
+            download = diff_index.downloads.get(f"{name}.gz")
+            status_code, patch = fetch_file(
+                f"{index_key}.diff/{name}.gz",
+                checksum=('SHA256', download[0]) if download else None
+            )
+            if status_code != 200:
+                return None
+            if hashlib.sha256(patch.body).hexdigest() != diff_index.patches[name][0]:
+                return None
+            apply_ed_patch(lines, patch.body)
+        body = b''.join(lines)
+    except (UpstreamError, PDiffError, ValueError, KeyError) as e:
+        log.warning("PDiff update of %s failed: %s", index_key, e)
+        return None
+
+    if hashlib.sha256(body).hexdigest() != target_digest:
+        log.warning("PDiff update of %s produced a wrong checksum", index_key)
+        return None
+
+    entry = index_cache.put(cache_key, body)
+    if entry is None:
+        return None
+    index_cache.put(f'latest:{index_key}', cache_key.encode('utf-8'))
+    return entry
+
+def load_packages_index(repo, dist, component, arch):
+    """
+    Fetch and parse the Packages file for one component/architecture.
+
+    Returns the URL that was used and the PackageIndex built from it.
+    """
+    packages_url, _, build = prepare_packages_index(repo, dist, component, arch)
+    return packages_url, build()
+
+def prepare_packages_index(repo, dist, component, arch, release_checksums=None):
+    """
+    Fetch the Packages file for one component/architecture without
+    parsing it yet.
+
+    Files that the Release file lists as larger than the cache budget
+    could not be cached anyway; they are only downloaded when the index
+    is built, and parsed while they download (see stream_packages_index).
+    With Release checksums, a file whose index is already loaded or
+    stored is not read at all: its index is opened without the body.
+
+    Returns the URL used, the version the file's index is kept under and
+    a function returning that PackageIndex, which parses the file unless
+    the index is already loaded. ``release_checksums`` is the result of
+    load_release_checksums, if the caller already has it.
+    """
+    index_key = AptParser.build_packages_url(repo, dist, component, arch)
+    candidates = select_packages_sources(repo, dist, component, arch, release_checksums)
+    packages_url, body = None, None
+    if candidates:
+        version = _packages_version(candidates)
+        if (candidates[0]['uncompressed_size'] or 0) > index_cache.max_bytes:
+            return candidates[0]['url'], version, lambda: stream_packages_index(index_key, version, candidates,
+                                                                                 component)
+        if parsed_indexes.get(index_key, version) is not None or _index_is_stored(index_key, version):
+            packages_url = candidates[0]['url']
+    if packages_url is None:
+        packages_url, entry = fetch_packages_file(repo, dist, component, arch, candidates, release_checksums)
+        body = entry.body
+        if not candidates:
+            version = entry.version
+
+    def open_body():
+        # The stored index may have been evicted since it was found
+        content = body
+        if content is None:
+            content = fetch_packages_file(repo, dist, component, arch, candidates, release_checksums)[1].body
+        return contextlib.nullcontext((io.BytesIO(content), None))
+
+    def build():
+        package_index = parsed_indexes.get(index_key, version)
+        if package_index is None:
+            # Concurrent requests for the same download parse it once
+            package_index = index_flights.do((index_key, version), _build_and_store_index,
+                                             packages_url, index_key, version, component, open_body)
+        return package_index
+    return packages_url, version, build
+
+def _index_is_stored(index_key, version):
+    index_path = index_cache.index_path(index_key, version)
+    return index_path is not None and os.path.exists(index_path)
+
+def _build_and_store_index(packages_url, index_key, version, component, open_body):
+    package_index = parsed_indexes.get(index_key, version)
+    if package_index is None:
+        package_index = parsed_indexes.put(index_key, version,
+                                           build_packages_index(packages_url, index_key, version, component,
+                                                                open_body))
+    return package_index
+
+def stream_packages_index(index_key, version, candidates, component):
+    """
+    Build the index of a Packages file that is too large to cache while
+    it downloads.
+
+    The body is decompressed and parsed chunk by chunk and never held in
+    memory as a whole; its Release checksum is verified once the download
+    is complete. The index is kept as ``version``. Raises an
+    UpstreamError if no variant could be downloaded.
+    """
+    package_index = parsed_indexes.get(index_key, version)
+    if package_index is not None:
+        return package_index
+
+    error = None
+    for candidate in candidates:
+        urls = [candidate['fetch_url']]
+        if candidate['fetch_url'] != candidate['url']:
+            urls.append(candidate['url'])
+        for url in urls:
+            try:
+                # Concurrent requests for the same file share one download
+                return index_flights.do(
+                    (index_key, version), _build_and_store_index, url, index_key, version, component,
+                    lambda: _download_stream(url, candidate['compression'], candidate['checksum'])
+                )
+            except UpstreamError as e:
+                log.warning("Skipping %s: %s", url, e)
+                # A file that exists but is broken matters more than a 404
+                if error is None or e.status_code != 404:
+                    error = e
+    raise error
+
+@contextlib.contextmanager
+def _download_stream(url, compression, checksum):
+    """
+    Open an upstream file as a binary stream of its decompressed body and
+    the TimedIterator feeding it; the checksum is verified on exit
+    """
+    response = open_upstream(url)
+    try:
+        FETCH_REQUESTS.inc(host_of(url), 'MISS' if response.status_code == 200 else 'ERROR')
+        if response.status_code != 200:
+            raise UpstreamError(url, response.status_code)
+        raw = TimedIterator(response.iter_content(CHUNK_SIZE))
+        hasher = hashlib.new(HASH_ALGORITHMS[checksum[0]])
+        decompressed = TimedIterator(iter_decompress(_hash_chunks(raw, hasher), compression))
+        yield open_stream(decompressed), decompressed
+        observe_download(url, raw, decompressed, compression)
+        if hasher.hexdigest() != checksum[1]:
+            raise UpstreamError(url, 502, f'Checksum mismatch for {url}')
+    finally:
+        response.close()
+
+def build_packages_index(packages_url, index_key, version, component, open_body):
+    """
+    Build the PackageIndex for version ``version`` of a Packages file.
+
+    ``open_body`` returns a context manager giving a binary stream of
+    the Packages file and, when that stream reads from a download, the
+    TimedIterator of the download (else None). It is only called when
+    no stored index can be opened: with a cache directory the parsed
+    index is written to disk and served memory-mapped, so other workers
+    and later restarts open it without parsing and share its pages.
+    """
+    index_path = index_cache.index_path(index_key, version)
+    if index_path is not None:
+        try:
+            return open_index(index_path)
+        except FileNotFoundError:
+            pass
+        except (OSError, IndexFormatError) as e:
+            log.warning("Ignoring index file for %s: %s", index_key, e)
+
+    log.info("Parsing packages from %s", packages_url)
+    started = time.perf_counter()
+    with open_body() as (body, download):
+        records = TimedIterator(AptParser.iter_records(body, INDEX_FIELDS, component=component), sized=False)
+        package_index = PackageIndex(records)
+    # Parsing is interleaved with building (and with the download of a
+    # streamed body, which is not counted), so the build gets the rest
+    host = host_of(packages_url)
+    PARSE_SECONDS.observe(records.seconds - (download.seconds if download is not None else 0), host)
+    INDEX_BUILD_SECONDS.observe(time.perf_counter() - started - records.seconds, host)
+    if index_path is not None:
+        try:
+            write_index(package_index, index_path)
+            index_cache.evict()
+            return open_index(index_path)
+        except (OSError, IndexFormatError) as e:
+            log.warning("Error writing index file for %s: %s", index_key, e)
+    return package_index
+
+def load_release_info(repo, dist):
+    """
+    Fetch and parse the Release file of a distribution
+    """
+    return _load_release(repo, dist)[0]
+
+def _load_release(repo, dist):
+    # The parsed fields and checksum index of a Release file, parsed once
+    # per download of the file
+    release_url = AptParser.build_release_url(repo, dist)
+    entry = _fetch_release_entry(release_url)
+    parsed = parsed_releases.get(release_url, entry.version)
+    if parsed is None:
+        release_info = AptParser.parse_release_file(entry.body.decode('utf-8', errors='replace'))
+        parsed = parsed_releases.put(release_url, entry.version,
+                                     (release_info, _release_checksums(release_info)))
+    return parsed
+
+def fetch_release(repo, dist, revalidate=False):
+    """
+    Fetch the Release file of a distribution and return its body
+    """
+    return _fetch_release_entry(AptParser.build_release_url(repo, dist), revalidate).body
+
+def _fetch_release_entry(release_url, revalidate=False):
+    status_code, entry = fetch_file(release_url, revalidate=revalidate)
+    if status_code != 200:
+        raise UpstreamError(release_url, status_code)
+    return entry
+
+def list_dists(repo):
+    """
+    Names in the HTML index of the repository's dists directory, or an
+    empty list if the mirror does not serve one
+    """
+    dists_url = repo.rstrip('/').split('/dists/')[0] + '/dists/'
+    try:
+        status_code, entry = fetch_file(dists_url)
+    except Exception as e:
+        log.info("No dists listing at %s: %s", dists_url, e)
+        return []
+    if status_code != 200:
+        return []
+    return AptParser.parse_dists_listing(entry.body.decode('utf-8', errors='replace'))
+
+def probe_dist(repo, dist):
+    """
+    Fetch and summarise the InRelease (or else Release) file of a
+    distribution, or return None if it does not exist
+    """
+    for name in ('InRelease', 'Release'):
+        release_url = AptParser.build_release_url(repo, dist, name)
+        status_code, entry = fetch_file(release_url)
+        if status_code != 200:
+            continue
+        info = AptParser.parse_release_file(entry.body.decode('utf-8', errors='replace'))
+        # Some servers answer every path with an HTML page
+        if 'Components' not in info and 'Architectures' not in info:
+            continue
+        return {
+            'dist': dist,
+            'url': release_url,
+            'signed': name == 'InRelease',
+            'date': info.get('Date'),
+            'components': info.get('Components', []),
+            'architectures': info.get('Architectures', []),
+            'release': {key: value for key, value in info.items()
+                        if isinstance(value, str) and key not in RELEASE_FILE_LISTS},
+        }
+    return None
+
+def discover_dists(repo):
+    """
+    Summaries of the distributions of a repository, in name order
+
+    Distributions named in a /dists/ listing and well-known suite names
+    are probed concurrently on the loader pool, then the companion suites
+    (-updates, ...) of those found. The result is cached for CACHE_TTL
+    and concurrent discoveries of one repository share a single run.
+    """
+    cached = discovered_dists.get(repo, None)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    return discovery_flights.do(repo, _discover_dists, repo)
+
+def _discover_dists(repo):
+    candidates = list(dict.fromkeys(list_dists(repo) + list(KNOWN_DISTS)))
+    found = _probe_dists(repo, candidates)
+    companions = [dist + suffix for dist in found if '-' not in dist for suffix in DIST_SUFFIXES]
+    found.update(_probe_dists(repo, [dist for dist in companions if dist not in candidates]))
+    summaries = [found[dist] for dist in sorted(found)]
+    discovered_dists.put(repo, None, (time.monotonic() + index_cache.ttl, summaries))
+    return summaries
+
+def _probe_dists(repo, dists):
+    futures = [(dist, load_executor.submit(probe_dist, repo, dist)) for dist in dists]
+    found = {}
+    for dist, future in futures:
+        try:
+            summary = future.result()
+        except Exception as e:
+            log.warning("Error probing %s %s: %s", repo, dist, e)
+            continue
+        if summary is not None:
+            found[dist] = summary
+    return found
+
+def resolve_selection(value, available):
+    """
+    Expand a comma-separated component/architecture selection; 'all'
+    selects every value listed in the Release file
+    """
+    selected = []
+    for item in value.split(','):
+        item = item.strip()
+        if item == 'all':
+            selected.extend(available)
+        elif item:
+            selected.append(item)
+    return list(dict.fromkeys(selected))
+
+def load_index(repo, dist, components, archs):
+    """
+    Load the packages of every component/architecture combination.
+
+    A single combination is loaded directly. Otherwise the Packages files
+    are fetched and parsed concurrently on the shared loader pool and
+    merged, so the total time is close to that of the slowest file.
+    Returns the merged index, the loaded sources and the combinations
+    that are missing upstream.
+    """
+    combinations = [(component, arch) for component in components for arch in archs]
+    if len(combinations) == 1:
+        component, arch = combinations[0]
+        packages_url, package_index = load_packages_index(repo, dist, component, arch)
+        return package_index, [{'component': component, 'arch': arch, 'url': packages_url}], []
+
+    # The Release file is looked up once for all of them
+    release_checksums = load_release_checksums(repo, dist)
+    futures = [
+        (component, arch, load_executor.submit(prepare_packages_index, repo, dist, component, arch,
+                                               release_checksums))
+        for component, arch in combinations
+    ]
+    sources, versions, builds, missing = [], [], [], []
+    for component, arch, future in futures:
+        try:
+            packages_url, version, build = future.result()
+        except UpstreamError as e:
+            if e.status_code != 404:
+                raise
+            missing.append({'component': component, 'arch': arch})
+            continue
+        sources.append({'component': component, 'arch': arch, 'url': packages_url})
+        versions.append((component, arch, version))
+        builds.append(build)
+
+    if not builds:
+        if not combinations:
+            raise UpstreamError(AptParser.build_release_url(repo, dist), 404)
+        raise UpstreamError(AptParser.build_packages_url(repo, dist, *combinations[0]), 404)
+
+    # The merge is versioned by the files it is made of, so it is found
+    # without parsing (or even keeping) the indexes of its parts
+    cache_key = ('merged', repo, dist, tuple(components), tuple(archs))
+    version = tuple(versions)
+    merged = parsed_indexes.get(cache_key, version)
+    if merged is None:
+        indexes = [future.result() for future in [load_executor.submit(build) for build in builds]]
+        merged = parsed_indexes.put(cache_key, version, PackageIndex.merge(indexes))
+    return merged, sources, missing
+
+def load_selection(repo, dist, components, archs):
+    """
+    Load the index for comma-separated component and architecture
+    selections, expanding 'all' from the Release file (see load_index)
+    """
+    if 'all' in components.split(',') or 'all' in archs.split(','):
+        release_info = load_release_info(repo, dist)
+        components = resolve_selection(components, release_info.get('Components', []))
+        archs = resolve_selection(archs, release_info.get('Architectures', []))
+    else:
+        components = resolve_selection(components, [])
+        archs = resolve_selection(archs, [])
+    return load_index(repo, dist, components, archs)
+
+@app.route('/api/packages')
+def api_packages():
+    """
+    Return one page of parsed packages for a repository component/architecture
+
+    Query parameters: repo, dist, component, arch (required), q (search
+    terms such as "ssl", "^lib" or "description:ssl"), order (asc/desc), page, per_page and fields (comma-separated
+    stanza fields to include for each version, e.g. Size,Depends).
+
+    Instead of page, clients scrolling through the results pass offset
+    (position in the result list) or after (the cursor returned as next
+    by the previous window) and receive per_page groups from there (see
+    PackageIndex.window).
+
+    component and arch also accept comma-separated lists or 'all', in
+    which case the selected Packages files are loaded in parallel and
+    merged into one index.
+    """
+    missing = [name for name in ('repo', 'dist', 'component', 'arch') if not request.args.get(name)]
+    if missing:
+        return jsonify({'error': f'Missing parameters: {", ".join(missing)}'}), 400
+
+    sort = request.args.get('sort', 'name')
+    order = request.args.get('order', 'asc')
+    if sort != 'name' or order not in ('asc', 'desc'):
+        return jsonify({'error': f'Unsupported sort: {sort} {order}'}), 400
+
+    page = request.args.get('page', 1, type=int)
+    per_page = min(max(1, request.args.get('per_page', 20, type=int)), MAX_PAGE_SIZE)
+    fields = [field for field in request.args.get('fields', '').split(',') if field]
+    unknown = [field for field in fields if field not in INDEX_FIELDS]
+    if unknown:
+        return jsonify({'error': f'Unsupported fields: {", ".join(unknown)}'}), 400
+
+    try:
+        package_index, sources, missing_files = load_selection(
+            request.args['repo'], request.args['dist'], request.args['component'], request.args['arch']
+        )
+    except UpstreamError as e:
+        return jsonify({'error': f'Failed to fetch Packages file: {str(e)}'}), e.status_code
+    except Exception as e:
+        log.error("Error loading packages: %s", e)
+        return jsonify({'error': f'Error loading packages: {str(e)}'}), 500
+
+    try:
+        if 'offset' in request.args or 'after' in request.args:
+            result = package_index.window(
+                request.args.get('q', ''), offset=request.args.get('offset', 0, type=int), limit=per_page,
+                after=request.args.get('after'), descending=order == 'desc', fields=fields
+            )
+        else:
+            result = package_index.page(
+                request.args.get('q', ''), page=page, per_page=per_page,
+                descending=order == 'desc', fields=fields
+            )
+    except SearchError as e:
+        return jsonify({'error': str(e)}), 400
+    result.update({
+        'url': sources[0]['url'] if len(sources) == 1 else None,
+        'sources': sources,
+        'missing': missing_files,
+        'total_packages': len(package_index),
+        'total_versions': package_index.total_versions,
+    })
+    return jsonify(result)
+
+@app.route('/api/dists')
+def api_dists():
+    """
+    Return the distributions of a repository with their components,
+    architectures and Release fields (see discover_dists)
+
+    Query parameters: repo (required).
+    """
+    repo = request.args.get('repo')
+    if not repo:
+        return jsonify({'error': 'Missing parameters: repo'}), 400
+    dists = discover_dists(repo)
+    if not dists:
+        return jsonify({'error': f'No distributions found in {repo}'}), 404
+    return jsonify({'repo': repo, 'dists': dists})
+
+@app.route('/api/package')
+def api_package():
+    """
+    Return the details of one package with its relationships
+
+    Query parameters: repo, dist, component, arch and name (required) and
+    version (default: the newest). component and arch accept the same
+    selections as in /api/packages.
+
+    The response lists every version with its full stanza, read again
+    from the cached Packages file it came from. Files too large to cache
+    are not kept, so their versions only carry the fields of the index
+    (INDEX_FIELDS) and are marked with stanza_complete false. The response
+    also has the forward relationships of the selected version resolved
+    against the index (including providers of virtual packages) and the
+    packages whose newest version depends on this one, directly or
+    through a virtual package it provides. Names that are only provided
+    by other packages are answered as virtual packages.
+    """
+    missing = [name for name in ('repo', 'dist', 'component', 'arch', 'name') if not request.args.get(name)]
+    if missing:
+        return jsonify({'error': f'Missing parameters: {", ".join(missing)}'}), 400
+
+    repo, dist = request.args['repo'], request.args['dist']
+    try:
+        package_index, sources, _ = load_selection(repo, dist, request.args['component'], request.args['arch'])
+    except UpstreamError as e:
+        return jsonify({'error': f'Failed to fetch Packages file: {str(e)}'}), e.status_code
+    except Exception as e:
+        log.error("Error loading packages: %s", e)
+        return jsonify({'error': f'Error loading packages: {str(e)}'}), 500
+
+    name = request.args['name']
+    graph = package_index.dependency_graph()
+    if name not in graph:
+        return jsonify({'error': f'Package not found: {name}'}), 404
+
+    result = {
+        'name': name,
+        'virtual': name not in graph.positions,
+        'provided_by': graph.provided_by(name),
+        'reverse_depends': graph.reverse_depends(name),
+    }
+    if result['virtual']:
+        return jsonify(result)
+
+    records = package_index.groups[graph.positions[name]]
+    selected = request.args.get('version')
+    record = next((record for record in records if record.version == selected), None) if selected else records[0]
+    if record is None:
+        return jsonify({'error': f'Version not found: {name} {selected}'}), 404
+
+    versions = []
+    for version in records:
+        stanza = read_full_stanza(repo, dist, sources, version)
+        details = {
+            'version': version.version,
+            'stanza': stanza if stanza is not None else version.fields(),
+            'stanza_complete': stanza is not None,
         }
+        if package_index.merged:
+            details['component'] = version.component
+        versions.append(details)
+    result.update({
+        'version': record.version,
+        'versions': versions,
+        'provides': graph.provides(name),
+        'depends': graph.depends(record),
+    })
+    return jsonify(result)
+
+def read_full_stanza(repo, dist, sources, record):
+    """
+    Every field of ``record``, read from the cached Packages file among
+    ``sources`` that it was parsed from, or None if that file is not in
+    the cache
+    """
+    arch = record.get('Architecture')
+    for source in sources:
+        if source['component'] != record.component or arch not in (None, 'all', source['arch']):
+            continue
+        body = cached_packages_body(repo, dist, source['component'], source['arch'])
+        stanza = AptParser.find_stanza(body, record.name, record.filename) if body is not None else None
+        if stanza is not None:
+            return stanza
+    return None
+
+def cached_packages_body(repo, dist, component, arch):
+    """
+    The decompressed Packages file for one component/architecture if it
+    is cached, without downloading anything; else None
+    """
+    keys = ['%s:%s' % candidate['checksum'] for candidate in select_packages_sources(repo, dist, component, arch)]
+    # Files of repositories without Release checksums are cached by URL
+    packages_url = AptParser.build_packages_url(repo, dist, component, arch)
+    for key in keys + [packages_url, packages_url + '.gz']:
+        entry = index_cache.get(key)
+        if entry is not None:
+            return entry.body
+    return None
+
+@app.route('/api/diff')
+def api_diff():
+    """
+    Compare the packages of two repository selections
+
+    Query parameters: from_repo, from_dist, from_component, from_arch
+    describe the old side and to_repo, to_dist, to_component, to_arch the
+    new one; each to_ parameter defaults to its from_ value, so e.g. only
+    to_dist is needed to compare bookworm with bookworm-updates. Component
+    and architecture selections work as in /api/packages.
+
+    The response is streamed as JSON lines: one line per added, removed or
+    changed package in name order (see diff_indexes), then a summary line
+    with the counts.
+    """
+    sides = {}
+    for side in ('from', 'to'):
+        sides[side] = [
+            request.args.get(f'{side}_{name}') or request.args.get(f'from_{name}')
+            for name in ('repo', 'dist', 'component', 'arch')
+        ]
+    missing = [f'from_{name}' for name, value in zip(('repo', 'dist', 'component', 'arch'), sides['from'])
+               if not value]
+    if missing:
+        return jsonify({'error': f'Missing parameters: {", ".join(missing)}'}), 400
+
+    try:
+        old_index = load_selection(*sides['from'])[0]
+        new_index = load_selection(*sides['to'])[0]
+    except UpstreamError as e:
+        return jsonify({'error': f'Failed to fetch Packages file: {str(e)}'}), e.status_code
     except Exception as e:
-        print(f"Error proxying request to {target_url}: {str(e)}")
-        return jsonify({
-            'error': f'Error fetching from repository: {str(e)}'
-        }), 500
+        log.error("Error loading packages: %s", e)
+        return jsonify({'error': f'Error loading packages: {str(e)}'}), 500
+
+    def generate():
+        counts = {'added': 0, 'removed': 0, 'changed': 0}
+        for difference in diff_indexes(old_index, new_index):
+            counts[difference['change']] += 1
+            yield json.dumps(difference) + '\n'
+        yield json.dumps({'summary': counts}) + '\n'
+
+    return Response(generate(), 200, {'Content-Type': 'application/x-ndjson'})
+
+@app.route('/metrics')
+def metrics():
+    """Expose counters and timing histograms in the Prometheus text format"""
+    return render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 @app.route('/static/<path:path>')
 def serve_static(path):
     """Serve static files"""
     return send_from_directory('static', path)
 
+# Started once the loaders above are defined; None without PREFETCH_REPOS
+prefetch_scheduler = start_prefetch()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
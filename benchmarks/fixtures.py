@@ -0,0 +1,109 @@
+"""
+Synthetic APT repository fixtures for the benchmarks
+
+Packages files are generated deterministically with realistic field
+sizes and value distributions (a limited pool of maintainers, sections
+and dependencies, a few epochs and tildes), so that timings are
+comparable between runs and machines.
+"""
+import gzip
+import hashlib
+import random
+
+SECTIONS = ['admin', 'devel', 'libs', 'net', 'python', 'utils', 'web', 'x11', 'games', 'science']
+PRIORITIES = ['optional', 'optional', 'optional', 'extra', 'important', 'standard']
+WORDS = ['core', 'data', 'dev', 'doc', 'tools', 'utils', 'common', 'bin', 'plugin', 'server', 'client', 'gtk']
+
+
+def _package_name(i):
+    return f"{WORDS[i % len(WORDS)]}lib{i}-{WORDS[(i // 7) % len(WORDS)]}"
+
+
+def generate_packages(count, seed=0):
+    """
+    Return the bytes of a Packages file with ``count`` stanzas
+    """
+    rng = random.Random(seed)
+    maintainers = [f"Maintainer {i} <maint{i}@example.org>" for i in range(200)]
+    stanzas = []
+    for i in range(count):
+        name = _package_name(i)
+        epoch = '1:' if rng.random() < 0.05 else ''
+        tilde = '~rc1' if rng.random() < 0.05 else ''
+        version = f"{epoch}{rng.randint(0, 12)}.{rng.randint(0, 40)}.{rng.randint(0, 9)}{tilde}-{rng.randint(1, 5)}"
+        depends = ', '.join(
+            f"{_package_name(rng.randrange(max(count, 1)))} (>= {rng.randint(0, 5)}.{rng.randint(0, 9)})"
+            for _ in range(rng.randint(0, 6))
+        )
+        section = rng.choice(SECTIONS)
+        stanza = [
+            f"Package: {name}",
+            f"Source: {name.split('-')[0]}",
+            f"Version: {version}",
+            f"Installed-Size: {rng.randint(10, 50000)}",
+            f"Maintainer: {rng.choice(maintainers)}",
+            f"Architecture: {'all' if rng.random() < 0.2 else 'amd64'}",
+        ]
+        if depends:
+            stanza.append(f"Depends: {depends}")
+        if rng.random() < 0.1:
+            stanza.append(f"Provides: {name}-virtual")
+        digest = hashlib.sha256(name.encode('utf-8')).hexdigest()
+        stanza += [
+            f"Description: synthetic package number {i} for benchmarking",
+            f"Homepage: https://example.org/{name}",
+            f"Description-md5: {digest[:32]}",
+            f"Section: {section}",
+            f"Priority: {rng.choice(PRIORITIES)}",
+            f"Filename: pool/main/{name[0]}/{name}/{name}_{version.split(':')[-1]}_amd64.deb",
+            f"Size: {rng.randint(1000, 5000000)}",
+            f"MD5sum: {digest[32:]}",
+            f"SHA256: {digest}",
+        ]
+        stanzas.append('\n'.join(stanza) + '\n')
+    return '\n'.join(stanzas).encode('utf-8')
+
+
+def generate_release(codename, files):
+    """
+    Return the bytes of a Release file listing ``files`` (path relative to
+    the distribution directory -> content) in its checksum sections
+    """
+    lines = [
+        'Origin: Benchmark',
+        'Label: Benchmark',
+        f'Suite: {codename}',
+        f'Codename: {codename}',
+        'Date: Sat, 01 Jun 2024 00:00:00 UTC',
+        'Architectures: amd64',
+        'Components: main',
+        'Description: Synthetic repository for benchmarks',
+    ]
+    for field, algorithm in (('MD5Sum', 'md5'), ('SHA256', 'sha256')):
+        lines.append(f'{field}:')
+        for path, data in sorted(files.items()):
+            digest = hashlib.new(algorithm, data).hexdigest()
+            lines.append(f' {digest} {len(data):>16} {path}')
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def build_mirror_files(sizes):
+    """
+    Build the files of a mirror with one distribution per size.
+
+    Distribution ``bench-<size>`` holds a plain and a gzipped Packages
+    file with ``size`` stanzas, plus a Release file. Returns a dict of
+    URL path -> bytes suitable for ``LocalMirror``.
+    """
+    mirror_files = {}
+    for size in sizes:
+        codename = f'bench-{size}'
+        packages = generate_packages(size)
+        dist_files = {
+            'main/binary-amd64/Packages': packages,
+            'main/binary-amd64/Packages.gz': gzip.compress(packages, compresslevel=6),
+        }
+        dist_files['Release'] = generate_release(codename, dist_files)
+        for path, data in dist_files.items():
+            mirror_files[f'/debian/dists/{codename}/{path}'] = data
+    return mirror_files
@@ -0,0 +1,196 @@
+"""
+Load test of the server setups against a local fixture mirror
+
+Starts each server setup in turn on a free local port, warms it up and
+has concurrent clients send a mix of /api/packages searches, window
+requests and /proxy downloads for a fixed time, then reports throughput
+and latency:
+
+- dev: the Flask development server (python app.py)
+- gunicorn: gunicorn with its defaults, as in earlier Docker images
+  (one synchronous worker)
+- production: gunicorn with gunicorn.conf.py
+
+Usage (from the project root):
+
+    python -m benchmarks.loadtest
+    python -m benchmarks.loadtest --servers gunicorn,production --clients 64 --duration 20
+"""
+import argparse
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from benchmarks.fixtures import build_mirror_files  # noqa: E402
+from benchmarks.run import percentile  # noqa: E402
+
+SERVERS = {
+    # name: (description, command; {port} is replaced)
+    'dev': ('Flask development server', [sys.executable, 'app.py']),
+    'gunicorn': ('gunicorn defaults (1 sync worker)', ['gunicorn', '--bind', '127.0.0.1:{port}', 'app:app']),
+    'production': ('gunicorn -c gunicorn.conf.py', ['gunicorn', '-c', 'gunicorn.conf.py', 'app:app']),
+}
+
+# Request kinds and their share of the mix
+MIX = (('search', 6), ('window', 3), ('proxy', 1))
+
+SEARCH_TERMS = ('lib', 'utils', 'python3', '^lib', 'dev', 'data', 'x', 'core', 'doc', 'tools')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(name, port, cache_dir):
+    command = [part.format(port=port) for part in SERVERS[name][1]]
+    environment = dict(os.environ, PORT=str(port), BIND=f'127.0.0.1:{port}', CACHE_DIR=cache_dir,
+                       LOG_LEVEL='WARNING', PREFETCH_REPOS='', APTREPO='')
+    # Own process group, so the development server's reloader child is
+    # stopped with it
+    return subprocess.Popen(command, cwd=ROOT, env=environment, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        pass
+
+
+def wait_until_ready(base_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with status {process.returncode}')
+        try:
+            if requests.get(base_url + '/config', timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('server did not start in time')
+
+
+def make_request(session, base_url, kind, params, packages_url, size, rng):
+    """Send one request of ``kind`` and return the number of body bytes"""
+    if kind == 'search':
+        response = session.get(base_url + '/api/packages', params=dict(params, q=rng.choice(SEARCH_TERMS)))
+    elif kind == 'window':
+        response = session.get(base_url + '/api/packages',
+                               params=dict(params, offset=rng.randrange(size), per_page=100))
+    else:
+        response = session.get(base_url + '/proxy', params={'url': packages_url},
+                               headers={'Accept-Encoding': 'gzip'}, stream=True)
+    received = sum(len(chunk) for chunk in response.raw.stream(65536, decode_content=False))
+    response.raise_for_status()
+    return received
+
+
+def run_load(base_url, params, packages_url, size, clients, duration):
+    kinds = [kind for kind, weight in MIX for _ in range(weight)]
+    deadline = time.monotonic() + duration
+    latencies, errors, transferred = [], [0], [0]
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        own, own_errors, own_bytes = [], 0, 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                own_bytes += make_request(session, base_url, rng.choice(kinds), params, packages_url, size, rng)
+                own.append(time.perf_counter() - started)
+            except requests.RequestException:
+                own_errors += 1
+        with lock:
+            latencies.extend(own)
+            errors[0] += own_errors
+            transferred[0] += own_bytes
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000 if latencies else 0,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else 0,
+        'mib_s': transferred[0] / elapsed / (1024 * 1024),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--servers', default=','.join(SERVERS),
+                        help='comma-separated server setups to test (default: all)')
+    parser.add_argument('--size', type=int, default=65000,
+                        help='number of stanzas in the fixture repository (default: %(default)s)')
+    parser.add_argument('--clients', type=int, default=32,
+                        help='concurrent clients (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds of load per server (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    servers = [name for name in args.servers.split(',') if name]
+    unknown = [name for name in servers if name not in SERVERS]
+    if unknown:
+        parser.error(f"unknown servers: {', '.join(unknown)} (available: {', '.join(SERVERS)})")
+    if any(SERVERS[name][1][0] == 'gunicorn' for name in servers) and not shutil.which('gunicorn'):
+        parser.error('gunicorn is not installed (pip install -r requirements.txt)')
+
+    from mirror import LocalMirror
+
+    print(f'Generating a fixture repository with {args.size} packages...', file=sys.stderr)
+    with LocalMirror(build_mirror_files([args.size])) as mirror:
+        params = {'repo': f'{mirror.url}/debian', 'dist': f'bench-{args.size}',
+                  'component': 'main', 'arch': 'amd64'}
+        packages_url = f"{mirror.url}/debian/dists/bench-{args.size}/main/binary-amd64/Packages.gz"
+        print(f"{'server':<12} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} "
+              f"{'MiB/s':>8}  setup")
+        for name in servers:
+            port = free_port()
+            base_url = f'http://127.0.0.1:{port}'
+            with tempfile.TemporaryDirectory() as cache_dir:
+                process = start_server(name, port, cache_dir)
+                try:
+                    wait_until_ready(base_url, process)
+                    # Download and parse once, so every setup is measured warm
+                    with requests.Session() as session:
+                        for kind, _ in MIX:
+                            make_request(session, base_url, kind, params, packages_url, args.size, random.Random(0))
+                    result = run_load(base_url, params, packages_url, args.size, args.clients, args.duration)
+                finally:
+                    stop_server(process)
+            print(f"{name:<12} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9.1f} "
+                  f"{result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['mib_s']:>8.1f}  "
+                  f"{SERVERS[name][0]}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
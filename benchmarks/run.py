@@ -0,0 +1,231 @@
+"""
+Benchmarks for the parser and proxy hot paths
+
+Generates synthetic Packages/Release fixtures, serves them from a local
+stand-in mirror and times AptParser and the HTTP endpoints end to end.
+Each case runs in a fresh interpreter so its peak RSS is not inflated by
+earlier cases.
+
+Usage (from the project root):
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 1000,65000 --cases proxy_gzip,api_packages --json results.json
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from benchmarks.fixtures import build_mirror_files, generate_release  # noqa: E402
+
+DEFAULT_SIZES = (1000, 65000, 500000)
+
+CASES = {
+    # name: description
+    'parse_packages': 'AptParser.parse_packages on decoded text',
+    'index_build': 'AptParser.iter_records + PackageIndex on bytes',
+    'index_open': 'open_index of a written index file + first page',
+    'parse_release': 'AptParser.parse_release_file + parse_release_checksums',
+    'proxy_plain': '/proxy of a plain Packages file, cold cache',
+    'proxy_gzip': '/proxy of Packages.gz, cold cache',
+    'proxy_cached': '/proxy of Packages.gz, warm cache',
+    'api_packages': '/api/packages first page, cold cache',
+    'api_packages_cached': '/api/packages search, warm index',
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    position = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[position]
+
+
+def rss_kb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _run_case(case, size, fixture_dir, mirror_url, repeat, results):
+    """Run one benchmark case in this (child) process and report via ``results``"""
+    os.environ.setdefault('CACHE_MAX_BYTES', str(4 * 1024 * 1024 * 1024))
+    # Per-request logging would be part of the measurement
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    results.put(_measure(case, size, fixture_dir, mirror_url, repeat))
+
+
+def _measure(case, size, fixture_dir, mirror_url, repeat):
+    from app import app, index_cache, parsed_indexes
+    from lib.apt_parser import AptParser
+    from lib.package_index import INDEX_FIELDS, PackageIndex
+
+    def read(name):
+        with open(os.path.join(fixture_dir, name), 'rb') as f:
+            return f.read()
+
+    dist_url = f'{mirror_url}/debian/dists/bench-{size}'
+    client = app.test_client()
+    # Throughput is reported against the uncompressed Packages file
+    processed = os.path.getsize(os.path.join(fixture_dir, f'Packages-{size}'))
+    stanzas = size
+
+    if case == 'parse_packages':
+        content = read(f'Packages-{size}').decode('utf-8')
+
+        def step():
+            return AptParser.parse_packages(content)
+    elif case == 'index_build':
+        data = read(f'Packages-{size}')
+
+        def step():
+            return PackageIndex(AptParser.iter_records(io.BytesIO(data), INDEX_FIELDS))
+    elif case == 'index_open':
+        from lib.index_file import open_index, write_index
+        index_path = os.path.join(fixture_dir, f'Packages-{size}.index')
+        if not os.path.exists(index_path):
+            data = read(f'Packages-{size}')
+            write_index(PackageIndex(AptParser.iter_records(io.BytesIO(data), INDEX_FIELDS)), index_path)
+
+        def step():
+            return open_index(index_path).page()
+    elif case == 'parse_release':
+        content = read(f'Release-{size}').decode('utf-8')
+        processed = len(content.encode('utf-8'))
+        stanzas = 0
+
+        def step():
+            return AptParser.parse_release_checksums(AptParser.parse_release_file(content))
+    elif case.startswith('proxy_'):
+        url = f'{dist_url}/main/binary-amd64/Packages' + ('' if case == 'proxy_plain' else '.gz')
+
+        def step():
+            if case != 'proxy_cached':
+                index_cache.clear()
+            return client.get('/proxy', query_string={'url': url}).get_data()
+        if case == 'proxy_cached':
+            step()
+    else:
+        params = {'repo': f'{mirror_url}/debian', 'dist': f'bench-{size}',
+                  'component': 'main', 'arch': 'amd64'}
+        if case == 'api_packages_cached':
+            params['q'] = 'utils'
+
+        def step():
+            if case == 'api_packages':
+                index_cache.clear()
+                parsed_indexes.clear()
+            return client.get('/api/packages', query_string=params).get_data()
+        if case == 'api_packages_cached':
+            step()
+
+    baseline_rss = rss_kb()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = step()
+        timings.append(time.perf_counter() - started)
+        del output
+
+    return {
+        'case': case,
+        'size': size,
+        'repeat': repeat,
+        'bytes': processed,
+        'stanzas': stanzas,
+        'p50_s': percentile(timings, 0.5),
+        'p99_s': percentile(timings, 0.99),
+        'min_s': min(timings),
+        'mean_s': statistics.fmean(timings),
+        'peak_rss_kb': rss_kb(),
+        'rss_growth_kb': rss_kb() - baseline_rss,
+    }
+
+
+def run_case(case, size, fixture_dir, mirror_url, repeat):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_case, args=(case, size, fixture_dir, mirror_url, repeat, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def write_fixtures(directory, sizes):
+    """Write the Packages and Release fixtures used by the parser cases"""
+    mirror_files = build_mirror_files(sizes)
+    for size in sizes:
+        packages = mirror_files[f'/debian/dists/bench-{size}/main/binary-amd64/Packages']
+        with open(os.path.join(directory, f'Packages-{size}'), 'wb') as f:
+            f.write(packages)
+        # A Release file with checksum entries in proportion to the size
+        listed = {f'comp{i // 40}/binary-arch{i % 40}/Packages.xz': str(i).encode('utf-8')
+                  for i in range(max(1, size // 10))}
+        with open(os.path.join(directory, f'Release-{size}'), 'wb') as f:
+            f.write(generate_release(f'bench-{size}', listed))
+    return mirror_files
+
+
+def format_result(result):
+    throughput = result['bytes'] / result['p50_s'] / (1024 * 1024) if result['p50_s'] else 0
+    rate = f"{result['stanzas'] / result['p50_s']:>11,.0f}/s" if result['stanzas'] else f"{'-':>13}"
+    return (f"{result['case']:<20} {result['size']:>8,} {result['p50_s'] * 1000:>10.1f} "
+            f"{result['p99_s'] * 1000:>10.1f} {throughput:>9.1f} {rate} "
+            f"{result['peak_rss_kb'] / 1024:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated numbers of stanzas (default: %(default)s)')
+    parser.add_argument('--cases', default=','.join(CASES),
+                        help='comma-separated cases to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timed repetitions per case (default: %(default)s)')
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    cases = [case for case in args.cases.split(',') if case]
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)} (available: {', '.join(CASES)})")
+
+    from mirror import LocalMirror
+
+    results = []
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        print(f"Generating fixtures for sizes {', '.join(map(str, sizes))}...", file=sys.stderr)
+        mirror_files = write_fixtures(fixture_dir, sizes)
+        with LocalMirror(mirror_files) as mirror:
+            print(f"{'case':<20} {'stanzas':>8} {'p50 ms':>10} {'p99 ms':>10} {'MiB/s':>9} "
+                  f"{'stanzas':>13} {'peak MiB':>9}")
+            for size in sizes:
+                for case in cases:
+                    result = run_case(case, size, fixture_dir, mirror.url, args.repeat)
+                    results.append(result)
+                    print(format_result(result), flush=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'results': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Gunicorn settings for running WebAPT in production
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Workers are threaded (gthread): most of a request is spent waiting on an
+upstream mirror or streaming a body to the browser, and a thread per
+request keeps one slow transfer from blocking its whole process. Every
+worker keeps its own in-memory caches, so there are only about as many
+workers as CPUs; set CACHE_DIR to share downloads and parsed indexes
+between them.
+
+Send SIGHUP to the master for a graceful reload: new workers are started
+with the current code and the old ones finish their requests first. The
+master never imports app.py or lib/ (nothing is preloaded, and this file
+must not import them either), so every worker imports the code afresh
+and a reload picks up changes to any module.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+
+cpus = multiprocessing.cpu_count()
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(cpus + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', min(max(4, 2 * cpus), 32)))
+
+# Threaded workers report to the master from their main thread, so a long
+# download does not count against this; it only catches hung workers.
+# Upstream reads give up after lib.upstream.TIMEOUT, well within it.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+# Time a reload or shutdown gives multi-MB transfers in progress to finish
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 120))
+# The browser sends a burst of API requests per page view
+keepalive = 5
+
+# Heartbeat files on tmpfs; a disk-backed /tmp can stall workers in containers
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('ACCESS_LOG') or None
+errorlog = '-'
+
+# Workers elect one of them to poll PREFETCH_REPOS through this lock file;
+# with CACHE_DIR set the lock file is kept there instead (see app.py)
+_prefetch_lock = None
+if not os.environ.get('CACHE_DIR') and not os.environ.get('PREFETCH_LOCK'):
+    _prefetch_lock = os.path.join(tempfile.gettempdir(), f'webapt-prefetch-{os.getpid()}.lock')
+    os.environ['PREFETCH_LOCK'] = _prefetch_lock
+
+
+def worker_exit(server, worker):
+    # Stop scheduling prefetch polls; polls already running are abandoned
+    app = sys.modules.get('app')
+    scheduler = getattr(app, 'prefetch_scheduler', None)
+    if scheduler is not None:
+        scheduler.stop(wait=False)
+
+
+def on_exit(server):
+    if _prefetch_lock is not None and os.path.exists(_prefetch_lock):
+        os.unlink(_prefetch_lock)
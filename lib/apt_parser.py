@@ -1,6 +1,83 @@
 """
 Core APT repository parsing functionality
 """
+import io
+import re
+import sys
+
+from lib.debversion import version_key
+
+# Stanza fields kept by parse_packages, and the keys they are stored under
+LEGACY_FIELDS = {
+    'Package': 'name',
+    'Version': 'version',
+    'Filename': 'filename',
+}
+
+# Directory links in an HTML index of /dists/
+DIRECTORY_LINK = re.compile(r'<a[^>]*href="(?:\./)?([^"/?#]+)/"', re.IGNORECASE)
+
+# Fields whose values repeat across many packages and are worth interning
+INTERNED_FIELDS = frozenset([
+    'Architecture', 'Section', 'Priority', 'Maintainer', 'Original-Maintainer',
+    'Multi-Arch', 'Source', 'Origin', 'Bugs', 'Homepage', 'Essential',
+])
+
+
+class PackageRecord:
+    """
+    Compact representation of one Packages stanza
+
+    Package, Version and Filename are stored directly; any other captured
+    fields live in ``values``, described by a ``keys`` tuple that is shared
+    between records with the same field layout. ``component`` records which
+    repository component the stanza was loaded from, if known.
+    ``version_key`` orders versions like dpkg (see ``lib.debversion``).
+    """
+    __slots__ = ('name', 'version', 'filename', 'keys', 'values', 'component', 'version_key')
+
+    def __init__(self, name, version, filename, keys=(), values=(), component=None, key=None):
+        self.name = name
+        self.version = version
+        self.filename = filename
+        self.keys = keys
+        self.values = values
+        self.component = component
+        self.version_key = version_key(version) if key is None else key
+
+    def __repr__(self):
+        return f'PackageRecord({self.name!r}, {self.version!r})'
+
+    def get(self, field, default=None):
+        """
+        Return the value of a stanza field, e.g. ``record.get('Depends')``
+        """
+        if field == 'Package':
+            return self.name
+        if field == 'Version':
+            return self.version
+        if field == 'Filename':
+            return self.filename
+        try:
+            return self.values[self.keys.index(field)]
+        except ValueError:
+            return default
+
+    def fields(self):
+        """
+        All captured fields as a dict keyed by field name
+        """
+        fields = {'Package': self.name, 'Version': self.version}
+        fields.update(zip(self.keys, self.values))
+        fields['Filename'] = self.filename
+        return fields
+
+    def to_dict(self):
+        """
+        The three-key dict produced by ``AptParser.parse_packages``
+        """
+        return {'name': self.name, 'version': self.version, 'filename': self.filename}
+
 
 class AptParser:
     """
@@ -11,9 +88,12 @@ class AptParser:
     def parse_release_file(content):
         """
         Parse a Release file content into structured data
+
+        Clearsigned InRelease files are accepted too; their signature is
+        not checked.
         """
         info = {}
-        lines = content.split('\n')
+        lines = AptParser.strip_signature(content).split('\n')
         current_key = None
         current_value = []
 
@@ -31,12 +111,14 @@ class AptParser:
                     info[current_key] = current_value[0] if len(current_value) == 1 else current_value
                     current_value = []
 
-                # Parse new field
-                parts = line.split(': ', 1)
-                if len(parts) == 2:
-                    key, value = parts
+                # Parse new field; multi-line fields such as SHA256 have
+                # an empty value on the first line
+                key, sep, value = line.partition(':')
+                if sep:
                     current_key = key
-                    current_value = [value.strip()]
+                    current_value = [value.strip()] if value.strip() else []
+                else:
+                    current_key = None
 
         # Save last field
         if current_key:
@@ -53,40 +135,185 @@ class AptParser:
 
         return info
 
+    @staticmethod
+    def strip_signature(content):
+        """
+        Return the signed text of a clearsigned (InRelease) file; other
+        content is returned unchanged
+        """
+        if not content.lstrip().startswith('-----BEGIN PGP SIGNED MESSAGE-----'):
+            return content
+        lines = content.replace('\r\n', '\n').lstrip().split('\n')
+        # Armor headers (Hash: ...) end at the first empty line
+        start = lines.index('') + 1 if '' in lines else len(lines)
+        text = []
+        for line in lines[start:]:
+            if line == '-----BEGIN PGP SIGNATURE-----':
+                break
+            # Dash-escaped lines
+            text.append(line[2:] if line.startswith('- ') else line)
+        return '\n'.join(text)
+
+    @staticmethod
+    def parse_dists_listing(html):
+        """
+        Names of the subdirectories linked from an HTML listing of /dists/
+        """
+        names = (match.group(1) for match in DIRECTORY_LINK.finditer(html))
+        return list(dict.fromkeys(name for name in names if name not in ('.', '..')))
+
+    @staticmethod
+    def parse_release_checksums(info, algorithm='SHA256'):
+        """
+        Index the checksum section of a parsed Release file.
+
+        Returns a dict mapping each listed path (relative to the dists
+        directory, e.g. ``main/binary-amd64/Packages.xz``) to a
+        ``(size, hash)`` tuple. ``algorithm`` is the Release field to read:
+        SHA256, SHA1 or MD5Sum.
+        """
+        lines = info.get(algorithm, [])
+        if isinstance(lines, str):
+            lines = [lines]
+
+        checksums = {}
+        for line in lines:
+            parts = line.split()
+            if len(parts) != 3:
+                continue
+            digest, size, path = parts
+            try:
+                checksums[path] = (int(size), digest)
+            except ValueError:
+                continue
+        return checksums
+
     @staticmethod
     def parse_packages(content):
         """
         Parse a Packages file content into structured data
         """
-        packages = []
-        blocks = content.split('\n\n')
-        
-        for block in blocks:
-            if not block.strip():
-                continue
-                
-            pkg = {}
-            lines = block.split('\n')
-            
-            for line in lines:
-                parts = line.split(': ', 1)
-                if len(parts) != 2:
-                    continue
-                    
-                key, value = parts
-                value = value.strip()
-                
+        return list(AptParser.iter_packages(io.StringIO(content)))
+
+    @staticmethod
+    def iter_packages(fileobj):
+        """
+        Parse a Packages file from a text or binary stream, yielding one
+        package at a time.
+
+        The stream is read line by line, so memory use is bounded by the
+        largest stanza rather than the size of the file. Any iterable of
+        lines works, including a decompressing upstream stream wrapped in
+        ``ChunkStream``.
+        """
+        for stanza in AptParser.iter_stanzas(fileobj, LEGACY_FIELDS):
+            pkg = {LEGACY_FIELDS[key]: value for key, value in stanza}
+            if all(k in pkg for k in ['name', 'version', 'filename']):
+                yield pkg
+
+    @staticmethod
+    def iter_records(fileobj, fields=None, component=None):
+        """
+        Parse a Packages file from a stream into compact PackageRecord objects.
+
+        ``fields`` selects which stanza fields to keep besides Package,
+        Version and Filename; by default every field is kept. Repeated
+        values such as Architecture or Section are interned, and records
+        with the same field layout share one tuple of field names.
+        ``component`` is stored on every record.
+
+        The version sort key of each record is computed here, once per
+        distinct version string.
+        """
+        if fields is not None:
+            fields = set(fields) | set(LEGACY_FIELDS)
+        layouts = {}
+        version_keys = {}
+
+        for stanza in AptParser.iter_stanzas(fileobj, fields):
+            name = version = filename = None
+            keys = []
+            values = []
+            for key, value in stanza:
                 if key == 'Package':
-                    pkg['name'] = value
+                    name = sys.intern(value)
                 elif key == 'Version':
-                    pkg['version'] = value
+                    version = value
                 elif key == 'Filename':
-                    pkg['filename'] = value
-            
-            if all(k in pkg for k in ['name', 'version', 'filename']):
-                packages.append(pkg)
-        
-        return packages
+                    filename = value
+                else:
+                    keys.append(key)
+                    values.append(sys.intern(value) if key in INTERNED_FIELDS else value)
+
+            if name and version and filename:
+                keys = tuple(keys)
+                key = version_keys.get(version)
+                if key is None:
+                    key = version_keys[version] = version_key(version)
+                yield PackageRecord(name, version, filename,
+                                    layouts.setdefault(keys, keys), tuple(values), component, key)
+
+    @staticmethod
+    def iter_stanzas(fileobj, fields=None):
+        """
+        Split a deb822 stream (Packages, Release, ...) into stanzas.
+
+        Each stanza is yielded as a list of [field, value] pairs in file
+        order. Multi-line values keep their continuation lines, joined with
+        newlines. If ``fields`` is given, other fields are skipped.
+        """
+        stanza = []
+        capturing = False
+        for line in fileobj:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', errors='replace')
+            line = line.rstrip('\r\n')
+
+            if not line:
+                # Empty line ends the current stanza
+                if stanza:
+                    yield stanza
+                    stanza = []
+                capturing = False
+                continue
+
+            if line[0] in ' \t':
+                # Continuation of the previous field
+                if capturing:
+                    stanza[-1][1] += '\n' + line
+                continue
+
+            key, sep, value = line.partition(':')
+            capturing = bool(sep) and (fields is None or key in fields)
+            if capturing:
+                stanza.append([key, value.strip()])
+
+        if stanza:
+            yield stanza
+
+    @staticmethod
+    def find_stanza(body, name, filename):
+        """
+        Find the stanza of package ``name`` with ``filename`` in the bytes
+        of a Packages file and return all of its fields as a dict in file
+        order, or None if it is not there.
+
+        Only stanzas with a matching Package line are parsed, so looking
+        up one package does not parse the whole file.
+        """
+        needle = b'Package: ' + name.encode('utf-8') + b'\n'
+        position = body.find(needle)
+        while position >= 0:
+            if position == 0 or body[position - 1:position] == b'\n':
+                start = body.rfind(b'\n\n', 0, position)
+                start = 0 if start < 0 else start + 2
+                end = body.find(b'\n\n', position)
+                stanza = next(AptParser.iter_stanzas(io.BytesIO(body[start:end if end >= 0 else len(body)])), [])
+                fields = dict(stanza)
+                if fields.get('Filename') == filename:
+                    return fields
+            position = body.find(needle, position + 1)
+        return None
 
     @staticmethod
     def build_packages_url(base_url, codename, component, arch):
@@ -103,4 +330,14 @@ class AptParser:
                 return f"{clean_base_url}/{component}/binary-{arch}/Packages"
             else:
                 return f"{base_part}/dists/{codename}/{component}/binary-{arch}/Packages"
-        return f"{clean_base_url}/dists/{codename}/{component}/binary-{arch}/Packages" 
\ No newline at end of file
+        return f"{clean_base_url}/dists/{codename}/{component}/binary-{arch}/Packages"
+
+    @staticmethod
+    def build_release_url(base_url, codename, name='Release'):
+        """
+        Build a Release URL from components; ``name`` may also be InRelease
+        """
+        clean_base_url = base_url.rstrip('/')
+        if '/dists/' in clean_base_url:
+            clean_base_url = clean_base_url.split('/dists/')[0]
+        return f"{clean_base_url}/dists/{codename}/{name}"
@@ -0,0 +1,343 @@
+"""
+Cache for upstream repository files
+
+Entries are keyed by upstream URL and hold the (decompressed) body along
+with the validators needed to revalidate it. A size-bounded LRU keeps
+recent entries in memory; an optional cache directory shares entries
+between gunicorn workers and survives restarts.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    """
+    A cached upstream body plus its HTTP validators
+    """
+    __slots__ = ('key', 'body', 'etag', 'last_modified', 'fetched_at', 'version')
+
+    def __init__(self, key, body, etag=None, last_modified=None, fetched_at=None, version=None):
+        self.key = key
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        # Identifies this particular download across workers sharing a directory
+        self.version = version or uuid.uuid4().hex
+
+    @property
+    def size(self):
+        return len(self.body)
+
+    def conditional_headers(self):
+        """
+        Request headers for revalidating this entry upstream
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class IndexCache:
+    """
+    Size-bounded LRU cache of upstream files with TTL and optional disk store
+    """
+
+    def __init__(self, ttl=300, max_bytes=256 * 1024 * 1024, directory=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def is_fresh(self, entry):
+        """
+        Whether an entry may be served without revalidation
+        """
+        return time.time() - entry.fetched_at < self.ttl
+
+    def get(self, key):
+        """
+        Look up an entry in memory, then on disk. Returns None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if self.directory:
+            # Another worker may have refreshed or replaced the entry
+            disk_entry = self._read_disk(key, entry)
+            if disk_entry is not None and disk_entry is not entry:
+                self._store_memory(disk_entry)
+                entry = disk_entry
+        return entry
+
+    def contains(self, key):
+        """
+        Whether an entry is cached in memory or on disk, without loading its body
+        """
+        with self._lock:
+            if key in self._entries:
+                return True
+        if not self.directory:
+            return False
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            return os.path.getsize(body_path) == meta.get('size')
+        except (OSError, ValueError):
+            return False
+
+    def put(self, key, body, etag=None, last_modified=None, version=None):
+        """
+        Store a freshly downloaded body. Bodies larger than the budget are ignored.
+        """
+        if len(body) > self.max_bytes:
+            return None
+        entry = CacheEntry(key, body, etag, last_modified, version=version)
+        self._store_memory(entry)
+        if self.directory:
+            self._write_disk(entry, body=True)
+        return entry
+
+    def touch(self, key):
+        """
+        Mark an entry as fresh again, e.g. after an upstream 304
+        """
+        entry = self.get(key)
+        if entry is None:
+            return None
+        entry.fetched_at = time.time()
+        if self.directory:
+            self._write_disk(entry, body=False)
+        return entry
+
+    def index_path(self, key, version):
+        """
+        Where the parsed index built from version ``version`` of entry
+        ``key`` is kept, or None without a cache directory
+        """
+        if not self.directory:
+            return None
+        name = hashlib.sha256(f'{key}\n{version}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.index')
+
+    def evict(self):
+        """
+        Keep the disk store within the byte budget after adding files to it
+        """
+        if self.directory:
+            try:
+                self._evict_disk()
+            except OSError as e:
+                log.warning("Error evicting cache files: %s", e)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(('.body', '.json', '.index')):
+                    os.unlink(os.path.join(self.directory, name))
+
+    def _store_memory(self, entry):
+        with self._lock:
+            previous = self._entries.pop(entry.key, None)
+            if previous is not None:
+                self._size -= previous.size
+            self._entries[entry.key] = entry
+            self._size += entry.size
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+    # Disk store: one "<hash>.body" and "<hash>.json" pair per entry, written
+    # atomically so concurrent workers never observe partial files. Parsed
+    # indexes stored next to them ("<hash>.index") share the byte budget.
+
+    def _paths(self, key):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, name)
+        return base + '.body', base + '.json'
+
+    def _read_disk(self, key, current=None):
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if current is not None and meta.get('version') == current.version:
+                # Same content; only pick up a newer freshness timestamp
+                current.fetched_at = max(current.fetched_at, meta['fetched_at'])
+                return current
+            with open(body_path, 'rb') as f:
+                body = f.read()
+            # Mark as recently used for disk eviction
+            os.utime(body_path)
+        except (OSError, ValueError, KeyError):
+            return current
+        if len(body) != meta.get('size'):
+            # Body and metadata are from different writes; ignore for now
+            return current
+        return CacheEntry(key, body, meta.get('etag'), meta.get('last_modified'),
+                          meta['fetched_at'], meta.get('version'))
+
+    def _write_disk(self, entry, body):
+        body_path, meta_path = self._paths(entry.key)
+        meta = {
+            'url': entry.key,
+            'etag': entry.etag,
+            'last_modified': entry.last_modified,
+            'fetched_at': entry.fetched_at,
+            'size': entry.size,
+            'version': entry.version,
+        }
+        try:
+            if body:
+                self._atomic_write(body_path, entry.body)
+            self._atomic_write(meta_path, json.dumps(meta).encode('utf-8'))
+            if body:
+                self._evict_disk()
+        except OSError as e:
+            log.warning("Error writing cache entry for %s: %s", entry.key, e)
+
+    def _atomic_write(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _evict_disk(self):
+        files = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(('.body', '.index')):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            stale_paths = (path, path[:-len('.body')] + '.json') if path.endswith('.body') else (path,)
+            for stale in stale_paths:
+                try:
+                    os.unlink(stale)
+                except OSError:
+                    pass
+            total -= size
+
+
+class ParsedCache:
+    """
+    Small LRU of objects derived from cache entries, e.g. parsed indexes.
+
+    Values are tied to the version of the entry they were built from, so a
+    refreshed download automatically invalidates them.
+    """
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            item = self._values.get(key)
+            if item is None or item[0] != version:
+                return None
+            self._values.move_to_end(key)
+            return item[1]
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._values[key] = (version, value)
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls with the same key.
+
+    The first caller runs the function; callers arriving while it runs
+    wait for it and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self, key):
+        """
+        Whether a call with ``key`` is running
+        """
+        with self._lock:
+            return key in self._calls
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
@@ -0,0 +1,86 @@
+"""
+Debian version ordering
+
+Implements the comparison used by dpkg (``dpkg --compare-versions``) as
+sort keys: ``version_key`` turns a version string into a tuple whose
+natural ordering matches dpkg's, so versions can be sorted and compared
+with plain tuple comparisons instead of re-parsing them every time.
+"""
+import re
+from functools import lru_cache
+
+_DIGITS = re.compile(r'(\d+)')
+
+# Sort weight of the end of a non-digit part: after "~", before anything else
+_END = 0
+# Key of an empty part, which also closes every key
+_ZERO = ((_END,), 0)
+
+
+def _char_weight(char):
+    # "~" sorts before everything, even the end of the part; letters sort
+    # before all other characters
+    if char == '~':
+        return -1
+    if char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+
+@lru_cache(maxsize=4096)
+def _letters_key(letters):
+    # Non-digit parts repeat a lot (".", "~rc", "+deb12u"...)
+    return tuple(map(_char_weight, letters)) + (_END,)
+
+
+def _part_key(text):
+    """
+    Key of an upstream version or revision: a tuple of (non-digit key,
+    number) pairs, closed by an end marker
+    """
+    # "1.0~rc1" -> ['', '1', '.', '0', '~rc', '1', '']
+    parts = _DIGITS.split(text)
+    pairs = [(_letters_key(letters), int(digits)) for letters, digits in zip(parts[::2], parts[1::2])]
+    if parts[-1]:
+        pairs.append((_letters_key(parts[-1]), 0))
+    # "0", "00" and "" are equal versions
+    while pairs and pairs[-1] == _ZERO:
+        pairs.pop()
+    pairs.append(_ZERO)
+    return tuple(pairs)
+
+
+# Debian revisions repeat across most packages ("1", "2", "1+deb12u1"...)
+_revision_key = lru_cache(maxsize=4096)(_part_key)
+
+
+def split_version(version):
+    """
+    Split a version into (epoch, upstream version, Debian revision)
+    """
+    epoch = 0
+    head, sep, rest = version.partition(':')
+    if sep and head.isdigit():
+        epoch, version = int(head), rest
+    upstream, sep, revision = version.rpartition('-')
+    if not sep:
+        upstream, revision = version, ''
+    return epoch, upstream, revision
+
+
+def version_key(version):
+    """
+    Sort key of a Debian version string: keys compare like the versions
+    do according to dpkg
+    """
+    epoch, upstream, revision = split_version(version.strip())
+    return (epoch, _part_key(upstream), _revision_key(revision))
+
+
+def compare_versions(a, b):
+    """
+    Compare two versions like ``dpkg --compare-versions``: negative if
+    ``a`` is older than ``b``, zero if they are equal, positive if newer
+    """
+    key_a, key_b = version_key(a), version_key(b)
+    return (key_a > key_b) - (key_a < key_b)
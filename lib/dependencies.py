@@ -0,0 +1,149 @@
+"""
+Package relationships: parsing of Depends-style fields and a dependency
+graph over a package index with reverse lookups
+"""
+import re
+from collections import defaultdict, namedtuple
+
+# Relationship fields followed by the dependency graph, strongest first
+DEPENDENCY_FIELDS = ('Pre-Depends', 'Depends', 'Recommends', 'Suggests')
+
+# name[:archqual] [(op version)]; architecture and build profile
+# restrictions after it are ignored
+_RELATION = re.compile(r'\s*([^\s:(\[<]+)(?::[^\s(\[<]+)?\s*(?:\(\s*([<>=]+)\s*([^)\s]+)\s*\))?')
+
+
+class Relation(namedtuple('Relation', 'name op version')):
+    """
+    One alternative of a relationship, e.g. ``libc6 (>= 2.36)``
+    """
+    __slots__ = ()
+
+
+def parse_relations(value):
+    """
+    Parse a relationship field such as Depends or Provides.
+
+    Returns a list of groups, one per comma-separated entry, each a list
+    of the Relation alternatives separated by "|". Entries without a
+    package name are skipped.
+    """
+    groups = []
+    for entry in value.split(','):
+        group = []
+        for alternative in entry.split('|'):
+            match = _RELATION.match(alternative)
+            if match:
+                group.append(Relation(*match.groups()))
+        if group:
+            groups.append(group)
+    return groups
+
+
+class DependencyGraph:
+    """
+    Dependencies between the packages of a PackageIndex, built in one pass
+    over the newest version of every package.
+
+    Every relationship target name (a real or a virtual package) maps to
+    the packages that name it in one of ``fields``, and every virtual
+    package maps to the packages that provide it. Reverse dependencies are
+    therefore looked up in time proportional to their number instead of by
+    scanning the archive. Edges are stored as single integers, ``position
+    * len(fields) + field number``, to keep large archives compact.
+    """
+
+    def __init__(self, index, fields=DEPENDENCY_FIELDS):
+        self.index = index
+        self.fields = tuple(fields)
+        self.positions = {name: position for position, name in enumerate(index.names)}
+        width = len(self.fields)
+        providers = defaultdict(list)
+        reverse = defaultdict(list)
+        for position in range(len(index)):
+            record = index.latest(position)
+            provides = record.get('Provides')
+            if provides:
+                for virtual in dict.fromkeys(relation.name for group in parse_relations(provides)
+                                             for relation in group):
+                    if virtual != record.name:
+                        providers[virtual].append(position)
+            for number, field in enumerate(self.fields):
+                value = record.get(field)
+                if not value:
+                    continue
+                targets = {relation.name for group in parse_relations(value) for relation in group}
+                targets.discard(record.name)
+                for target in targets:
+                    reverse[target].append(position * width + number)
+        self.providers = dict(providers)
+        self._reverse = dict(reverse)
+
+    def __contains__(self, name):
+        return name in self.positions or name in self.providers
+
+    def provided_by(self, name):
+        """
+        Names of the packages that provide the virtual package ``name``
+        """
+        return [self.index.names[position] for position in self.providers.get(name, ())]
+
+    def provides(self, name):
+        """
+        Virtual packages provided by the newest version of ``name``
+        """
+        position = self.positions.get(name)
+        if position is None:
+            return []
+        provides = self.index.latest(position).get('Provides')
+        if not provides:
+            return []
+        virtuals = dict.fromkeys(relation.name for group in parse_relations(provides) for relation in group)
+        return [virtual for virtual in virtuals if virtual != name]
+
+    def depends(self, record):
+        """
+        Forward relationships of ``record``: for every field in ``fields``
+        that it has, the list of groups of alternatives, each resolved
+        against the index (whether a real package of that name exists and
+        which packages provide it)
+        """
+        result = {}
+        for field in self.fields:
+            value = record.get(field)
+            if not value:
+                continue
+            result[field] = [
+                [{
+                    'name': relation.name,
+                    'op': relation.op,
+                    'version': relation.version,
+                    'available': relation.name in self.positions,
+                    'provided_by': self.provided_by(relation.name),
+                } for relation in group]
+                for group in parse_relations(value)
+            ]
+        return result
+
+    def reverse_depends(self, name):
+        """
+        Packages whose newest version relates to ``name``, directly or
+        through a virtual package it provides (``via``), in name order
+        """
+        width = len(self.fields)
+        found = {}
+        for via in [None] + self.provides(name):
+            for edge in self._reverse.get(name if via is None else via, ()):
+                # Direct relationships are listed first and win
+                found.setdefault(edge, via)
+        result = []
+        for edge in sorted(found):
+            position, number = divmod(edge, width)
+            source = self.index.latest(position)
+            result.append({
+                'name': source.name,
+                'version': source.version,
+                'field': self.fields[number],
+                'via': found[edge],
+            })
+        return result
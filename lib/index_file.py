@@ -0,0 +1,320 @@
+"""
+On-disk format for parsed package indexes
+
+``write_index`` stores a PackageIndex as a compact binary file: a string
+table holding every distinct string once, fixed-width uint32 arrays for
+the sorted names, groups and records, and the trigram postings of the
+name search index. ``open_index`` maps such a file with ``mmap`` and
+serves it without parsing anything, so gunicorn workers share the pages
+through the OS page cache and records are only decoded for the groups a
+request actually touches.
+
+Layout: the magic bytes, the length of a JSON header, the header (format
+version, byte order, field layouts and the offset and length of every
+section) and the sections, each aligned to 8 bytes.
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections.abc import Sequence
+
+from lib.apt_parser import PackageRecord
+from lib.package_index import PackageIndex, TrigramIndex
+
+MAGIC = b'WAPTIDX\n'
+FORMAT_VERSION = 1
+
+# String id of a missing component
+NO_STRING = 0xFFFFFFFF
+
+# Trigrams are stored as fixed-width UTF-32 keys
+TRIGRAM_WIDTH = 12
+
+_HEADER_SIZE = struct.Struct('<I')
+
+# Fields stored in front of the stanza values of every record
+_RECORD_PREFIX = 4  # layout, version, filename, component
+
+
+class IndexFormatError(ValueError):
+    """
+    Raised for a file that is not a usable index (wrong magic, format
+    version or byte order, or truncated)
+    """
+
+
+class _StringTable:
+    """
+    Strings addressed by id: offsets into a block of UTF-8 data
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __getitem__(self, string_id):
+        return str(self.data[self.offsets[string_id]:self.offsets[string_id + 1]], 'utf-8')
+
+
+class _StringList(Sequence):
+    """
+    Read-only list of strings given by an array of string ids
+    """
+
+    def __init__(self, ids, strings):
+        self.ids = ids
+        self.strings = strings
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self.strings[string_id] for string_id in self.ids[position]]
+        return self.strings[self.ids[position]]
+
+
+class _GroupList(Sequence):
+    """
+    Read-only list of package groups; records are decoded on access
+    """
+
+    def __init__(self, mapped):
+        self.mapped = mapped
+
+    def __len__(self):
+        return len(self.mapped.names)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError('group index out of range')
+        return self.mapped.records(position)
+
+
+class _Postings:
+    """
+    Trigram -> ascending positions, looked up by binary search over the
+    sorted fixed-width trigram keys
+    """
+
+    def __init__(self, keys, offsets, positions):
+        self.keys = keys
+        self.offsets = offsets
+        self.positions = positions
+        self._count = len(keys) // TRIGRAM_WIDTH
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        # Lets bisect search the keys in place
+        return bytes(self.keys[i * TRIGRAM_WIDTH:(i + 1) * TRIGRAM_WIDTH])
+
+    def get(self, trigram, default=None):
+        key = trigram.encode('utf-32-le')
+        i = bisect.bisect_left(self, key)
+        if i == self._count or self[i] != key:
+            return default
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+
+class MappedTrigramIndex(TrigramIndex):
+    """
+    TrigramIndex whose texts and postings live in a mapped index file
+    """
+
+    def __init__(self, texts, postings):
+        self.texts = texts
+        self.postings = postings
+
+
+class MappedPackageIndex(PackageIndex):
+    """
+    PackageIndex served from a memory-mapped index file (see ``open_index``)
+
+    Names, groups and the name search index are views into the mapping.
+    Search indexes over other fields and the dependency graph are still
+    built on their first use.
+    """
+
+    def __init__(self, buffer, header, sections):
+        self._buffer = buffer
+        self.merged = header['merged']
+        self.layouts = [tuple(keys) for keys in header['layouts']]
+        self.strings = _StringTable(sections['string_offsets'], sections['string_data'])
+        self.names = _StringList(sections['names'], self.strings)
+        self._lower_names = _StringList(sections['lower_names'], self.strings)
+        self._group_offsets = sections['group_offsets']
+        self._record_offsets = sections['record_offsets']
+        self._record_data = sections['record_data']
+        self.groups = _GroupList(self)
+        self.version_counts = sections['version_counts']
+        self.total_versions = header['total_versions']
+        self._search_indexes = {'name': MappedTrigramIndex(self._lower_names, _Postings(
+            sections['trigram_keys'], sections['trigram_offsets'], sections['trigram_positions']
+        ))}
+        self._dependency_graph = None
+
+    def records(self, position):
+        """
+        Decode the records of the group at ``position``
+        """
+        name = self.names[position]
+        strings, data, offsets = self.strings, self._record_data, self._record_offsets
+        records = []
+        for r in range(self._group_offsets[position], self._group_offsets[position + 1]):
+            fields = data[offsets[r]:offsets[r + 1]]
+            layout, version, filename, component = fields[:_RECORD_PREFIX]
+            records.append(PackageRecord(
+                name, strings[version], strings[filename], self.layouts[layout],
+                tuple(strings[value] for value in fields[_RECORD_PREFIX:]),
+                None if component == NO_STRING else strings[component]
+            ))
+        return records
+
+
+def write_index(index, path):
+    """
+    Store ``index`` (a PackageIndex) at ``path``
+
+    The file is written next to its destination and moved into place, so
+    concurrent readers never see a partial index.
+    """
+    string_ids = {}
+    string_offsets = array('I', [0])
+    string_data = bytearray()
+
+    def string_id(text):
+        found = string_ids.get(text)
+        if found is None:
+            string_data.extend(text.encode('utf-8'))
+            string_offsets.append(len(string_data))
+            found = string_ids[text] = len(string_ids)
+        return found
+
+    layouts = {}
+    group_offsets = array('I', [0])
+    record_offsets = array('I', [0])
+    record_data = array('I')
+    for group in index.groups:
+        for record in group:
+            record_data.append(layouts.setdefault(record.keys, len(layouts)))
+            record_data.append(string_id(record.version))
+            record_data.append(string_id(record.filename))
+            record_data.append(NO_STRING if record.component is None else string_id(record.component))
+            record_data.extend(string_id(value) for value in record.values)
+            record_offsets.append(len(record_data))
+        group_offsets.append(len(record_offsets) - 1)
+
+    postings = index.search_index('name').postings
+    trigrams = sorted((trigram.encode('utf-32-le'), positions) for trigram, positions in postings.items())
+    trigram_offsets = array('I', [0])
+    trigram_positions = array('I')
+    for _, positions in trigrams:
+        trigram_positions.extend(positions)
+        trigram_offsets.append(len(trigram_positions))
+
+    sections = {
+        'names': array('I', map(string_id, index.names)),
+        'lower_names': array('I', map(string_id, index._lower_names)),
+        'version_counts': array('I', index.version_counts),
+        'group_offsets': group_offsets,
+        'record_offsets': record_offsets,
+        'record_data': record_data,
+        'trigram_keys': b''.join(key for key, _ in trigrams),
+        'trigram_offsets': trigram_offsets,
+        'trigram_positions': trigram_positions,
+        # Last, as string_id() above keeps adding to it
+        'string_offsets': string_offsets,
+        'string_data': bytes(string_data),
+    }
+    blobs = {name: section.tobytes() if isinstance(section, array) else section
+             for name, section in sections.items()}
+
+    header = {
+        'format': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'merged': index.merged,
+        'layouts': [list(keys) for keys in layouts],
+        'total_versions': index.total_versions,
+        'sections': {},
+    }
+    # Offsets depend on the header length, so lay out the sections until
+    # the encoded header stops growing
+    encoded = b''
+    while True:
+        offset = _align(len(MAGIC) + _HEADER_SIZE.size + len(encoded))
+        for name, blob in blobs.items():
+            header['sections'][name] = [offset, len(blob)]
+            offset = _align(offset + len(blob))
+        updated = json.dumps(header).encode('utf-8')
+        settled = len(updated) == len(encoded)
+        encoded = updated
+        if settled:
+            break
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC + _HEADER_SIZE.pack(len(encoded)) + encoded)
+            for name, blob in blobs.items():
+                f.seek(header['sections'][name][0])
+                f.write(blob)
+            # Pad to the end of the last aligned section
+            f.truncate(offset)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def open_index(path):
+    """
+    Map the index file at ``path`` and return a MappedPackageIndex
+
+    Raises OSError if the file cannot be read and IndexFormatError if it
+    is not a usable index.
+    """
+    with open(path, 'rb') as f:
+        try:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            raise IndexFormatError(f'{path} is not an index file')
+    # The mapping stays open as long as any view into it is referenced
+    buffer = memoryview(mapping)
+    try:
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise IndexFormatError(f'{path} is not an index file')
+        start = len(MAGIC) + _HEADER_SIZE.size
+        (header_size,) = _HEADER_SIZE.unpack(buffer[len(MAGIC):start])
+        header = json.loads(str(buffer[start:start + header_size], 'utf-8'))
+        if header.get('format') != FORMAT_VERSION or header.get('byteorder') != sys.byteorder:
+            raise IndexFormatError(f'{path} was written by an incompatible version')
+
+        sections = {}
+        for name, (offset, length) in header['sections'].items():
+            if offset + length > len(buffer):
+                raise IndexFormatError(f'{path} is truncated')
+            section = buffer[offset:offset + length]
+            sections[name] = section if name in ('string_data', 'trigram_keys') else section.cast('I')
+        return MappedPackageIndex(buffer, header, sections)
+    except IndexFormatError:
+        raise
+    except (ValueError, KeyError, TypeError, struct.error) as e:
+        raise IndexFormatError(f'{path} is corrupt: {str(e)}')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
@@ -0,0 +1,178 @@
+"""
+Prometheus-style metrics and sampled request logging
+
+Counters and histograms are kept in process memory and rendered in the
+Prometheus text exposition format by ``render``. Observations take a
+lock and a binary search, so they are cheap enough for every request;
+per-chunk work is limited to summing timings in ``TimedIterator``.
+"""
+import bisect
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Bucket bounds for durations in seconds and for sizes in bytes
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KiB .. 1 GiB
+
+_metrics = []
+_metrics_lock = threading.Lock()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # label values -> value or series
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def _label_text(self, label_values, extra=()):
+        pairs = list(zip(self.labels, label_values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{%s}' % ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+class Counter(_Metric):
+    """
+    Monotonic counter, optionally split by label values
+    """
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield self.name + '_total', self._label_text(label_values), value
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values over fixed buckets, optionally split
+    by label values
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labels)
+
+    def observe(self, value, *label_values):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum
+                series = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def count(self, *label_values):
+        series = self._values.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((label_values, (list(counts), total)) for label_values, (counts, total)
+                           in self._values.items())
+        for label_values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                yield self.name + '_bucket', self._label_text(label_values, [('le', le)]), cumulative
+            yield self.name + '_sum', self._label_text(label_values), total
+            yield self.name + '_count', self._label_text(label_values), cumulative
+
+
+def _register(metric):
+    with _metrics_lock:
+        _metrics.append(metric)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    """
+    All registered metrics in the Prometheus text exposition format
+    """
+    lines = []
+    with _metrics_lock:
+        metrics = list(_metrics)
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{labels} {value:g}' if isinstance(value, float) else f'{name}{labels} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def host_of(url):
+    """
+    Host label for an upstream URL
+    """
+    return urlsplit(url).hostname or 'unknown'
+
+
+class TimedIterator:
+    """
+    Wrap an iterator and add up the time spent producing its items and,
+    with ``sized``, their total length. ``close`` is passed on to the
+    wrapped iterator.
+    """
+
+    def __init__(self, iterable, sized=True):
+        self._iterator = iter(iterable)
+        self._sized = sized
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            item = next(self._iterator)
+        finally:
+            self.seconds += time.perf_counter() - started
+        if self._sized:
+            self.bytes += len(item)
+        return item
+
+    def close(self):
+        close = getattr(self._iterator, 'close', None)
+        if close is not None:
+            close()
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """
+    Logger for per-request messages that only emits a random ``rate``
+    fraction of them, so busy servers are not slowed down by logging
+    """
+
+    def __init__(self, logger, rate=1.0):
+        super().__init__(logger, {})
+        self.rate = rate
+
+    def log(self, level, msg, *args, **kwargs):
+        if self.rate < 1 and random.random() >= self.rate:
+            return
+        super().log(level, msg, *args, **kwargs)
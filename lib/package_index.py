@@ -0,0 +1,333 @@
+"""
+Queryable index over the packages of a parsed Packages file
+"""
+import bisect
+from collections import defaultdict
+
+from lib.dependencies import DependencyGraph
+
+# Stanza fields captured for the index, in addition to Package, Version
+# and Filename (see AptParser.iter_records)
+INDEX_FIELDS = (
+    'Architecture', 'Section', 'Priority', 'Source', 'Maintainer',
+    'Installed-Size', 'Size', 'SHA256', 'Description',
+    'Depends', 'Pre-Depends', 'Recommends', 'Suggests', 'Enhances', 'Provides',
+    'Breaks', 'Conflicts', 'Replaces', 'Multi-Arch', 'Essential', 'Homepage',
+)
+
+# Prefixes accepted in search queries ("maintainer:debian") and the stanza
+# field each one searches; None searches the package name
+SEARCH_FIELDS = {
+    'name': None,
+    'description': 'Description',
+    'maintainer': 'Maintainer',
+    'provides': 'Provides',
+}
+
+
+class SearchError(ValueError):
+    """
+    Raised for a search query that cannot be evaluated
+    """
+
+
+def parse_query(query):
+    """
+    Split a search query into (field, text, prefix) terms.
+
+    Terms are separated by whitespace and all have to match. A term may
+    name the field it searches ("description:ssl", default: name) and
+    start with "^" to match only at the beginning of the value.
+    """
+    terms = []
+    for token in query.lower().split():
+        field, sep, text = token.partition(':')
+        if not sep:
+            field, text = 'name', token
+        elif field not in SEARCH_FIELDS:
+            raise SearchError(f'Unknown search field: {field}')
+        prefix = text.startswith('^')
+        text = text.lstrip('^')
+        if text:
+            terms.append((field, text, prefix))
+    return terms
+
+
+class TrigramIndex:
+    """
+    Maps every three-character substring of a list of texts to the
+    (ascending) positions of the texts that contain it.
+
+    A substring query only has to check the texts listed under its rarest
+    trigram instead of scanning all of them.
+    """
+
+    def __init__(self, texts):
+        self.texts = texts
+        postings = defaultdict(list)
+        for position, text in enumerate(texts):
+            for trigram in set(map(''.join, zip(text, text[1:], text[2:]))):
+                postings[trigram].append(position)
+        self.postings = dict(postings)
+
+    def candidates(self, text):
+        """
+        Positions that may contain ``text``, or None if every text may
+        (queries shorter than a trigram)
+        """
+        if len(text) < 3:
+            return None
+        smallest = None
+        for i in range(len(text) - 2):
+            posting = self.postings.get(text[i:i + 3])
+            if posting is None:
+                return []
+            if smallest is None or len(posting) < len(smallest):
+                smallest = posting
+        return smallest
+
+    def search(self, text, prefix=False, within=None):
+        """
+        Ascending positions of the texts that contain ``text`` (or start
+        with it when ``prefix`` is set), optionally restricted to the
+        ascending positions ``within``
+        """
+        texts = self.texts
+        candidates = self.candidates(text)
+        if candidates is None:
+            candidates = range(len(texts)) if within is None else within
+        elif within is not None:
+            if len(within) < len(candidates):
+                allowed = set(candidates)
+                candidates = [i for i in within if i in allowed]
+            else:
+                allowed = set(within)
+                candidates = [i for i in candidates if i in allowed]
+        if prefix:
+            return [i for i in candidates if texts[i].startswith(text)]
+        return [i for i in candidates if text in texts[i]]
+
+
+def _version_order(record):
+    return record.version_key
+
+
+class PackageIndex:
+    """
+    Packages grouped by name and kept sorted, so that search, sorting and
+    pagination only touch the entries of the requested page.
+    """
+
+    def __init__(self, records, merged=False):
+        # Merged indexes span several components/architectures and report
+        # where each version comes from
+        self.merged = merged
+        groups = {}
+        for record in records:
+            groups.setdefault(record.name, []).append(record)
+
+        # Sorted once at build time; descending order just walks backwards.
+        # Versions within a group are ordered newest first, by their
+        # precomputed dpkg sort keys.
+        self.names = sorted(groups)
+        self.groups = [groups[name] for name in self.names]
+        for group in self.groups:
+            if len(group) > 1:
+                group.sort(key=_version_order, reverse=True)
+        self._lower_names = [name.lower() for name in self.names]
+        self.version_counts = [len(group) for group in self.groups]
+        self.total_versions = sum(self.version_counts)
+        # Search field -> TrigramIndex; the name index is built up front,
+        # the others on their first query
+        self._search_indexes = {'name': TrigramIndex(self._lower_names)}
+        self._dependency_graph = None
+
+    @classmethod
+    def merge(cls, indexes):
+        """
+        Combine the indexes of several Packages files into one.
+
+        Stanzas present in more than one file (e.g. Architecture: all
+        packages listed for every architecture) are kept once.
+        """
+        seen = set()
+        records = []
+        for index in indexes:
+            for group in index.groups:
+                for record in group:
+                    if record.filename not in seen:
+                        seen.add(record.filename)
+                        records.append(record)
+        return cls(records, merged=True)
+
+    def __len__(self):
+        return len(self.names)
+
+    def latest(self, position):
+        """
+        Record of the newest version in the group at ``position``
+        """
+        return self.groups[position][0]
+
+    def search(self, query=''):
+        """
+        Return the positions of the groups matching ``query`` (see
+        ``parse_query``), in ascending name order
+        """
+        terms = parse_query(query)
+        if not terms:
+            return range(len(self.names))
+        # Evaluate the most selective terms first to keep later checks short
+        terms.sort(key=lambda term: -len(term[1]))
+        matches = None
+        for field, text, prefix in terms:
+            matches = self.search_index(field).search(text, prefix, within=matches)
+            if not matches:
+                break
+        return matches
+
+    def search_index(self, field):
+        """
+        TrigramIndex over the lowercased values of a search field, one
+        text per group
+        """
+        index = self._search_indexes.get(field)
+        if index is None:
+            stanza_field = SEARCH_FIELDS[field]
+            texts = []
+            for group in self.groups:
+                values = {record.get(stanza_field) for record in group}
+                values.discard(None)
+                texts.append('\n'.join(sorted(values)).lower())
+            index = self._search_indexes[field] = TrigramIndex(texts)
+        return index
+
+    def dependency_graph(self):
+        """
+        DependencyGraph of the newest versions, built on first use and
+        kept with the index
+        """
+        if self._dependency_graph is None:
+            self._dependency_graph = DependencyGraph(self)
+        return self._dependency_graph
+
+    def page(self, query='', page=1, per_page=20, descending=False, fields=()):
+        """
+        Return one page of matching groups together with paging totals
+
+        ``fields`` lists extra stanza fields to include for each version.
+        """
+        matches = self.search(query)
+        total = len(matches)
+        pages = max(1, -(-total // per_page))
+        page = min(max(1, page), pages)
+
+        start = (page - 1) * per_page
+        if descending:
+            selected = [matches[total - 1 - i] for i in range(start, min(start + per_page, total))]
+        else:
+            selected = matches[start:start + per_page]
+
+        return {
+            'total': total,
+            'found_versions': sum(self.version_counts[i] for i in matches) if query else self.total_versions,
+            'page': page,
+            'pages': pages,
+            'per_page': per_page,
+            'packages': [self.group(i, fields) for i in selected],
+        }
+
+    def window(self, query='', offset=0, limit=100, after=None, descending=False, fields=()):
+        """
+        Return ``limit`` matching groups starting at ``offset`` in the
+        result list, for clients that scroll through all results
+
+        ``after`` is a cursor: the name of the last group already received
+        (in the direction of the sort). When given, the window starts right
+        behind that name, found by binary search, so that reading on stays
+        correct even if the matches shifted in the meantime. The result
+        carries the ``next`` cursor, or None after the last window.
+        """
+        matches = self.search(query)
+        total = len(matches)
+        if after is not None:
+            # Matches are ascending positions, which follow name order
+            if descending:
+                offset = total - bisect.bisect_left(matches, bisect.bisect_left(self.names, after))
+            else:
+                offset = bisect.bisect_left(matches, bisect.bisect_right(self.names, after))
+        offset = min(max(0, offset), total)
+        end = min(offset + limit, total)
+        if descending:
+            selected = [matches[total - 1 - i] for i in range(offset, end)]
+        else:
+            selected = matches[offset:end]
+
+        return {
+            'total': total,
+            'found_versions': sum(self.version_counts[i] for i in matches) if query else self.total_versions,
+            'offset': offset,
+            'limit': limit,
+            'next': self.names[selected[-1]] if selected and end < total else None,
+            'packages': [self.group(i, fields) for i in selected],
+        }
+
+    def group(self, position, fields=()):
+        """
+        Serialisable view of the group at ``position``
+        """
+        versions = []
+        for record in self.groups[position]:
+            version = {'version': record.version, 'filename': record.filename}
+            if self.merged:
+                version['component'] = record.component
+                version['architecture'] = record.get('Architecture')
+            for field in fields:
+                value = record.get(field)
+                if value is not None:
+                    version[field] = value
+            versions.append(version)
+        return {'name': self.names[position], 'versions': versions}
+
+
+def _distinct_versions(group):
+    # Groups are ordered newest first; merged indexes may list a version
+    # once per architecture
+    return list(dict.fromkeys(record.version for record in group))
+
+
+def diff_indexes(old, new):
+    """
+    Yield the differences between two indexes, in ascending name order.
+
+    Both name lists are already sorted, so this is a single merge join
+    over them: linear time, and nothing is held beyond the current pair
+    of groups. Each difference is a dict with the package ``name`` and a
+    ``change`` of 'added', 'removed' or 'changed', plus the ``old`` and/or
+    ``new`` versions (newest first). Changed packages also report whether
+    the newest version went 'up' or 'down' as ``direction``.
+    """
+    old_names, new_names = old.names, new.names
+    i = j = 0
+    while i < len(old_names) or j < len(new_names):
+        if j == len(new_names) or (i < len(old_names) and old_names[i] < new_names[j]):
+            yield {'name': old_names[i], 'change': 'removed', 'old': _distinct_versions(old.groups[i])}
+            i += 1
+        elif i == len(old_names) or new_names[j] < old_names[i]:
+            yield {'name': new_names[j], 'change': 'added', 'new': _distinct_versions(new.groups[j])}
+            j += 1
+        else:
+            old_versions = _distinct_versions(old.groups[i])
+            new_versions = _distinct_versions(new.groups[j])
+            if old_versions != new_versions:
+                old_key = old.groups[i][0].version_key
+                new_key = new.groups[j][0].version_key
+                yield {
+                    'name': old_names[i],
+                    'change': 'changed',
+                    'old': old_versions,
+                    'new': new_versions,
+                    'direction': 'up' if new_key > old_key else 'down' if new_key < old_key else None,
+                }
+            i += 1
+            j += 1
@@ -0,0 +1,138 @@
+"""
+Support for Debian's incremental index updates (PDiffs)
+
+A repository that publishes ``Packages.diff/Index`` lets clients holding an
+older copy of a Packages file catch up by applying a few small ed-style
+patches instead of downloading the whole file again.
+"""
+import re
+
+from lib.apt_parser import AptParser
+
+# An ed command as produced by ``diff --ed``: "5a", "3,7c", "12d", "a"
+_ED_COMMAND = re.compile(rb'^(?:(\d+)(?:,(\d+))?)?([acd])$')
+
+
+class PDiffError(Exception):
+    """
+    Raised when a patch cannot be applied
+    """
+
+
+class PDiffIndex:
+    """
+    Parsed ``Packages.diff/Index`` file
+    """
+
+    def __init__(self, current, history, patches, downloads, merged=False):
+        # (hash, size) of the Packages file the patches lead to
+        self.current = current
+        # [(hash, size, patch name)] of older Packages files, oldest first
+        self.history = history
+        # patch name -> (hash, size) of the uncompressed patch
+        self.patches = patches
+        # download name (e.g. "<patch>.gz") -> (hash, size) of the compressed patch
+        self.downloads = downloads
+        # Merged patches lead straight from a history entry to current
+        self.merged = merged
+
+    @classmethod
+    def parse(cls, content, algorithm='SHA256'):
+        info = AptParser.parse_release_file(content)
+
+        current = info.get(f'{algorithm}-Current', '').split()
+        if len(current) != 2:
+            raise PDiffError(f'Index has no {algorithm}-Current field')
+
+        def entries(field):
+            lines = info.get(field, [])
+            if isinstance(lines, str):
+                lines = [lines]
+            result = []
+            for line in lines:
+                parts = line.split()
+                if len(parts) == 3:
+                    result.append((parts[0], int(parts[1]), parts[2]))
+            return result
+
+        return cls(
+            current=(current[0], int(current[1])),
+            history=entries(f'{algorithm}-History'),
+            patches={name: (digest, size) for digest, size, name in entries(f'{algorithm}-Patches')},
+            downloads={name: (digest, size) for digest, size, name in entries(f'{algorithm}-Download')},
+            merged=info.get('X-Patch-Precedence') == 'merged',
+        )
+
+    def plan(self, base_digest):
+        """
+        Return the names of the patches that turn the file with hash
+        ``base_digest`` into the current one, in the order to apply them.
+
+        An empty list means the file is already current; None means the
+        file is too old (or unknown) to be patched.
+        """
+        if base_digest == self.current[0]:
+            return []
+        for position, (digest, _, name) in enumerate(self.history):
+            if digest != base_digest:
+                continue
+            if self.merged:
+                return [name] if name in self.patches else None
+            names = [entry[2] for entry in self.history[position:]]
+            return names if all(name in self.patches for name in names) else None
+        return None
+
+
+def apply_ed_patch(lines, patch):
+    """
+    Apply an ed script from ``diff --ed`` to ``lines`` in place.
+
+    ``lines`` is a list of byte strings that keep their line endings and
+    ``patch`` the raw bytes of the script. Scripts address lines from the
+    bottom of the file upwards, so commands can be applied in order.
+    """
+    script = patch.splitlines(keepends=True)
+    position = 0
+    # 1-based number of the line most recently added, for address-less commands
+    current = 0
+    while position < len(script):
+        command = script[position].rstrip(b'\n')
+        position += 1
+        if not command:
+            continue
+
+        if command == b's/.//':
+            # A text line consisting of a single "." is written as ".." and fixed up here
+            if current < 1 or not lines[current - 1].startswith(b'.'):
+                raise PDiffError('Invalid s/.// command')
+            lines[current - 1] = lines[current - 1][1:]
+            continue
+
+        match = _ED_COMMAND.match(command)
+        if match is None:
+            raise PDiffError(f'Unsupported ed command: {command!r}')
+        start = int(match.group(1)) if match.group(1) else current
+        end = int(match.group(2)) if match.group(2) else start
+        action = match.group(3)
+
+        text = []
+        if action in (b'a', b'c'):
+            while position < len(script) and script[position] not in (b'.\n', b'.'):
+                text.append(script[position])
+                position += 1
+            if position >= len(script):
+                raise PDiffError('Unterminated text block')
+            position += 1
+
+        if end > len(lines) or start < 0 or (action != b'a' and start < 1):
+            raise PDiffError(f'Line {end} out of range in {command!r}')
+
+        if action == b'a':
+            lines[start:start] = text
+            current = start + len(text)
+        elif action == b'c':
+            lines[start - 1:end] = text
+            current = start - 1 + len(text)
+        else:
+            del lines[start - 1:end]
+            current = start - 1
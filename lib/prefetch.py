@@ -0,0 +1,189 @@
+"""
+Background prefetching of configured repositories
+
+A scheduler thread polls the Release file of every configured repository
+and reloads its Packages files only when the Release file has changed, so
+that user requests find a parsed index ready. Polls are spread out with
+random jitter and run on a small pool, so mirrors never see bursts. When
+several server processes share a lock file, only one of them polls.
+"""
+import hashlib
+import heapq
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.apt_parser import AptParser
+
+try:
+    import fcntl
+except ImportError:
+    # No file locks (Windows); every process prefetches
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+
+class PrefetchTarget(namedtuple('PrefetchTarget', 'repo dist components archs')):
+    """
+    One repository selection to keep warm; components and archs are
+    selections as accepted by /api/packages (comma-separated or 'all')
+    """
+    __slots__ = ()
+
+
+def parse_targets(value):
+    """
+    Parse a list of repositories to prefetch.
+
+    Entries are separated by semicolons or newlines and consist of the
+    repository URL, distribution, components and architectures separated
+    by whitespace, e.g. "https://deb.debian.org/debian bookworm main amd64,arm64".
+    """
+    targets = []
+    for entry in value.replace(';', '\n').splitlines():
+        parts = entry.split()
+        if not parts:
+            continue
+        if len(parts) != 4:
+            raise ValueError(f'Prefetch entries need a repository, dist, components and architectures: {entry.strip()}')
+        targets.append(PrefetchTarget(*parts))
+    return targets
+
+
+class PrefetchScheduler:
+    """
+    Poll the Release files of ``targets`` every ``interval`` seconds.
+
+    ``fetch_release(repo, dist)`` returns the body of a Release file and
+    ``load(repo, dist, components, archs)`` fetches and parses the
+    selected Packages files into the shared caches. The Packages files
+    are only loaded again when the Release file's Date or content hash
+    differs from the previous poll. Every interval is varied by up to
+    ``jitter`` (a fraction) and at most ``max_workers`` polls run at once.
+
+    With a ``lock_path``, only the scheduler holding an exclusive lock on
+    that file polls; the others retry every ``lock_retry`` seconds and take
+    over when its process exits.
+    """
+
+    # Seconds between attempts to take over the lock from another process
+    lock_retry = 30
+
+    def __init__(self, targets, fetch_release, load, interval=600, jitter=0.1, max_workers=2, rng=None,
+                 lock_path=None):
+        self.targets = list(dict.fromkeys(targets))
+        self.fetch_release = fetch_release
+        self.load = load
+        self.interval = interval
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.rng = rng or random.Random()
+        # target -> (Release Date, SHA256 of the Release file) last loaded
+        self.fingerprints = {}
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    def next_delay(self):
+        """
+        Seconds until the next poll of a target, with jitter applied
+        """
+        return self.interval * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def poll(self, target):
+        """
+        Check one target and reload it if its Release file changed.
+        Returns whether the Packages files were loaded.
+        """
+        body = self.fetch_release(target.repo, target.dist)
+        release_info = AptParser.parse_release_file(body.decode('utf-8', errors='replace'))
+        fingerprint = (release_info.get('Date'), hashlib.sha256(body).hexdigest())
+        if self.fingerprints.get(target) == fingerprint:
+            return False
+        log.info("Prefetching %s %s (%s)", target.repo, target.dist, fingerprint[0] or 'no Date')
+        self.load(target.repo, target.dist, target.components, target.archs)
+        self.fingerprints[target] = fingerprint
+        return True
+
+    def acquire(self):
+        """
+        Try to become the process that polls. Returns whether this
+        scheduler holds the lock (always true without a lock path).
+        """
+        if self.lock_path is None or fcntl is None or self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release(self):
+        """
+        Give up the lock, so that another process can take over polling
+        """
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def start(self):
+        """
+        Start polling in a background daemon thread
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='prefetch')
+        self._thread = threading.Thread(target=self._run, name='prefetch-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        """
+        Stop scheduling new polls; polls already running are finished
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        self.release()
+
+    def _run(self):
+        while not self.acquire():
+            # Another process polls; take over once it is gone
+            if self._stop.wait(self.lock_retry):
+                return
+        log.info("Prefetching %d repositories every %gs", len(self.targets), self.interval)
+        # First polls are spread over the jitter window instead of all at startup
+        queue = [(time.monotonic() + self.rng.uniform(0, self.interval * self.jitter), i)
+                 for i in range(len(self.targets))]
+        heapq.heapify(queue)
+        running = {}
+        while queue and not self._stop.is_set():
+            due, i = queue[0]
+            if self._stop.wait(max(0, due - time.monotonic())):
+                break
+            heapq.heappop(queue)
+            # Never poll the same target twice at once; a slow poll simply
+            # delays its next one
+            if i not in running or running[i].done():
+                running[i] = self._executor.submit(self._poll_logged, self.targets[i])
+            heapq.heappush(queue, (time.monotonic() + self.next_delay(), i))
+
+    def _poll_logged(self, target):
+        try:
+            return self.poll(target)
+        except Exception as e:
+            # Retried at the next interval
+            log.warning("Error prefetching %s %s: %s", target.repo, target.dist, e)
+            return False
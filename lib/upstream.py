@@ -0,0 +1,400 @@
+"""
+Streaming access to upstream APT repository files
+"""
+import bz2
+import io
+import lzma
+import threading
+import time
+import zlib
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+
+from lib.metrics import Histogram, host_of
+
+USER_AGENT = 'APT-Repository-Previewer/1.0'
+
+# (connect_timeout, read_timeout) in seconds
+TIMEOUT = (3.05, 10)
+
+# Seconds a request waits for a free connection to a busy mirror
+POOL_TIMEOUT = 10
+
+# Size of the blocks read from the upstream socket
+CHUNK_SIZE = 64 * 1024
+
+_session = None
+_session_lock = threading.RLock()
+
+CONNECT_SECONDS = Histogram('webapt_upstream_connect_seconds',
+                            'Time to open a new upstream connection, including the TLS handshake', ['host'])
+TTFB_SECONDS = Histogram('webapt_upstream_ttfb_seconds',
+                         'Time from sending an upstream request to receiving its headers', ['host'])
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        CONNECT_SECONDS.observe(time.perf_counter() - started, self.host)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        CONNECT_SECONDS.observe(time.perf_counter() - started, self.host)
+
+
+class _BoundedWaitMixin:
+    # requests never passes pool_timeout, so without a default a request
+    # to a mirror whose connections are all taken would wait forever
+    pool_timeout = POOL_TIMEOUT
+
+    def urlopen(self, *args, pool_timeout=None, **kwargs):
+        return super().urlopen(*args, pool_timeout=pool_timeout or self.pool_timeout, **kwargs)
+
+
+class _TimedHTTPConnectionPool(_BoundedWaitMixin, HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(_BoundedWaitMixin, HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connections report how long connecting took and
+    whose requests wait at most ``pool_timeout`` seconds for a connection
+    """
+
+    def __init__(self, pool_timeout=POOL_TIMEOUT, **kwargs):
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attributes = {'pool_timeout': self.pool_timeout}
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('HTTPConnectionPool', (_TimedHTTPConnectionPool,), attributes),
+            'https': type('HTTPSConnectionPool', (_TimedHTTPSConnectionPool,), attributes),
+        }
+
+
+def configure_pool(pool_hosts=10, per_host=20, pool_timeout=POOL_TIMEOUT):
+    """
+    (Re)create the shared upstream session.
+
+    ``pool_hosts`` is the number of mirrors that keep a connection pool and
+    ``per_host`` the maximum number of concurrent connections to one
+    mirror; further requests to that mirror wait up to ``pool_timeout``
+    seconds for a free connection and then fail with a 503 UpstreamError.
+    """
+    global _session
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    adapter = _TimedAdapter(pool_timeout=pool_timeout, pool_connections=pool_hosts, pool_maxsize=per_host,
+                            pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    with _session_lock:
+        previous, _session = _session, session
+    if previous is not None:
+        previous.close()
+    return session
+
+
+def get_session():
+    """
+    The shared keep-alive session used for all upstream requests
+    """
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                configure_pool()
+    return _session
+
+
+def open_upstream(url, headers=None):
+    """
+    Start a streaming GET request against an upstream repository.
+
+    Requests go through a shared session, so repeated requests to the same
+    mirror reuse pooled keep-alive connections instead of paying for a new
+    TCP and TLS handshake each time. The body is not read; callers consume
+    it through ``iter_content`` and are responsible for closing the response.
+
+    Raises UpstreamError with status 503 when every pooled connection to
+    the mirror stays busy for longer than the pool timeout.
+    """
+    started = time.perf_counter()
+    try:
+        response = get_session().get(url, headers=headers, timeout=TIMEOUT, stream=True)
+    except EmptyPoolError:
+        raise UpstreamError(url, 503, f'All connections to {host_of(url)} are busy') from None
+    TTFB_SECONDS.observe(time.perf_counter() - started, host_of(url))
+    return response
+
+
+def iter_gunzip(chunks):
+    """
+    Incrementally decompress an iterable of gzip-compressed byte chunks.
+
+    Concatenated gzip members are supported. Only non-empty blocks are
+    yielded, and a ``zlib.error`` is raised for corrupt or truncated input.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        while chunk:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            chunk = decompressor.unused_data
+            if chunk:
+                # Start over for the next gzip member
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    data = decompressor.flush()
+    if data:
+        yield data
+    if not decompressor.eof:
+        raise zlib.error('Truncated gzip stream')
+
+
+def iter_gzip(chunks, level=6):
+    """
+    Incrementally gzip-compress an iterable of byte chunks.
+
+    The output does not depend on how the input is split into chunks, so
+    compressing the same body twice yields the same bytes.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Compressed variants of index files, keyed by file extension
+COMPRESSIONS = {
+    '.xz': 'xz',
+    '.bz2': 'bz2',
+    '.gz': 'gz',
+}
+
+
+def compression_for_url(url):
+    """
+    Return the compression of an index file judging by its extension, or None
+    """
+    for extension, compression in COMPRESSIONS.items():
+        if url.endswith(extension):
+            return compression
+    return None
+
+
+def iter_decompress(chunks, compression):
+    """
+    Incrementally decompress byte chunks compressed with ``compression``
+    ('gz', 'xz' or 'bz2'); None passes the chunks through unchanged.
+    """
+    if compression is None:
+        return (chunk for chunk in chunks if chunk)
+    if compression == 'gz':
+        return iter_gunzip(chunks)
+    if compression == 'xz':
+        return _iter_multistream(chunks, lzma.LZMADecompressor, lzma.LZMAError)
+    if compression == 'bz2':
+        return _iter_multistream(chunks, bz2.BZ2Decompressor, OSError)
+    raise ValueError(f'Unsupported compression: {compression}')
+
+
+def _iter_multistream(chunks, decompressor_class, error_class):
+    decompressor = decompressor_class()
+    for chunk in chunks:
+        while chunk:
+            if decompressor.eof:
+                # Start over for the next concatenated stream
+                decompressor = decompressor_class()
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            chunk = decompressor.unused_data if decompressor.eof else b''
+
+    if not decompressor.eof:
+        raise error_class('Truncated compressed stream')
+
+
+class ChunkStream(io.RawIOBase):
+    """
+    Read-only binary file object over an iterable of byte chunks.
+
+    Lets line-oriented consumers such as ``AptParser.iter_packages`` read
+    straight from a (decompressing) download without buffering it all.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def open_stream(chunks):
+    """
+    Wrap an iterable of byte chunks in a buffered, line-iterable reader
+    """
+    return io.BufferedReader(ChunkStream(chunks), CHUNK_SIZE)
+
+
+class SharedStream:
+    """
+    One upstream body read by any number of concurrent consumers.
+
+    Chunks are kept as they are pulled from ``chunks``, so a consumer that
+    joins late still receives the body from the start. Whichever consumer
+    needs the next chunk pulls it, so the download continues as long as
+    anyone is reading. Once every reader has closed before the end,
+    ``chunks`` is closed as well. ``on_finish`` is called once when the
+    body is complete or abandoned.
+
+    Once more than ``max_buffer`` bytes have been pulled, no new readers
+    can join and chunks that every reader has passed are dropped, so
+    memory use stops growing with the size of the body.
+    """
+
+    def __init__(self, chunks, on_finish=None, max_buffer=None):
+        self._chunks = chunks
+        self._on_finish = on_finish
+        self._max_buffer = max_buffer
+        self._lock = threading.Lock()
+        self._readers = set()
+        # Position of the first chunk in ``buffer``, and the buffer; swapped
+        # together so readers can look up chunks without the lock
+        self._window = (0, [])
+        self.pulled_bytes = 0
+        self.joinable = True
+        self.finished = False
+        self.complete = False
+
+    @property
+    def buffer(self):
+        """The chunks currently kept"""
+        return self._window[1]
+
+    def reader(self):
+        """
+        A new iterable over the whole body, to be closed when done, or
+        None if the stream was abandoned before the end or has grown past
+        ``max_buffer``
+        """
+        with self._lock:
+            if not self.joinable or (self.finished and not self.complete):
+                return None
+            reader = _SharedStreamReader(self)
+            self._readers.add(reader)
+        return reader
+
+    def _chunk(self, position):
+        # Chunk at ``position``, or None at the end of the body
+        start, buffer = self._window
+        if position - start < len(buffer):
+            return buffer[position - start]
+        with self._lock:
+            start, buffer = self._window
+            while position - start >= len(buffer) and not self.finished:
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    self.complete = True
+                    self._finish()
+                else:
+                    buffer.append(chunk)
+                    self.pulled_bytes += len(chunk)
+                    if self._max_buffer is not None and self.pulled_bytes > self._max_buffer:
+                        self.joinable = False
+            chunk = buffer[position - start] if position - start < len(buffer) else None
+            if not self.joinable:
+                self._trim()
+            return chunk
+
+    def _trim(self):
+        # Drop the chunks every reader is done with; a reader that is
+        # about to ask for chunk ``position`` still has that position
+        start, buffer = self._window
+        low = min((reader._position for reader in self._readers), default=start + len(buffer))
+        if low > start:
+            self._window = (low, buffer[low - start:])
+
+    def _release(self, reader):
+        with self._lock:
+            self._readers.discard(reader)
+            if not self._readers and not self.finished:
+                close = getattr(self._chunks, 'close', None)
+                if close is not None:
+                    close()
+                self._finish()
+            if not self.joinable:
+                self._trim()
+
+    def _finish(self):
+        self.finished = True
+        if self._on_finish is not None:
+            self._on_finish(self)
+
+
+class _SharedStreamReader:
+    """
+    Iterator over a SharedStream; WSGI servers call ``close`` when the
+    response ends, even if it was never iterated
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._position = 0
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        chunk = self._stream._chunk(self._position)
+        if chunk is None:
+            raise StopIteration
+        self._position += 1
+        return chunk
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._stream._release(self)
+
+
+class UpstreamError(Exception):
+    """
+    Raised when an upstream repository file cannot be retrieved
+    """
+
+    def __init__(self, url, status_code, reason=None):
+        super().__init__(reason or f'HTTP {status_code} fetching {url}')
+        self.url = url
+        self.status_code = status_code
@@ -32,9 +32,14 @@ uv pip install -r requirements.txt
 echo ""
 echo "Environment Variables:"
 echo "  APTREPO - Set a default repository URL (optional)"
-echo "  Example: APTREPO=https://apt.armbian.com python app.py"
+echo "  Example: APTREPO=https://apt.armbian.com ./run.sh"
 echo ""
 
-# Run the application
-echo "Starting Flask application on http://localhost:5000"
-python app.py 
\ No newline at end of file
+# Run the application: gunicorn (see gunicorn.conf.py), or the Flask
+# development server with auto-reload for --dev
+if [ "$1" = "--dev" ]; then
+    echo "Starting Flask development server on http://localhost:${PORT:-5000}"
+    exec python app.py
+fi
+echo "Starting WebAPT on http://localhost:${PORT:-5000} (send SIGHUP to reload)"
+exec gunicorn -c gunicorn.conf.py app:app
@@ -15,30 +15,39 @@ document.addEventListener('DOMContentLoaded', () => {
     const tableContainerDiv = document.getElementById('tableContainer');
     const packagesTable = document.getElementById('packagesTable');
     const searchQueryInput = document.getElementById('searchQuery');
-    const firstPageBtn = document.getElementById('firstPageBtn');
-    const prevPageBtn = document.getElementById('prevPageBtn');
-    const nextPageBtn = document.getElementById('nextPageBtn');
-    const lastPageBtn = document.getElementById('lastPageBtn');
-    const pageInput = document.getElementById('pageInput');
-    const totalPagesSpan = document.getElementById('totalPages');
+    const packagesViewport = document.getElementById('packagesViewport');
 
     // State
     let releaseInfo = null;
     let packagesUrl = '';
-    let packages = [];
+    let pageRequestId = 0; // Used to ignore responses to superseded page requests
     let totalUniquePackages = 0; // Keep track of total unique packages
     let totalPackageVersions = 0; // Keep track of total package versions
-    let currentPage = 1;
-    let pageSize = 20;
     let searchQuery = '';
+    let searchTimer = null;
+    let totalRows = 0; // Packages matching the current search
+    let rowBlocks = new Map(); // Block number -> packages, or null while loading
+    let renderPending = false;
     let sortField = 'name';
     let sortDirection = 'asc';
     let repoBaseUrl = '';
     let availableDists = [];
+    let distsInfo = {}; // Discovered distribution summaries by name
     let isAptRepoEnvSet = false;
 
-    // Proxy URL
-    const PROXY_URL = '/proxy?url=';
+    // JSON API endpoints
+    const PACKAGES_API_URL = '/api/packages';
+    const DISTS_API_URL = '/api/dists';
+
+    // The package table is virtualized: only the rows in view (plus
+    // OVERSCAN_ROWS around them) exist in the DOM, and rows are fetched in
+    // blocks of BLOCK_SIZE as they scroll into view. At most MAX_BLOCKS
+    // blocks are kept, so memory stays flat however far the user scrolls.
+    const ROW_HEIGHT = 49; // px, matches .packages-viewport td
+    const BLOCK_SIZE = 100;
+    const MAX_BLOCKS = 20;
+    const OVERSCAN_ROWS = 10;
+    const SEARCH_DELAY = 250; // ms of no typing before a search is sent
 
     // Fetch configuration from server
     fetchConfig();
@@ -74,48 +83,13 @@ document.addEventListener('DOMContentLoaded', () => {
 
     searchQueryInput.addEventListener('input', (e) => {
         searchQuery = e.target.value.toLowerCase();
-        currentPage = 1;
-        pageInput.value = 1;
-        renderTable();
-    });
-
-    firstPageBtn.addEventListener('click', () => {
-        currentPage = 1;
-        pageInput.value = 1;
-        renderTable();
-    });
-
-    prevPageBtn.addEventListener('click', () => {
-        if (currentPage > 1) {
-            currentPage--;
-            pageInput.value = currentPage;
-            renderTable();
-        }
-    });
-
-    nextPageBtn.addEventListener('click', () => {
-        if (currentPage < getTotalPages()) {
-            currentPage++;
-            pageInput.value = currentPage;
-            renderTable();
-        }
-    });
-
-    lastPageBtn.addEventListener('click', () => {
-        currentPage = getTotalPages();
-        pageInput.value = currentPage;
-        renderTable();
+        // Search once typing pauses instead of on every keystroke
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(reloadRows, SEARCH_DELAY);
     });
 
-    pageInput.addEventListener('change', () => {
-        const value = parseInt(pageInput.value);
-        if (!isNaN(value) && value >= 1 && value <= getTotalPages()) {
-            currentPage = value;
-            renderTable();
-        } else {
-            pageInput.value = currentPage;
-        }
-    });
+    packagesViewport.addEventListener('scroll', scheduleRender, { passive: true });
+    window.addEventListener('resize', scheduleRender);
 
     // Functions
     async function fetchConfig() {
@@ -191,17 +165,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 // If a distribution was specified in the URL and it exists in available dists, pre-select it
                 if (selectedDist && availableDists.includes(selectedDist)) {
                     console.log(`Using distribution from URL: ${selectedDist}`);
-                    
-                    // Fetch the Release file for the selected distribution
-                    const releaseUrl = `${repoBaseUrl}/dists/${selectedDist}/Release`;
-                    const response = await fetch(PROXY_URL + encodeURIComponent(releaseUrl));
-                    
-                    if (response.status !== 200) {
-                        throw new Error(`Failed to fetch Release file for ${selectedDist}: ${response.statusText}`);
-                    }
-                    
-                    const releaseContent = await response.text();
-                    releaseInfo = parseReleaseFile(releaseContent);
+                    releaseInfo = releaseInfoFor(selectedDist);
                 }
             } catch (e) {
                 // If we can't discover distributions or there's another error
@@ -226,6 +190,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         option.textContent = arch;
                         archSelect.appendChild(option);
                     });
+                    appendAllOption(archSelect, releaseInfo.Architectures, 'All architectures');
                 }
                 
                 // Populate component dropdown
@@ -237,6 +202,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         option.textContent = component;
                         componentSelect.appendChild(option);
                     });
+                    appendAllOption(componentSelect, releaseInfo.Components, 'All components');
                 }
             } else {
                 // Add a message prompting the user to select a distribution
@@ -263,60 +229,32 @@ document.addEventListener('DOMContentLoaded', () => {
             showLoading(true);
             clearError();
 
-            let packagesContent;
-            let usingGzipped = false;
-
-            // First, try to fetch the regular Packages file
-            console.log(`Attempting to fetch regular Packages file: ${packagesUrl}`);
-            let response = await fetch(PROXY_URL + encodeURIComponent(packagesUrl));
-            
-            // Now the proxy will correctly pass through 404 status codes
-            if (response.status === 404) {
-                // Regular Packages file wasn't found, try the gzipped version
-                const gzippedUrl = packagesUrl + '.gz';
-                usingGzipped = true;
-                
-                console.log(`Regular Packages file not found (404), trying gzipped version: ${gzippedUrl}`);
-                
-                // Try the gzipped version
-                response = await fetch(PROXY_URL + encodeURIComponent(gzippedUrl));
-                
-                if (response.status !== 200) {
-                    throw new Error(`Failed to fetch both regular and gzipped Packages file:\n` +
-                                   `- Regular: HTTP 404 Not Found\n` +
-                                   `- Gzipped: HTTP ${response.status} ${response.statusText}`);
-                } else {
-                    console.log(`Successfully fetched gzipped Packages file`);
-                }
-            } else if (response.status !== 200) {
-                throw new Error(`Failed to fetch Packages file: HTTP ${response.status} ${response.statusText}`);
-            } else {
-                console.log(`Successfully fetched regular Packages file`);
-            }
-            
-            // At this point, we have a valid response
-            packagesContent = await response.text();
+            // The server fetches and parses the Packages file (falling back to
+            // Packages.gz) and only returns the first block of rows
+            const requestId = ++pageRequestId;
+            const pageData = await fetchPackagesWindow(0);
+            // A newer search (or selection) has been sent in the meantime
+            if (requestId !== pageRequestId) return;
 
             // Update UI to show which URL format was successfully used
-            if (usingGzipped) {
-                packagesUrlDiv.textContent = `Packages URL: ${packagesUrl}.gz (gzipped)`;
+            if (!pageData.url) {
+                // Several Packages files were loaded and merged
+                const sourceNames = pageData.sources.map(source => `${source.component}/${source.arch}`);
+                packagesUrlDiv.textContent = `Packages: ${pageData.sources.length} files merged (${sourceNames.join(', ')})`;
+            } else if (pageData.url.endsWith('.gz')) {
+                packagesUrlDiv.textContent = `Packages URL: ${pageData.url} (gzipped)`;
             } else {
-                packagesUrlDiv.textContent = `Packages URL: ${packagesUrl}`;
+                packagesUrlDiv.textContent = `Packages URL: ${pageData.url}`;
             }
             packagesUrlDiv.style.display = 'block';
 
-            // Parse the Packages file content
-            console.log(`Parsing Packages file content (${packagesContent.length} bytes)`);
-            packages = parsePackages(packagesContent);
-            
             // Update total package counts when packages are first loaded
-            const uniquePackageNames = new Set(packages.map(pkg => pkg.name));
-            totalUniquePackages = uniquePackageNames.size;
-            totalPackageVersions = packages.length;
+            totalUniquePackages = pageData.total_packages;
+            totalPackageVersions = pageData.total_versions;
             console.log(`Found ${totalUniquePackages} unique packages with ${totalPackageVersions} total versions`);
             
             // Show packages table
-            showPackagesTable();
+            showPackagesTable(pageData);
         } catch (error) {
             console.error(`Error in fetchPackages:`, error);
             showError(`Error loading packages: ${error.message}`);
@@ -325,6 +263,65 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    async function fetchPackagesWindow(offset) {
+        const params = new URLSearchParams({
+            repo: repoUrlInput.value.trim(),
+            dist: distSelect.value,
+            component: componentSelect.value,
+            arch: archSelect.value,
+            q: searchQuery,
+            offset: offset,
+            per_page: BLOCK_SIZE
+        });
+        const response = await fetch(`${PACKAGES_API_URL}?${params}`);
+        const pageData = await response.json();
+
+        if (!response.ok) {
+            throw new Error(pageData.error || `HTTP ${response.status} ${response.statusText}`);
+        }
+        return pageData;
+    }
+
+    async function reloadRows() {
+        if (!packagesUrl) return;
+
+        try {
+            const requestId = ++pageRequestId;
+            const pageData = await fetchPackagesWindow(0);
+            if (requestId === pageRequestId) {
+                renderTable(pageData);
+            }
+        } catch (error) {
+            console.error(`Error in reloadRows:`, error);
+            showError(`Error loading packages: ${error.message}`);
+        }
+    }
+
+    async function loadBlock(block) {
+        // Blocks are tied to the search they were requested for
+        const blocks = rowBlocks;
+        blocks.set(block, null);
+        try {
+            const pageData = await fetchPackagesWindow(block * BLOCK_SIZE);
+            if (blocks !== rowBlocks) return;
+            blocks.set(block, pageData.packages);
+            evictBlocks(block);
+            scheduleRender();
+        } catch (error) {
+            blocks.delete(block);
+            console.error(`Error loading rows:`, error);
+            showError(`Error loading packages: ${error.message}`);
+        }
+    }
+
+    function evictBlocks(keep) {
+        // Drop the loaded blocks farthest from the one in view
+        if (rowBlocks.size <= MAX_BLOCKS) return;
+        const loaded = [...rowBlocks.keys()].filter(block => rowBlocks.get(block) !== null);
+        loaded.sort((a, b) => Math.abs(b - keep) - Math.abs(a - keep));
+        loaded.slice(0, rowBlocks.size - MAX_BLOCKS).forEach(block => rowBlocks.delete(block));
+    }
+
     function updatePackagesUrl() {
         const arch = archSelect.value;
         const component = componentSelect.value;
@@ -353,53 +350,33 @@ document.addEventListener('DOMContentLoaded', () => {
 
     async function fetchAvailableDists() {
         if (!repoBaseUrl) return;
-        
-        // Try to fetch the /dists/ directory to discover available distributions
-        // This may not work on all repositories as they might not allow directory listings
-        try {
-            const distsUrl = `${repoBaseUrl}/dists/`;
-            const response = await fetch(PROXY_URL + encodeURIComponent(distsUrl));
-            
-            if (response.status !== 200) {
-                console.warn(`Failed to fetch dists directory: ${response.statusText}`);
-                return;
-            }
-            
-            const content = await response.text();
-            
-            // Common Ubuntu/Debian distributions to try if we can't parse the directory
-            const commonDists = ['jammy', 'focal', 'bionic', 'bullseye', 'buster', 'bookworm', 'stable', 'testing', 'unstable'];
-            
-            // Try to extract distribution names from directory listing HTML
-            // Simple regex to find directory names
-            const dirRegex = /<a[^>]*href="([^"\/]+)\/"[^>]*>/g;
-            let match;
-            let foundDists = false;
-            
-            while ((match = dirRegex.exec(content)) !== null) {
-                const dist = match[1];
-                if (!availableDists.includes(dist) && dist !== '.' && dist !== '..') {
-                    availableDists.push(dist);
-                    foundDists = true;
-                }
-            }
-            
-            // If we didn't find any distributions from HTML, try common distributions
-            // but only if we're told to try them automatically
-            if (!foundDists && availableDists.length === 0) {
-                console.log("No distributions found in directory listing");
-                // Instead of automatically adding common dists, we'll show an error
-                throw new Error("Could not detect available distributions from this repository. The repository might not allow directory listings.");
-            }
-            
-            // Sort the distributions alphabetically
-            availableDists.sort();
-            
-            console.log(`Found ${availableDists.length} distributions: ${availableDists.join(', ')}`);
-        } catch (error) {
-            console.warn("Failed to fetch distributions from directory listing", error);
-            throw error;
+
+        // The server probes the InRelease/Release files of listed and
+        // well-known distributions, so this also works on mirrors without
+        // directory listings
+        const params = new URLSearchParams({ repo: repoBaseUrl });
+        const response = await fetch(`${DISTS_API_URL}?${params}`);
+        const data = await response.json();
+        if (response.status !== 200) {
+            throw new Error(data.error || response.statusText);
         }
+
+        distsInfo = {};
+        data.dists.forEach(dist => {
+            distsInfo[dist.dist] = dist;
+        });
+        availableDists = data.dists.map(dist => dist.dist);
+
+        console.log(`Found ${availableDists.length} distributions: ${availableDists.join(', ')}`);
+    }
+
+    function releaseInfoFor(dist) {
+        // Release fields as the info grid and selectors expect them
+        const summary = distsInfo[dist];
+        return Object.assign({}, summary.release, {
+            Components: summary.components,
+            Architectures: summary.architectures
+        });
     }
 
     async function handleDistChange() {
@@ -423,22 +400,8 @@ document.addEventListener('DOMContentLoaded', () => {
             archSelect.innerHTML = '<option value="">Select Architecture</option>';
             componentSelect.innerHTML = '<option value="">Select Component</option>';
             
-            // Build the Release file URL for the selected distribution
-            const releaseUrl = `${repoBaseUrl}/dists/${dist}/Release`;
-            console.log(`Fetching Release file from: ${releaseUrl}`);
-            
-            // Fetch the Release file through the proxy
-            const response = await fetch(PROXY_URL + encodeURIComponent(releaseUrl));
-            
-            if (response.status !== 200) {
-                throw new Error(`Failed to fetch Release file for ${dist}: ${response.statusText}`);
-            }
-            
-            const releaseContent = await response.text();
-
-            // Parse the Release file content
-            releaseInfo = parseReleaseFile(releaseContent);
-            console.log(`Successfully parsed Release file for ${dist}`);
+            // Release details were discovered with the distribution list
+            releaseInfo = releaseInfoFor(dist);
             
             // Update info grid with the new release info
             updateReleaseInfoGrid();
@@ -451,6 +414,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     option.textContent = arch;
                     archSelect.appendChild(option);
                 });
+                appendAllOption(archSelect, releaseInfo.Architectures, 'All architectures');
                 console.log(`Loaded ${releaseInfo.Architectures.length} architectures`);
             } else {
                 console.warn("No architectures found in Release file");
@@ -464,6 +428,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     option.textContent = component;
                     componentSelect.appendChild(option);
                 });
+                appendAllOption(componentSelect, releaseInfo.Components, 'All components');
                 console.log(`Loaded ${releaseInfo.Components.length} components`);
             } else {
                 console.warn("No components found in Release file");
@@ -525,6 +490,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 option.textContent = arch;
                 archSelect.appendChild(option);
             });
+            appendAllOption(archSelect, releaseInfo.Architectures, 'All architectures');
         }
 
         // Populate component dropdown
@@ -536,6 +502,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 option.textContent = component;
                 componentSelect.appendChild(option);
             });
+            appendAllOption(componentSelect, releaseInfo.Components, 'All components');
         }
         
         // Populate distribution dropdown
@@ -556,44 +523,22 @@ document.addEventListener('DOMContentLoaded', () => {
         releaseInfoDiv.style.display = 'block';
     }
 
-    function showPackagesTable() {
-        if (!packages.length) {
+    function showPackagesTable(pageData) {
+        if (!pageData || !pageData.total_packages) {
             packageCountDiv.style.display = 'none';
             tableContainerDiv.style.display = 'none';
             return;
         }
         
-        // Render the table (which now updates the package count)
-        renderTable();
-        
-        // Show the table container
+        // Show the table container first so the viewport has a height
         tableContainerDiv.style.display = 'block';
+        renderTable(pageData);
     }
 
-    function renderTable() {
-        const filteredPackages = getFilteredPackages();
-        
-        // Group packages by name
-        const packageGroups = {};
-        filteredPackages.forEach(pkg => {
-            if (!packageGroups[pkg.name]) {
-                packageGroups[pkg.name] = [];
-            }
-            packageGroups[pkg.name].push(pkg);
-        });
-        
-        // Convert grouped packages back to an array for pagination
-        const groupedPackages = Object.keys(packageGroups).map(name => ({
-            name,
-            versions: packageGroups[name]
-        }));
-        
-        // Sort the grouped packages
-        groupedPackages.sort((a, b) => a.name.localeCompare(b.name));
-        
+    function renderTable(pageData) {
         // Update package count display to reflect current filtered results versus total
-        const foundUniquePackages = Object.keys(packageGroups).length;
-        const foundVersions = filteredPackages.length;
+        const foundUniquePackages = pageData.total;
+        const foundVersions = pageData.found_versions;
         
         if (searchQuery) {
             packageCountDiv.textContent = `Found ${foundUniquePackages} of ${totalUniquePackages} packages`;
@@ -602,156 +547,152 @@ document.addEventListener('DOMContentLoaded', () => {
         }
         
         packageCountDiv.style.display = 'block';
-        
-        // Update pagination with the new count
-        const totalPages = Math.max(1, Math.ceil(groupedPackages.length / pageSize));
-        totalPagesSpan.textContent = totalPages;
-        
-        // Adjust current page if needed
-        if (currentPage > totalPages) {
-            currentPage = totalPages;
-            pageInput.value = currentPage;
-        }
-        
-        // Update pagination buttons state
-        firstPageBtn.disabled = currentPage === 1;
-        prevPageBtn.disabled = currentPage === 1;
-        nextPageBtn.disabled = currentPage === totalPages;
-        lastPageBtn.disabled = currentPage === totalPages;
-
-        // Calculate start and end indices for current page
-        const startIndex = (currentPage - 1) * pageSize;
-        const endIndex = Math.min(startIndex + pageSize, groupedPackages.length);
-        
-        // Clear the table
-        packagesTable.innerHTML = '';
-        
-        // Helper function to build download URL
-        function buildDownloadUrl(filename) {
-            // Remove any trailing slashes from base URL
-            const cleanBaseUrl = repoBaseUrl.replace(/\/+$/, '');
-            // Remove any leading slashes from filename and ensure it doesn't start with 'pool/'
-            let cleanFilename = filename.replace(/^\/+/, '');
-            if (!cleanFilename.startsWith('pool/')) {
-                cleanFilename = `pool/${cleanFilename}`;
+
+        // Start over with the first block of the new result list
+        totalRows = foundUniquePackages;
+        rowBlocks = new Map([[0, pageData.packages]]);
+        packagesViewport.scrollTop = 0;
+        renderRows();
+    }
+
+    function scheduleRender() {
+        // Render at most once per frame while scrolling
+        if (renderPending) return;
+        renderPending = true;
+        requestAnimationFrame(() => {
+            renderPending = false;
+            renderRows();
+        });
+    }
+
+    function renderRows() {
+        const first = Math.max(0, Math.floor(packagesViewport.scrollTop / ROW_HEIGHT) - OVERSCAN_ROWS);
+        const visibleRows = Math.ceil(packagesViewport.clientHeight / ROW_HEIGHT);
+        const last = Math.min(totalRows, first + visibleRows + 2 * OVERSCAN_ROWS);
+
+        // Spacer rows stand in for everything outside the window, so the
+        // scrollbar reflects the whole result list
+        const fragment = document.createDocumentFragment();
+        fragment.appendChild(spacerRow(first * ROW_HEIGHT));
+        for (let i = first; i < last; i++) {
+            const block = Math.floor(i / BLOCK_SIZE);
+            const packages = rowBlocks.get(block);
+            if (packages === undefined) {
+                loadBlock(block);
             }
-            // Combine with a single slash
-            return `${cleanBaseUrl}/${cleanFilename}`;
+            const packageGroup = packages && packages[i % BLOCK_SIZE];
+            fragment.appendChild(packageGroup ? buildRow(packageGroup) : placeholderRow());
         }
+        fragment.appendChild(spacerRow((totalRows - last) * ROW_HEIGHT));
+        packagesTable.replaceChildren(fragment);
+    }
 
-        // Add package rows
-        for (let i = startIndex; i < endIndex; i++) {
-            const packageGroup = groupedPackages[i];
-            const row = document.createElement('tr');
-            
-            // Package name
-            const nameCell = document.createElement('td');
-            nameCell.textContent = packageGroup.name;
-            row.appendChild(nameCell);
-            
-            // Version cell with dropdown if multiple versions exist
-            const versionCell = document.createElement('td');
-            
-            if (packageGroup.versions.length > 1) {
-                // Create dropdown for multiple versions
-                const select = document.createElement('select');
-                select.className = 'version-dropdown';
-                
-                packageGroup.versions.forEach(version => {
-                    const option = document.createElement('option');
-                    option.value = version.version;
-                    option.textContent = version.version;
-                    option.dataset.filename = version.filename;
-                    select.appendChild(option);
-                });
-                
-                // Create download button
-                const downloadButton = document.createElement('button');
-                downloadButton.className = 'download-button';
-                downloadButton.textContent = 'Download';
-                
-                // Set initial download URL
-                const initialPackage = packageGroup.versions[0];
-                const initialDownloadUrl = buildDownloadUrl(initialPackage.filename);
-                downloadButton.title = initialDownloadUrl;
-                downloadButton.onclick = () => {
-                    window.open(initialDownloadUrl, '_blank');
-                };
-                
-                // Update download URL when version changes
-                select.addEventListener('change', (e) => {
-                    const selectedVersion = e.target.value;
-                    const selectedPackage = packageGroup.versions.find(v => v.version === selectedVersion);
-                    const downloadUrl = buildDownloadUrl(selectedPackage.filename);
-                    downloadButton.title = downloadUrl;
-                    downloadButton.onclick = () => {
-                        window.open(downloadUrl, '_blank');
-                    };
-                });
-                
-                versionCell.appendChild(select);
-                row.appendChild(versionCell);
-                
-                // Download button cell
-                const downloadCell = document.createElement('td');
-                downloadCell.appendChild(downloadButton);
-                row.appendChild(downloadCell);
-            } else {
-                // Single version, no dropdown needed
-                const singlePackage = packageGroup.versions[0];
-                versionCell.textContent = singlePackage.version;
-                row.appendChild(versionCell);
-                
-                // Download button for single version
-                const downloadCell = document.createElement('td');
-                const downloadButton = document.createElement('button');
-                downloadButton.className = 'download-button';
-                downloadButton.textContent = 'Download';
-                
-                const downloadUrl = buildDownloadUrl(singlePackage.filename);
-                downloadButton.title = downloadUrl;
-                downloadButton.onclick = () => {
-                    window.open(downloadUrl, '_blank');
-                };
-                
-                downloadCell.appendChild(downloadButton);
-                row.appendChild(downloadCell);
-            }
-            
-            packagesTable.appendChild(row);
+    function spacerRow(height) {
+        const row = document.createElement('tr');
+        row.className = 'spacer-row';
+        const cell = document.createElement('td');
+        cell.colSpan = 3;
+        cell.style.height = `${height}px`;
+        row.appendChild(cell);
+        return row;
+    }
+
+    function placeholderRow() {
+        const row = document.createElement('tr');
+        const cell = document.createElement('td');
+        cell.colSpan = 3;
+        cell.className = 'loading-row';
+        cell.textContent = 'Loading...';
+        row.appendChild(cell);
+        return row;
+    }
+
+    // Helper function to build download URL
+    function buildDownloadUrl(filename) {
+        // Remove any trailing slashes from base URL
+        const cleanBaseUrl = repoBaseUrl.replace(/\/+$/, '');
+        // Remove any leading slashes from filename and ensure it doesn't start with 'pool/'
+        let cleanFilename = filename.replace(/^\/+/, '');
+        if (!cleanFilename.startsWith('pool/')) {
+            cleanFilename = `pool/${cleanFilename}`;
         }
+        // Combine with a single slash
+        return `${cleanBaseUrl}/${cleanFilename}`;
     }
 
-    function getFilteredPackages() {
-        if (!searchQuery) {
-            return sortPackages([...packages]);
+    function buildRow(packageGroup) {
+        const row = document.createElement('tr');
+        
+        // Package name
+        const nameCell = document.createElement('td');
+        nameCell.textContent = packageGroup.name;
+        nameCell.title = packageGroup.name;
+        row.appendChild(nameCell);
+        
+        // Version cell with dropdown if multiple versions exist
+        const versionCell = document.createElement('td');
+        
+        // Download button
+        const downloadCell = document.createElement('td');
+        const downloadButton = document.createElement('button');
+        downloadButton.className = 'download-button';
+        downloadButton.textContent = 'Download';
+        
+        const setDownload = (version) => {
+            const downloadUrl = buildDownloadUrl(version.filename);
+            downloadButton.title = downloadUrl;
+            downloadButton.onclick = () => {
+                window.open(downloadUrl, '_blank');
+            };
+        };
+        setDownload(packageGroup.versions[0]);
+        
+        if (packageGroup.versions.length > 1) {
+            // Create dropdown for multiple versions
+            const select = document.createElement('select');
+            select.className = 'version-dropdown';
+            
+            packageGroup.versions.forEach(version => {
+                const option = document.createElement('option');
+                option.value = version.version;
+                option.textContent = formatVersion(version);
+                option.dataset.filename = version.filename;
+                select.appendChild(option);
+            });
+            
+            // Update download URL when version changes
+            select.addEventListener('change', (e) => {
+                setDownload(packageGroup.versions[e.target.selectedIndex]);
+            });
+            
+            versionCell.appendChild(select);
+        } else {
+            // Single version, no dropdown needed
+            versionCell.textContent = formatVersion(packageGroup.versions[0]);
         }
+        row.appendChild(versionCell);
         
-        const filtered = packages.filter(pkg => 
-            pkg.name.toLowerCase().includes(searchQuery)
-        );
-        
-        return sortPackages(filtered);
+        downloadCell.appendChild(downloadButton);
+        row.appendChild(downloadCell);
+        return row;
     }
 
-    function sortPackages(pkgs) {
-        return pkgs.sort((a, b) => {
-            const fieldA = a[sortField].toLowerCase();
-            const fieldB = b[sortField].toLowerCase();
-            
-            if (sortDirection === 'asc') {
-                return fieldA.localeCompare(fieldB);
-            } else {
-                return fieldB.localeCompare(fieldA);
-            }
-        });
+    function formatVersion(version) {
+        // Versions from merged indexes also show where they come from
+        if (version.component) {
+            return `${version.version} (${version.component}/${version.architecture || 'unknown'})`;
+        }
+        return version.version;
     }
 
-    function getTotalPages() {
-        // Get grouped package count for pagination
-        const filteredPackages = getFilteredPackages();
-        const uniquePackageNames = new Set(filteredPackages.map(pkg => pkg.name));
-        return Math.max(1, Math.ceil(uniquePackageNames.size / pageSize));
+    function appendAllOption(select, values, label) {
+        // Offer loading every value at once when there is a choice
+        if (values.length > 1) {
+            const option = document.createElement('option');
+            option.value = 'all';
+            option.textContent = label;
+            select.appendChild(option);
+        }
     }
 
     function showLoading(isLoading) {
@@ -775,90 +716,12 @@ document.addEventListener('DOMContentLoaded', () => {
         tableContainerDiv.style.display = 'none';
         
         // Clear packages data
-        packages = [];
+        totalRows = 0;
+        rowBlocks = new Map();
         packagesTable.innerHTML = '';
         packagesUrl = '';
     }
 
-    // Helper functions for parsing
-    function parseReleaseFile(content) {
-        const info = {};
-        const lines = content.split('\n');
-        let currentKey = null;
-        let currentValue = [];
-
-        for (const line of lines) {
-            if (!line.trim()) continue;
-
-            if (line.startsWith(' ')) {
-                // Continuation of previous field
-                if (currentKey) {
-                    currentValue.push(line.trim());
-                }
-            } else {
-                // Save previous field if exists
-                if (currentKey) {
-                    info[currentKey] = currentValue.length > 1 ? currentValue : currentValue[0];
-                    currentValue = [];
-                }
-
-                // Parse new field
-                const colonIndex = line.indexOf(': ');
-                if (colonIndex > 0) {
-                    const key = line.substring(0, colonIndex);
-                    const value = line.substring(colonIndex + 2).trim();
-                    currentKey = key;
-                    currentValue = [value];
-                }
-            }
-        }
-
-        // Save last field
-        if (currentKey) {
-            info[currentKey] = currentValue.length > 1 ? currentValue : currentValue[0];
-        }
-
-        // Parse special fields into arrays
-        if (info.Architectures) {
-            info.Architectures = info.Architectures.split(' ').filter(Boolean);
-        }
-        if (info.Components) {
-            info.Components = info.Components.split(' ').filter(Boolean);
-        }
-
-        return info;
-    }
-
-    function parsePackages(content) {
-        const packages = [];
-        const blocks = content.split('\n\n');
-        
-        for (const block of blocks) {
-            if (!block.trim()) continue;
-            
-            const pkg = {};
-            const lines = block.split('\n');
-            
-            for (const line of lines) {
-                const colonIndex = line.indexOf(': ');
-                if (colonIndex <= 0) continue;
-                
-                const key = line.substring(0, colonIndex);
-                const value = line.substring(colonIndex + 2).trim();
-                
-                if (key === 'Package') pkg.name = value;
-                else if (key === 'Version') pkg.version = value;
-                else if (key === 'Filename') pkg.filename = value;
-            }
-            
-            if (pkg.name && pkg.version && pkg.filename) {
-                packages.push(pkg);
-            }
-        }
-        
-        return packages;
-    }
-
     function buildPackagesUrl(baseUrl, dist, component, arch, gzExtension = false) {
         const cleanBaseUrl = baseUrl.replace(/\/$/, '');
         let basePackageUrl;
@@ -888,14 +751,15 @@ document.addEventListener('DOMContentLoaded', () => {
         // Reset state variables
         releaseInfo = null;
         packagesUrl = '';
-        packages = [];
+        totalRows = 0;
+        rowBlocks = new Map();
         totalUniquePackages = 0;
         totalPackageVersions = 0;
-        currentPage = 1;
-        pageInput.value = 1;
         searchQuery = '';
+        clearTimeout(searchTimer);
         searchQueryInput.value = '';
         availableDists = [];
+        distsInfo = {};
         
         // Reset UI selectors
         distSelect.innerHTML = '<option value="">Select Distribution</option>';
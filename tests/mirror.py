@@ -0,0 +1,115 @@
+"""
+A tiny local stand-in for an APT mirror, used by the offline tests.
+
+Files are served from an in-memory mapping of URL path to bytes. ETag and
+Last-Modified validators are sent for every file and conditional requests
+are answered with 304, so caching behaviour can be exercised without
+touching the network.
+"""
+import hashlib
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _MirrorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        mirror = self.server.mirror
+        path = self.path.split('?', 1)[0]
+        mirror.record(path, self.headers, self.client_address)
+        if mirror.delay:
+            time.sleep(mirror.delay)
+
+        body = mirror.files.get(path)
+        if body is None:
+            listing = mirror.listing(path)
+            if listing is None:
+                self._send(404, b'Not Found')
+                return
+            self._send(200, listing, {'Content-Type': 'text/html'})
+            return
+
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+        validators = {'ETag': etag, 'Last-Modified': mirror.last_modified}
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, b'', validators)
+            return
+        self._send(200, body, validators)
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalMirror:
+    """
+    Serve ``files`` (path -> bytes) over HTTP on an ephemeral local port.
+
+    Use as a context manager; ``url`` is the base URL of the mirror,
+    ``requests`` records every (path, headers) pair received and
+    ``clients`` the client address of each request. ``delay`` holds back
+    every response by that many seconds, like a slow mirror.
+    """
+
+    def __init__(self, files=None, directory_listings=False, delay=0):
+        self.files = dict(files or {})
+        self.directory_listings = directory_listings
+        self.delay = delay
+        self.requests = []
+        self.clients = []
+        self.last_modified = formatdate(usegmt=True)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _MirrorHandler)
+        self._server.daemon_threads = True
+        self._server.mirror = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def record(self, path, headers, client_address=None):
+        with self._lock:
+            self.requests.append((path, dict(headers)))
+            self.clients.append(client_address)
+
+    def hits(self, path):
+        """Number of requests received for ``path``"""
+        with self._lock:
+            return sum(1 for requested, _ in self.requests if requested == path)
+
+    def listing(self, path):
+        """Render a minimal HTML index for a directory, if enabled"""
+        if not self.directory_listings or not path.endswith('/'):
+            return None
+        names = set()
+        for file_path in self.files:
+            if file_path.startswith(path):
+                head, sep, _ = file_path[len(path):].partition('/')
+                names.add(head + sep)
+        if not names:
+            return None
+        links = ''.join(f'<a href="{name}">{name}</a>\n' for name in sorted(names))
+        return f'<html><body>{links}</body></html>'.encode('utf-8')
@@ -0,0 +1,95 @@
+import unittest
+import os
+import sys
+import io
+import json
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, index_cache, parsed_indexes
+from lib.apt_parser import AptParser
+from lib.package_index import PackageIndex, diff_indexes
+from mirror import LocalMirror
+
+
+def packages(*entries):
+    return ''.join(
+        f"Package: {name}\nVersion: {version}\nFilename: pool/{name}_{version}.deb\n\n"
+        for name, version in entries
+    )
+
+
+OLD = packages(('bash', '5.2.15-2'), ('curl', '7.88.1-9'), ('libfoo', '1.0'), ('zsh', '5.9-4'))
+NEW = packages(('bash', '5.2.15-2'), ('curl', '7.88.1-10'), ('htop', '3.2.2-2'), ('zsh', '5.9-4~bpo1'))
+
+
+def index(text):
+    return PackageIndex(AptParser.iter_records(io.StringIO(text)))
+
+
+class TestDiffIndexes(unittest.TestCase):
+    """Test the merge join between two package indexes"""
+
+    def test_added_removed_and_changed(self):
+        """Differences come out in name order; unchanged packages are skipped"""
+        self.assertEqual(list(diff_indexes(index(OLD), index(NEW))), [
+            {'name': 'curl', 'change': 'changed', 'old': ['7.88.1-9'], 'new': ['7.88.1-10'], 'direction': 'up'},
+            {'name': 'htop', 'change': 'added', 'new': ['3.2.2-2']},
+            {'name': 'libfoo', 'change': 'removed', 'old': ['1.0']},
+            {'name': 'zsh', 'change': 'changed', 'old': ['5.9-4'], 'new': ['5.9-4~bpo1'], 'direction': 'down'},
+        ])
+
+    def test_identical_and_empty_indexes(self):
+        """Identical indexes have no differences; an empty side adds or removes everything"""
+        self.assertEqual(list(diff_indexes(index(OLD), index(OLD))), [])
+        self.assertEqual([d['change'] for d in diff_indexes(index(''), index(NEW))], ['added'] * 4)
+        self.assertEqual([d['change'] for d in diff_indexes(index(OLD), index(''))], ['removed'] * 4)
+
+
+class TestDiffApi(unittest.TestCase):
+    """Test the /api/diff endpoint against a local mirror"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        parsed_indexes.clear()
+        self.mirror = LocalMirror({
+            '/debian/dists/bookworm/main/binary-amd64/Packages': OLD.encode('utf-8'),
+            '/debian/dists/bookworm-updates/main/binary-amd64/Packages': NEW.encode('utf-8'),
+        }).__enter__()
+        self.params = {
+            'from_repo': self.mirror.url + '/debian',
+            'from_dist': 'bookworm',
+            'from_component': 'main',
+            'from_arch': 'amd64',
+            'to_dist': 'bookworm-updates',
+        }
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+
+    def test_streams_differences(self):
+        """Differences are streamed as JSON lines followed by a summary"""
+        response = self.app.get('/api/diff', query_string=self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([line['name'] for line in lines[:-1]], ['curl', 'htop', 'libfoo', 'zsh'])
+        self.assertEqual(lines[-1], {'summary': {'added': 1, 'removed': 1, 'changed': 2}})
+
+    def test_missing_parameters(self):
+        """The old side must be fully described"""
+        response = self.app.get('/api/diff', query_string={'from_repo': self.params['from_repo']})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('from_dist', response.get_json()['error'])
+
+    def test_missing_packages_file(self):
+        """An unknown suite passes the upstream 404 through"""
+        response = self.app.get('/api/diff', query_string=dict(self.params, to_dist='trixie'))
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
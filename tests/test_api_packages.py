@@ -0,0 +1,162 @@
+import unittest
+import os
+import sys
+import gzip
+import io
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, index_cache, parsed_indexes
+from lib.apt_parser import AptParser
+from lib.package_index import PackageIndex
+from mirror import LocalMirror
+
+PACKAGES = """Package: zsh
+Version: 5.9-4
+Size: 1234
+Filename: pool/main/z/zsh/zsh_5.9-4_amd64.deb
+
+Package: bash
+Version: 5.2.15-2
+Filename: pool/main/b/bash/bash_5.2.15-2_amd64.deb
+
+Package: bash
+Version: 5.2.21-1
+Filename: pool/main/b/bash/bash_5.2.21-1_amd64.deb
+
+Package: bash-completion
+Version: 1:2.11-6
+Filename: pool/main/b/bash-completion/bash-completion_2.11-6_all.deb
+
+Package: coreutils
+Version: 9.1-1
+Filename: pool/main/c/coreutils/coreutils_9.1-1_amd64.deb
+"""
+
+
+class TestPackageIndex(unittest.TestCase):
+    """Test grouping, searching and paging in PackageIndex"""
+
+    def setUp(self):
+        self.index = PackageIndex(AptParser.iter_records(io.StringIO(PACKAGES)))
+
+    def test_groups_are_sorted_by_name(self):
+        """Packages are grouped by name and sorted once at build time"""
+        self.assertEqual(self.index.names, ['bash', 'bash-completion', 'coreutils', 'zsh'])
+        self.assertEqual(self.index.total_versions, 5)
+
+    def test_search_and_paging(self):
+        """Search filters by name substring and paging slices the result"""
+        result = self.index.page('BASH', page=2, per_page=1)
+        self.assertEqual(result['total'], 2)
+        self.assertEqual(result['pages'], 2)
+        self.assertEqual(result['found_versions'], 3)
+        self.assertEqual([pkg['name'] for pkg in result['packages']], ['bash-completion'])
+
+    def test_descending_order_and_page_clamping(self):
+        """Descending order walks the sorted names backwards; pages are clamped"""
+        result = self.index.page(page=99, per_page=3, descending=True)
+        self.assertEqual(result['page'], 2)
+        self.assertEqual([pkg['name'] for pkg in result['packages']], ['bash'])
+
+    def test_window_by_offset(self):
+        """Windows start at any offset of the result list and report the next cursor"""
+        result = self.index.window(offset=1, limit=2)
+        self.assertEqual([pkg['name'] for pkg in result['packages']], ['bash-completion', 'coreutils'])
+        self.assertEqual(result['next'], 'coreutils')
+        last = self.index.window(offset=3, limit=2)
+        self.assertEqual([pkg['name'] for pkg in last['packages']], ['zsh'])
+        self.assertIsNone(last['next'])
+
+    def test_window_after_cursor(self):
+        """A cursor continues right behind the named package, in either order"""
+        result = self.index.window(after='bash', limit=10)
+        self.assertEqual(result['offset'], 1)
+        self.assertEqual([pkg['name'] for pkg in result['packages']], ['bash-completion', 'coreutils', 'zsh'])
+        # The cursor need not be in the result list itself
+        result = self.index.window('bash', after='bash-a', limit=10)
+        self.assertEqual([pkg['name'] for pkg in result['packages']], ['bash-completion'])
+        result = self.index.window(after='coreutils', limit=10, descending=True)
+        self.assertEqual([pkg['name'] for pkg in result['packages']], ['bash-completion', 'bash'])
+
+
+class TestPackagesApi(unittest.TestCase):
+    """Test the /api/packages endpoint against a local mirror"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        parsed_indexes.clear()
+        # Only the gzipped variant exists, as on many mirrors
+        self.mirror = LocalMirror({
+            '/debian/dists/bookworm/main/binary-amd64/Packages.gz': gzip.compress(PACKAGES.encode('utf-8')),
+        }).__enter__()
+        self.params = {
+            'repo': self.mirror.url + '/debian',
+            'dist': 'bookworm',
+            'component': 'main',
+            'arch': 'amd64',
+        }
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+
+    def test_returns_requested_page(self):
+        """The endpoint returns one page of grouped packages and totals"""
+        response = self.app.get('/api/packages', query_string=dict(self.params, q='bash', per_page=1))
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertTrue(data['url'].endswith('/Packages.gz'))
+        self.assertEqual(data['total_packages'], 4)
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['packages'], [{
+            'name': 'bash',
+            'versions': [
+                {'version': '5.2.21-1', 'filename': 'pool/main/b/bash/bash_5.2.21-1_amd64.deb'},
+                {'version': '5.2.15-2', 'filename': 'pool/main/b/bash/bash_5.2.15-2_amd64.deb'},
+            ],
+        }])
+
+    def test_index_is_reused_between_requests(self):
+        """Further pages are answered from the parsed index without refetching"""
+        self.app.get('/api/packages', query_string=self.params)
+        self.app.get('/api/packages', query_string=dict(self.params, page=2))
+        self.assertEqual(self.mirror.hits('/debian/dists/bookworm/main/binary-amd64/Packages.gz'), 1)
+
+    def test_extra_fields(self):
+        """Requested stanza fields are included for each version"""
+        response = self.app.get('/api/packages', query_string=dict(self.params, q='zsh', fields='Size,Section'))
+        versions = response.get_json()['packages'][0]['versions']
+        self.assertEqual(versions[0]['Size'], '1234')
+        self.assertNotIn('Section', versions[0])
+
+        response = self.app.get('/api/packages', query_string=dict(self.params, fields='Bogus'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_window_paging(self):
+        """offset and after select windows for scrolling clients"""
+        response = self.app.get('/api/packages', query_string=dict(self.params, offset=2, per_page=1))
+        data = response.get_json()
+        self.assertEqual((data['offset'], data['total']), (2, 4))
+        self.assertEqual([pkg['name'] for pkg in data['packages']], ['coreutils'])
+        self.assertNotIn('page', data)
+
+        response = self.app.get('/api/packages', query_string=dict(self.params, after=data['next'], per_page=5))
+        self.assertEqual([pkg['name'] for pkg in response.get_json()['packages']], ['zsh'])
+
+    def test_missing_parameters(self):
+        """Missing parameters are reported with a 400"""
+        response = self.app.get('/api/packages', query_string={'repo': self.params['repo']})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('dist', response.get_json()['error'])
+
+    def test_missing_packages_file(self):
+        """An unknown component passes the upstream 404 through"""
+        response = self.app.get('/api/packages', query_string=dict(self.params, component='contrib'))
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import os
+import sys
+import gzip
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fixtures import build_mirror_files, generate_packages
+from benchmarks.run import percentile
+from lib.apt_parser import AptParser
+
+
+class TestBenchmarkFixtures(unittest.TestCase):
+    def test_packages_are_deterministic_and_parse(self):
+        """Generated Packages files parse into the requested number of stanzas"""
+        data = generate_packages(50)
+        self.assertEqual(data, generate_packages(50))
+
+        packages = AptParser.parse_packages(data.decode('utf-8'))
+        self.assertEqual(len(packages), 50)
+        self.assertEqual(len({package['name'] for package in packages}), 50)
+        for package in packages:
+            self.assertIn('version', package)
+            self.assertTrue(package['filename'].startswith('pool/main/'))
+
+    def test_mirror_files_are_listed_in_release(self):
+        """The Release file of each distribution lists its Packages files with checksums"""
+        files = build_mirror_files([10])
+        dist = '/debian/dists/bench-10'
+        plain = files[f'{dist}/main/binary-amd64/Packages']
+        self.assertEqual(gzip.decompress(files[f'{dist}/main/binary-amd64/Packages.gz']), plain)
+
+        info = AptParser.parse_release_file(files[f'{dist}/Release'].decode('utf-8'))
+        self.assertEqual(info['Codename'], 'bench-10')
+        checksums = AptParser.parse_release_checksums(info)
+        self.assertEqual(set(checksums), {'main/binary-amd64/Packages', 'main/binary-amd64/Packages.gz'})
+        self.assertEqual(checksums['main/binary-amd64/Packages'][0], len(plain))
+
+    def test_percentile(self):
+        values = [5, 1, 4, 2, 3]
+        self.assertEqual(percentile(values, 0.5), 3)
+        self.assertEqual(percentile(values, 0.99), 5)
+        self.assertEqual(percentile([7], 0.99), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
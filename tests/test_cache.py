@@ -0,0 +1,143 @@
+import unittest
+import os
+import sys
+import gzip
+import tempfile
+import time
+from unittest import mock
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as app_module
+from app import app, fetch_file, index_cache
+from lib.cache import IndexCache
+from mirror import LocalMirror
+
+PACKAGES_GZ_PATH = '/debian/dists/bookworm/main/binary-amd64/Packages.gz'
+PACKAGES = b'Package: hello\nVersion: 2.10-3\nFilename: pool/main/h/hello/hello_2.10-3_amd64.deb\n'
+
+
+class TestIndexCache(unittest.TestCase):
+    """Test the IndexCache storage layer"""
+
+    def test_lru_eviction_respects_byte_budget(self):
+        """The least recently used entries are evicted once over budget"""
+        cache = IndexCache(max_bytes=10)
+        cache.put('a', b'aaaa')
+        cache.put('b', b'bbbb')
+        cache.get('a')
+        cache.put('c', b'cccc')
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_oversized_entries_are_not_stored(self):
+        """Bodies larger than the whole budget are never cached"""
+        cache = IndexCache(max_bytes=4)
+        self.assertIsNone(cache.put('a', b'too large'))
+        self.assertIsNone(cache.get('a'))
+
+    def test_ttl_and_touch(self):
+        """Entries go stale after the TTL and touch() refreshes them"""
+        cache = IndexCache(ttl=60)
+        entry = cache.put('a', b'body', etag='"x"')
+        self.assertTrue(cache.is_fresh(entry))
+        entry.fetched_at = time.time() - 120
+        self.assertFalse(cache.is_fresh(entry))
+        self.assertEqual(entry.conditional_headers(), {'If-None-Match': '"x"'})
+        cache.touch('a')
+        self.assertTrue(cache.is_fresh(cache.get('a')))
+
+    def test_directory_is_shared_between_instances(self):
+        """Separate cache instances (workers) see each other's entries"""
+        with tempfile.TemporaryDirectory() as directory:
+            first = IndexCache(directory=directory)
+            second = IndexCache(directory=directory)
+            first.put('a', b'shared body', etag='"1"')
+            self.assertEqual(second.get('a').body, b'shared body')
+
+            first.put('a', b'new body', etag='"2"')
+            self.assertEqual(second.get('a').etag, '"2"')
+
+    def test_contains_does_not_load_the_body(self):
+        """contains() finds entries stored by another instance without reading them into memory"""
+        with tempfile.TemporaryDirectory() as directory:
+            IndexCache(directory=directory).put('a', b'shared body')
+            cache = IndexCache(directory=directory)
+            self.assertTrue(cache.contains('a'))
+            self.assertFalse(cache.contains('b'))
+
+
+class TestProxyCache(unittest.TestCase):
+    """Test that /proxy serves repeat requests from the cache"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        self.mirror = LocalMirror({PACKAGES_GZ_PATH: gzip.compress(PACKAGES)}).__enter__()
+        self.url = self.mirror.url + PACKAGES_GZ_PATH
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+        index_cache.clear()
+
+    def test_repeat_request_is_served_from_cache(self):
+        """A fresh entry is served without contacting upstream"""
+        first = self.app.get('/proxy', query_string={'url': self.url})
+        self.assertEqual(first.data, PACKAGES)
+        self.assertEqual(first.headers['X-Cache'], 'MISS')
+
+        second = self.app.get('/proxy', query_string={'url': self.url})
+        self.assertEqual(second.data, PACKAGES)
+        self.assertEqual(second.headers['X-Cache'], 'HIT')
+        self.assertEqual(self.mirror.hits(PACKAGES_GZ_PATH), 1)
+
+    def test_stale_entry_is_revalidated(self):
+        """A stale entry is revalidated with If-None-Match and reused on 304"""
+        self.app.get('/proxy', query_string={'url': self.url}).get_data()
+        index_cache.get(self.url).fetched_at -= index_cache.ttl + 1
+
+        response = self.app.get('/proxy', query_string={'url': self.url})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, PACKAGES)
+        self.assertEqual(response.headers['X-Cache'], 'REVALIDATED')
+
+        _, headers = self.mirror.requests[-1]
+        self.assertIn('If-None-Match', headers)
+        self.assertIn('If-Modified-Since', headers)
+
+
+class TestFetchFileCache(unittest.TestCase):
+    """Test revalidation of the files the API fetches"""
+
+    def setUp(self):
+        index_cache.clear()
+        self.mirror = LocalMirror({PACKAGES_GZ_PATH: gzip.compress(PACKAGES)}).__enter__()
+        self.url = self.mirror.url + PACKAGES_GZ_PATH
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+        index_cache.clear()
+
+    def test_entry_evicted_during_revalidation(self):
+        """A 304 for an entry evicted in the meantime still returns the revalidated copy"""
+        fetch_file(self.url)
+        index_cache.get(self.url).fetched_at -= index_cache.ttl + 1
+
+        open_upstream = app_module.open_upstream
+        def evict_and_open(*args, **kwargs):
+            index_cache.clear()
+            return open_upstream(*args, **kwargs)
+
+        with mock.patch.object(app_module, 'open_upstream', side_effect=evict_and_open):
+            status_code, entry = fetch_file(self.url)
+        self.assertEqual(status_code, 200)
+        self.assertEqual(entry.body, PACKAGES)
+        _, headers = self.mirror.requests[-1]
+        self.assertIn('If-None-Match', headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
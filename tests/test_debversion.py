@@ -0,0 +1,80 @@
+import unittest
+import os
+import sys
+import io
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from lib.apt_parser import AptParser
+from lib.debversion import compare_versions, split_version, version_key
+from lib.package_index import PackageIndex
+
+# (older, newer) pairs, checked against dpkg --compare-versions
+ORDERED = [
+    ('1.9', '1.10'),
+    ('1.0~rc1', '1.0'),
+    ('1.0~~', '1.0~'),
+    ('1.0~', '1.0~a'),
+    ('1.0', '1.0a'),
+    ('1.0a', '1.0+b1'),
+    ('1.0', '1.0.0'),
+    ('1.0-1', '1.0-1.1'),
+    ('2.0-1~bpo1', '2.0-1'),
+    ('2.0-1', '2.0-1+deb12u1'),
+    ('7.88.1-9', '7.88.1-10'),
+    ('9.9', '1:0.9'),
+    ('1:9', '10:1'),
+    ('0a', 'a'),
+]
+
+EQUAL = [
+    ('1.0', '0:1.0'),
+    ('1.0', '1.0-0'),
+    ('1.0.', '1.0.0'),
+    ('1.01', '1.1'),
+]
+
+
+class TestVersionOrdering(unittest.TestCase):
+    """Test the dpkg-compatible version comparison"""
+
+    def test_ordered_pairs(self):
+        for older, newer in ORDERED:
+            self.assertLess(compare_versions(older, newer), 0, (older, newer))
+            self.assertGreater(compare_versions(newer, older), 0, (older, newer))
+            self.assertLess(version_key(older), version_key(newer), (older, newer))
+
+    def test_equal_versions(self):
+        for a, b in EQUAL:
+            self.assertEqual(compare_versions(a, b), 0, (a, b))
+            self.assertEqual(version_key(a), version_key(b), (a, b))
+
+    def test_sorting(self):
+        versions = ['1.10', '1:0.1', '1.9', '1.9~rc1', '1.9-1']
+        self.assertEqual(sorted(versions, key=version_key), ['1.9~rc1', '1.9', '1.9-1', '1.10', '1:0.1'])
+
+    def test_split_version(self):
+        self.assertEqual(split_version('2:1.0-2-3'), (2, '1.0-2', '3'))
+        self.assertEqual(split_version('1.0'), (0, '1.0', ''))
+
+
+class TestIndexVersionOrder(unittest.TestCase):
+    """Test that package groups list their newest version first"""
+
+    def test_groups_are_ordered_newest_first(self):
+        packages = ''.join(
+            f"Package: foo\nVersion: {version}\nFilename: pool/foo_{version}.deb\n\n"
+            for version in ['1.9', '1.10', '1.10~rc1', '1:0.5']
+        )
+        records = list(AptParser.iter_records(io.StringIO(packages)))
+        self.assertEqual(records[0].version_key, version_key('1.9'))
+
+        index = PackageIndex(records)
+        versions = [version['version'] for version in index.group(0)['versions']]
+        self.assertEqual(versions, ['1:0.5', '1.10', '1.10~rc1', '1.9'])
+        self.assertEqual(index.latest(0).version, '1:0.5')
+
+
+if __name__ == '__main__':
+    unittest.main()
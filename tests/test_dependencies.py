@@ -0,0 +1,193 @@
+import unittest
+import os
+import sys
+import gzip
+import io
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, index_cache, parsed_indexes
+from lib.apt_parser import AptParser
+from lib.dependencies import Relation, parse_relations
+from lib.package_index import INDEX_FIELDS, PackageIndex
+from mirror import LocalMirror
+
+PACKAGES = """Package: libfoo1
+Version: 1.2-1
+Provides: libfoo-abi-1
+Built-Using: gcc-12 (= 12.2.0-14)
+Filename: pool/main/f/foo/libfoo1_1.2-1_amd64.deb
+MD5sum: 0123456789abcdef0123456789abcdef
+
+Package: libfoo1
+Version: 1.1-1
+Filename: pool/main/f/foo/libfoo1_1.1-1_amd64.deb
+
+Package: foo-tools
+Version: 1.2-1
+Depends: libfoo1 (>= 1.2), libc6:any (>= 2.36) [amd64]
+Recommends: mail-transport-agent | bar
+Filename: pool/main/f/foo/foo-tools_1.2-1_amd64.deb
+
+Package: bar
+Version: 2.0-1
+Pre-Depends: libfoo-abi-1
+Suggests: foo-tools
+Filename: pool/main/b/bar/bar_2.0-1_amd64.deb
+
+Package: exim4
+Version: 4.96-1
+Provides: mail-transport-agent
+Depends: libfoo1, exim4
+Filename: pool/main/e/exim4/exim4_4.96-1_amd64.deb
+
+Package: postfix
+Version: 3.7-1
+Provides: mail-transport-agent, postfix (= 3.7-1)
+Filename: pool/main/p/postfix/postfix_3.7-1_amd64.deb
+"""
+
+
+class TestParseRelations(unittest.TestCase):
+    """Test parsing of Depends-style fields"""
+
+    def test_groups_and_alternatives(self):
+        """Commas separate groups and pipes separate alternatives"""
+        self.assertEqual(parse_relations('a (>= 1.0), b | c (<< 2:3~rc1)'), [
+            [Relation('a', '>=', '1.0')],
+            [Relation('b', None, None), Relation('c', '<<', '2:3~rc1')],
+        ])
+
+    def test_qualifiers_and_restrictions(self):
+        """Architecture qualifiers, restriction lists and line breaks are ignored"""
+        self.assertEqual(parse_relations('python3:any (>= 3.11) [amd64 arm64] <!nocheck>,\n libx'), [
+            [Relation('python3', '>=', '3.11')],
+            [Relation('libx', None, None)],
+        ])
+        self.assertEqual(parse_relations(' , '), [])
+
+
+class TestDependencyGraph(unittest.TestCase):
+    """Test forward and reverse lookups in the dependency graph"""
+
+    def setUp(self):
+        index = PackageIndex(AptParser.iter_records(io.StringIO(PACKAGES), INDEX_FIELDS))
+        self.graph = index.dependency_graph()
+        self.index = index
+
+    def test_graph_is_built_once(self):
+        """The graph is kept with its index"""
+        self.assertIs(self.index.dependency_graph(), self.graph)
+
+    def test_reverse_depends_include_virtual_packages(self):
+        """Packages depending on a virtual package provided by libfoo1 are found too"""
+        self.assertEqual(self.graph.reverse_depends('libfoo1'), [
+            {'name': 'bar', 'version': '2.0-1', 'field': 'Pre-Depends', 'via': 'libfoo-abi-1'},
+            {'name': 'exim4', 'version': '4.96-1', 'field': 'Depends', 'via': None},
+            {'name': 'foo-tools', 'version': '1.2-1', 'field': 'Depends', 'via': None},
+        ])
+
+    def test_self_relations_are_skipped(self):
+        """Packages depending on or providing their own name do not list themselves"""
+        self.assertEqual(self.graph.reverse_depends('exim4'), [
+            {'name': 'foo-tools', 'version': '1.2-1', 'field': 'Recommends', 'via': 'mail-transport-agent'},
+        ])
+        self.assertEqual(self.graph.provides('postfix'), ['mail-transport-agent'])
+
+    def test_forward_depends_resolve_providers(self):
+        """Alternatives report whether they exist and which packages provide them"""
+        depends = self.graph.depends(self.index.latest(self.index.names.index('foo-tools')))
+        self.assertEqual(depends['Depends'][1], [{
+            'name': 'libc6', 'op': '>=', 'version': '2.36', 'available': False, 'provided_by': [],
+        }])
+        self.assertEqual(depends['Recommends'], [[
+            {'name': 'mail-transport-agent', 'op': None, 'version': None,
+             'available': False, 'provided_by': ['exim4', 'postfix']},
+            {'name': 'bar', 'op': None, 'version': None, 'available': True, 'provided_by': []},
+        ]])
+
+
+class TestPackageApi(unittest.TestCase):
+    """Test the /api/package endpoint against a local mirror"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mirror = LocalMirror({
+            '/debian/dists/bookworm/main/binary-amd64/Packages.gz': gzip.compress(PACKAGES.encode('utf-8')),
+        }).__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mirror.__exit__(None, None, None)
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        parsed_indexes.clear()
+        self.params = {
+            'repo': self.mirror.url + '/debian',
+            'dist': 'bookworm',
+            'component': 'main',
+            'arch': 'amd64',
+        }
+
+    def get(self, **params):
+        return self.app.get('/api/package', query_string=dict(self.params, **params))
+
+    def test_package_details(self):
+        """Versions carry their stanzas and the newest version's relationships are resolved"""
+        response = self.get(name='libfoo1')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertFalse(data['virtual'])
+        self.assertEqual(data['version'], '1.2-1')
+        self.assertEqual([version['version'] for version in data['versions']], ['1.2-1', '1.1-1'])
+        self.assertEqual(data['versions'][0]['stanza']['Provides'], 'libfoo-abi-1')
+        self.assertEqual(data['provides'], ['libfoo-abi-1'])
+        self.assertEqual([entry['name'] for entry in data['reverse_depends']], ['bar', 'exim4', 'foo-tools'])
+
+    def test_full_stanza(self):
+        """Fields outside the index are read back from the cached Packages file"""
+        version = self.get(name='libfoo1').get_json()['versions'][0]
+        self.assertTrue(version['stanza_complete'])
+        self.assertEqual(version['stanza']['Built-Using'], 'gcc-12 (= 12.2.0-14)')
+        self.assertEqual(version['stanza']['MD5sum'], '0123456789abcdef0123456789abcdef')
+
+    def test_stanza_of_uncached_file(self):
+        """Without a cached Packages file only the indexed fields are returned"""
+        max_bytes = index_cache.max_bytes
+        index_cache.max_bytes = 100
+        try:
+            version = self.get(name='libfoo1').get_json()['versions'][0]
+        finally:
+            index_cache.max_bytes = max_bytes
+        self.assertFalse(version['stanza_complete'])
+        self.assertEqual(version['stanza']['Provides'], 'libfoo-abi-1')
+        self.assertNotIn('Built-Using', version['stanza'])
+
+    def test_selected_version(self):
+        """Forward relationships follow the requested version"""
+        data = self.get(name='foo-tools', version='1.2-1').get_json()
+        self.assertEqual(data['depends']['Depends'][0][0]['name'], 'libfoo1')
+        self.assertEqual(self.get(name='foo-tools', version='0.1').status_code, 404)
+
+    def test_virtual_package(self):
+        """A name only provided by other packages is reported as virtual"""
+        data = self.get(name='mail-transport-agent').get_json()
+        self.assertTrue(data['virtual'])
+        self.assertEqual(data['provided_by'], ['exim4', 'postfix'])
+        self.assertEqual(data['reverse_depends'], [
+            {'name': 'foo-tools', 'version': '1.2-1', 'field': 'Recommends', 'via': None},
+        ])
+
+    def test_errors(self):
+        """Unknown packages give 404 and missing parameters 400"""
+        self.assertEqual(self.get(name='nonexistent').status_code, 404)
+        response = self.app.get('/api/package', query_string={'repo': self.params['repo']})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import os
+import sys
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, discovered_dists, index_cache
+from lib.apt_parser import AptParser
+from mirror import LocalMirror
+
+
+def make_release(suite, codename, components='main', archs='amd64 arm64'):
+    return (
+        f"Origin: Test\nSuite: {suite}\nCodename: {codename}\nDate: Sat, 10 Jun 2023 09:30:00 UTC\n"
+        f"Architectures: {archs}\nComponents: {components}\nSHA256:\n"
+        f" 0123 10 main/binary-amd64/Packages\n"
+    ).encode('utf-8')
+
+
+def clearsign(body):
+    return (
+        b"-----BEGIN PGP SIGNED MESSAGE-----\nHash: SHA512\n\n" + body
+        + b"-----BEGIN PGP SIGNATURE-----\n\niQIzBAEBCgAdFiEE\n-----END PGP SIGNATURE-----\n"
+    )
+
+
+class TestReleaseParsing(unittest.TestCase):
+    """Test parsing of clearsigned Release files and dists listings"""
+
+    def test_clearsigned_release(self):
+        """Armor headers and the signature of an InRelease file are dropped"""
+        info = AptParser.parse_release_file(clearsign(make_release('stable', 'bookworm')).decode('utf-8'))
+        self.assertEqual(info['Codename'], 'bookworm')
+        self.assertEqual(info['Components'], ['main'])
+        self.assertNotIn('Hash', info)
+        self.assertEqual(info['SHA256'], '0123 10 main/binary-amd64/Packages')
+
+    def test_dash_escaped_lines(self):
+        """Dash-escaped lines of the signed text are unescaped"""
+        signed = b"-----BEGIN PGP SIGNED MESSAGE-----\nHash: SHA256\n\nSuite: a\n- -Note: b\n" \
+                 b"-----BEGIN PGP SIGNATURE-----\n"
+        self.assertEqual(AptParser.strip_signature(signed.decode('utf-8')), 'Suite: a\n-Note: b')
+
+    def test_dists_listing(self):
+        """Subdirectory links are extracted from an HTML listing"""
+        html = '<a href="../">../</a><a href="bookworm/">bookworm/</a><A HREF="./trixie/">t</A><a href="x.gz">x</a>'
+        self.assertEqual(AptParser.parse_dists_listing(html), ['bookworm', 'trixie'])
+
+
+class TestDistsDiscovery(unittest.TestCase):
+    """Test the /api/dists endpoint against a local mirror"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        discovered_dists.clear()
+
+    def discover(self, files, directory_listings=False):
+        with LocalMirror(files, directory_listings=directory_listings) as mirror:
+            response = self.app.get('/api/dists', query_string={'repo': mirror.url + '/debian'})
+            return mirror, response
+
+    def test_well_known_dists_without_listing(self):
+        """Well-known suites and their companions are found without a directory listing"""
+        mirror, response = self.discover({
+            '/debian/dists/bookworm/InRelease': clearsign(make_release('stable', 'bookworm')),
+            '/debian/dists/bookworm-updates/Release': make_release('stable-updates', 'bookworm-updates'),
+            '/debian/dists/noble/Release': make_release('noble', 'noble', 'main universe', 'amd64'),
+        })
+        self.assertEqual(response.status_code, 200)
+        dists = response.get_json()['dists']
+        self.assertEqual([dist['dist'] for dist in dists], ['bookworm', 'bookworm-updates', 'noble'])
+        bookworm = dists[0]
+        self.assertTrue(bookworm['signed'])
+        self.assertTrue(bookworm['url'].endswith('/dists/bookworm/InRelease'))
+        self.assertEqual(bookworm['architectures'], ['amd64', 'arm64'])
+        self.assertEqual(bookworm['date'], 'Sat, 10 Jun 2023 09:30:00 UTC')
+        self.assertEqual(bookworm['release']['Suite'], 'stable')
+        self.assertNotIn('SHA256', bookworm['release'])
+        self.assertFalse(dists[1]['signed'])
+        self.assertEqual(dists[2]['components'], ['main', 'universe'])
+
+    def test_listed_dists(self):
+        """Distributions named in a /dists/ listing are probed too"""
+        mirror, response = self.discover({
+            '/debian/dists/custom-suite/Release': make_release('custom', 'custom-suite'),
+        }, directory_listings=True)
+        self.assertEqual([dist['dist'] for dist in response.get_json()['dists']], ['custom-suite'])
+
+    def test_summary_is_cached(self):
+        """A second discovery is answered without probing the mirror again"""
+        files = {'/debian/dists/jammy/Release': make_release('jammy', 'jammy')}
+        with LocalMirror(files) as mirror:
+            params = {'repo': mirror.url + '/debian'}
+            self.app.get('/api/dists', query_string=params)
+            probes = len(mirror.requests)
+            second = self.app.get('/api/dists', query_string=params)
+            self.assertEqual(second.get_json()['dists'][0]['dist'], 'jammy')
+            self.assertEqual(len(mirror.requests), probes)
+
+    def test_no_dists(self):
+        """A repository without any Release file gives 404"""
+        mirror, response = self.discover({})
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.get_json())
+        self.assertEqual(self.app.get('/api/dists').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+import os
+import sys
+import io
+import hashlib
+import tempfile
+from unittest import mock
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, index_cache, parsed_indexes
+from lib.cache import IndexCache
+from lib.apt_parser import AptParser
+from lib.index_file import IndexFormatError, MappedPackageIndex, open_index, write_index
+from lib.package_index import INDEX_FIELDS, PackageIndex
+from mirror import LocalMirror
+
+PACKAGES = """Package: zsh
+Version: 5.9-4
+Architecture: amd64
+Size: 1234
+Filename: pool/main/z/zsh/zsh_5.9-4_amd64.deb
+Description: shell with lots of features
+
+Package: bash
+Version: 5.2.15-2
+Architecture: amd64
+Filename: pool/main/b/bash/bash_5.2.15-2_amd64.deb
+Description: GNU Bourne Again SHell
+
+Package: bash
+Version: 5.2.21-1
+Architecture: amd64
+Filename: pool/main/b/bash/bash_5.2.21-1_amd64.deb
+Description: GNU Bourne Again SHell
+
+Package: bash-completion
+Version: 1:2.11-6
+Architecture: all
+Filename: pool/main/b/bash-completion/bash-completion_2.11-6_all.deb
+Description: programmable completion for the bash shell
+"""
+
+
+class TestIndexFile(unittest.TestCase):
+    """Test writing and memory-mapping package index files"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'main.index')
+        records = AptParser.iter_records(io.StringIO(PACKAGES), INDEX_FIELDS, component='main')
+        self.index = PackageIndex(records)
+        write_index(self.index, self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """A mapped index holds the same groups and records as the original"""
+        mapped = open_index(self.path)
+        self.assertEqual(list(mapped.names), self.index.names)
+        self.assertEqual(mapped.total_versions, 4)
+        self.assertEqual(mapped.groups[0][1].fields(), self.index.groups[0][1].fields())
+        self.assertEqual(mapped.groups[0][1].component, 'main')
+        self.assertEqual(mapped.latest(0).version, '5.2.21-1')
+
+    def test_queries_match_original(self):
+        """Search, paging and extra fields give the same results as the in-memory index"""
+        mapped = open_index(self.path)
+        for query in ('', 'bash', 'sh', '^bash-', 'description:shell', 'nothing'):
+            for descending in (False, True):
+                self.assertEqual(
+                    mapped.page(query, per_page=2, descending=descending, fields=['Size', 'Architecture']),
+                    self.index.page(query, per_page=2, descending=descending, fields=['Size', 'Architecture']),
+                    query
+                )
+
+    def test_invalid_files(self):
+        """Files that are not complete index files are rejected"""
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for content in (b'', b'Package: bash\n', data[:len(data) // 2]):
+            with open(self.path, 'wb') as f:
+                f.write(content)
+            with self.assertRaises(IndexFormatError):
+                open_index(self.path)
+
+
+class TestIndexFileCache(unittest.TestCase):
+    """Test that /api/packages shares index files through the cache directory"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        self.directory = tempfile.TemporaryDirectory()
+        self.patch = mock.patch.object(index_cache, 'directory', self.directory.name)
+        self.patch.start()
+        index_cache.clear()
+        parsed_indexes.clear()
+        self.mirror = LocalMirror({
+            '/debian/dists/bookworm/main/binary-amd64/Packages': PACKAGES.encode('utf-8'),
+        }).__enter__()
+        self.params = {
+            'repo': self.mirror.url + '/debian',
+            'dist': 'bookworm',
+            'component': 'main',
+            'arch': 'amd64',
+        }
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+        index_cache.clear()
+        parsed_indexes.clear()
+        self.patch.stop()
+        self.directory.cleanup()
+
+    def test_index_file_is_reused(self):
+        """A second worker (empty in-memory caches) opens the stored index instead of parsing"""
+        first = self.app.get('/api/packages', query_string=self.params).get_json()
+        index_files = [name for name in os.listdir(self.directory.name) if name.endswith('.index')]
+        self.assertEqual(len(index_files), 1)
+
+        parsed_indexes.clear()
+        with mock.patch.object(AptParser, 'iter_records', side_effect=AssertionError('parsed again')):
+            second = self.app.get('/api/packages', query_string=self.params).get_json()
+        self.assertEqual(second['packages'], first['packages'])
+        self.assertIsInstance(parsed_indexes.get(
+            AptParser.build_packages_url(self.params['repo'], 'bookworm', 'main', 'amd64'),
+            index_cache.get(self.mirror.url + '/debian/dists/bookworm/main/binary-amd64/Packages').version
+        ), MappedPackageIndex)
+
+    def test_stored_index_is_opened_without_the_body(self):
+        """A fresh worker finds the stored index from the Release file and never loads the Packages file"""
+        packages = PACKAGES.encode('utf-8')
+        release = f"Codename: bookworm\nSHA256:\n {hashlib.sha256(packages).hexdigest()} {len(packages)} " \
+                  f"main/binary-amd64/Packages\n"
+        with LocalMirror({
+            '/debian/dists/bookworm/Release': release.encode('utf-8'),
+            '/debian/dists/bookworm/main/binary-amd64/Packages': packages,
+        }) as mirror:
+            params = dict(self.params, repo=mirror.url + '/debian')
+            first = self.app.get('/api/packages', query_string=params).get_json()
+
+            parsed_indexes.clear()
+            fresh = IndexCache(directory=self.directory.name)
+            with mock.patch('app.index_cache', fresh), mock.patch.object(fresh, 'get', wraps=fresh.get) as get:
+                second = self.app.get('/api/packages', query_string=params).get_json()
+            self.assertEqual(second['packages'], first['packages'])
+            # Only the Release file is read into memory
+            self.assertEqual({call.args[0] for call in get.call_args_list},
+                             {mirror.url + '/debian/dists/bookworm/Release'})
+            self.assertEqual(mirror.hits('/debian/dists/bookworm/main/binary-amd64/Packages'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
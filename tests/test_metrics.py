@@ -0,0 +1,170 @@
+import unittest
+import os
+import sys
+import gzip
+import logging
+import random
+from unittest import mock
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, index_cache, parsed_indexes
+from lib import metrics
+from lib.metrics import Counter, Histogram, SampledLogger, TimedIterator, host_of
+from mirror import LocalMirror
+
+PACKAGES_PATH = '/debian/dists/bookworm/main/binary-amd64/Packages'
+
+PACKAGES = ''.join(
+    f"Package: pkg{i}\nVersion: 1.{i}-1\nFilename: pool/main/p/pkg{i}/pkg{i}_1.{i}-1_amd64.deb\n\n"
+    for i in range(200)
+).encode('utf-8')
+
+
+class TestMetricTypes(unittest.TestCase):
+    """Test counters, histograms and the text exposition format"""
+
+    def setUp(self):
+        # Keep the test metrics out of the shared registry
+        patcher = mock.patch.object(metrics, '_metrics', [])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counter_render(self):
+        """Counters are rendered with a _total suffix and their labels"""
+        counter = Counter('test_requests', 'Requests', ['host', 'cache'])
+        counter.inc('a.example', 'HIT')
+        counter.inc('a.example', 'HIT', amount=2)
+        counter.inc('b.example', 'MISS')
+        self.assertEqual(counter.value('a.example', 'HIT'), 3)
+        self.assertEqual(metrics.render().splitlines(), [
+            '# HELP test_requests Requests',
+            '# TYPE test_requests counter',
+            'test_requests_total{host="a.example",cache="HIT"} 3',
+            'test_requests_total{host="b.example",cache="MISS"} 1',
+        ])
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Each bucket counts all observations up to its bound"""
+        histogram = Histogram('test_seconds', 'Seconds', buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+        self.assertEqual(histogram.count(), 4)
+        self.assertEqual(metrics.render().splitlines()[2:], [
+            'test_seconds_bucket{le="0.1"} 2',
+            'test_seconds_bucket{le="1.0"} 3',
+            'test_seconds_bucket{le="+Inf"} 4',
+            'test_seconds_sum 2.65',
+            'test_seconds_count 4',
+        ])
+
+    def test_label_values_are_escaped(self):
+        """Quotes and backslashes in label values do not break the format"""
+        counter = Counter('test_escape', 'Escaping', ['value'])
+        counter.inc('a"b\\c')
+        self.assertIn('test_escape_total{value="a\\"b\\\\c"} 1', metrics.render())
+
+    def test_host_of(self):
+        """Upstream hosts are used as labels, without port or path"""
+        self.assertEqual(host_of('http://deb.debian.org:8080/debian/dists/'), 'deb.debian.org')
+        self.assertEqual(host_of('not a url'), 'unknown')
+
+
+class TestTimedIterator(unittest.TestCase):
+    """Test timing and sizing of iterated chunks"""
+
+    def test_counts_bytes_and_closes(self):
+        """Item lengths are summed and close reaches the wrapped generator"""
+        closed = []
+
+        def chunks():
+            try:
+                yield b'abc'
+                yield b'de'
+            finally:
+                closed.append(True)
+
+        timed = TimedIterator(chunks())
+        self.assertEqual(next(timed), b'abc')
+        timed.close()
+        self.assertEqual(timed.bytes, 3)
+        self.assertGreaterEqual(timed.seconds, 0)
+        self.assertEqual(closed, [True])
+
+
+class TestSampledLogger(unittest.TestCase):
+    """Test that per-request messages are sampled"""
+
+    def test_rate(self):
+        """Only about the sampled fraction of messages is emitted"""
+        logger = logging.getLogger('webapt.test_sampled')
+        sampled = SampledLogger(logger, rate=0.25)
+        with mock.patch('lib.metrics.random.random', random.Random(1).random), \
+                self.assertLogs(logger, logging.INFO) as logs:
+            for i in range(1000):
+                sampled.info("message %d", i)
+        self.assertLess(abs(len(logs.records) - 250), 50)
+
+    def test_full_rate_emits_everything(self):
+        """A rate of 1 logs every message"""
+        logger = logging.getLogger('webapt.test_sampled')
+        with self.assertLogs(logger, logging.DEBUG) as logs:
+            for i in range(10):
+                SampledLogger(logger).debug("message %d", i)
+        self.assertEqual(len(logs.records), 10)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    """Test the /metrics endpoint after requests against a local mirror"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mirror = LocalMirror({
+            PACKAGES_PATH + '.gz': gzip.compress(PACKAGES),
+        }).__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mirror.__exit__(None, None, None)
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        parsed_indexes.clear()
+
+    def metric_lines(self):
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        return response.get_data(as_text=True).splitlines()
+
+    def test_proxy_stages_are_recorded(self):
+        """A proxied .gz download reports its cache result, transfer and decompression"""
+        self.app.get('/proxy', query_string={'url': self.mirror.url + PACKAGES_PATH + '.gz'}).get_data()
+        self.app.get('/proxy', query_string={'url': self.mirror.url + PACKAGES_PATH + '.gz'}).get_data()
+        lines = self.metric_lines()
+        self.assertIn('webapt_proxy_requests_total{host="127.0.0.1",cache="MISS"}', '\n'.join(lines))
+        self.assertIn('webapt_proxy_requests_total{host="127.0.0.1",cache="HIT"}', '\n'.join(lines))
+        for name in ('webapt_upstream_download_seconds_count{host="127.0.0.1"}',
+                     'webapt_upstream_download_bytes_count{host="127.0.0.1"}',
+                     'webapt_decompress_seconds_count{host="127.0.0.1",compression="gz"}',
+                     'webapt_upstream_ttfb_seconds_count{host="127.0.0.1"}',
+                     'webapt_request_seconds_count{endpoint="proxy",status="200"}'):
+            self.assertTrue(any(line.startswith(name + ' ') for line in lines), name)
+
+    def test_index_stages_are_recorded(self):
+        """Loading packages for the API reports parse and index build times"""
+        response = self.app.get('/api/packages', query_string={
+            'repo': self.mirror.url + '/debian', 'dist': 'bookworm', 'component': 'main', 'arch': 'amd64',
+        })
+        self.assertEqual(response.status_code, 200)
+        text = '\n'.join(self.metric_lines())
+        self.assertIn('webapt_fetch_requests_total{host="127.0.0.1",cache="MISS"}', text)
+        self.assertIn('webapt_parse_seconds_count{host="127.0.0.1"}', text)
+        self.assertIn('webapt_index_build_seconds_count{host="127.0.0.1"}', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import os
+import sys
+import gzip
+import time
+from unittest import mock
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as app_module
+from app import app, index_cache, load_index, parsed_indexes
+from mirror import LocalMirror
+
+RELEASE = b"""Origin: Ubuntu
+Suite: noble
+Codename: noble
+Architectures: amd64 arm64
+Components: main universe
+"""
+
+
+def packages_file(component, arch):
+    """A Packages file with one package per file and a shared arch: all package"""
+    return (
+        f"Package: tool-{component}\n"
+        f"Version: 1.0\n"
+        f"Architecture: {arch}\n"
+        f"Filename: pool/{component}/t/tool-{component}/tool-{component}_1.0_{arch}.deb\n"
+        f"\n"
+        f"Package: data-common\n"
+        f"Version: 2.0\n"
+        f"Architecture: all\n"
+        f"Filename: pool/main/d/data-common/data-common_2.0_all.deb\n"
+    ).encode('utf-8')
+
+
+class SlowMirror(LocalMirror):
+    """Mirror that delays every Packages request to expose serial loading"""
+
+    delay = 0.3
+
+    def record(self, path, headers, client_address=None):
+        super().record(path, headers, client_address)
+        if '/binary-' in path:
+            time.sleep(self.delay)
+
+
+class TestParallelLoad(unittest.TestCase):
+    """Test loading several components/architectures into one index"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        parsed_indexes.clear()
+        files = {'/ubuntu/dists/noble/Release': RELEASE}
+        for component in ('main', 'universe'):
+            for arch in ('amd64', 'arm64'):
+                path = f'/ubuntu/dists/noble/{component}/binary-{arch}/Packages.gz'
+                files[path] = gzip.compress(packages_file(component, arch))
+        self.mirror = SlowMirror(files).__enter__()
+        self.params = {'repo': self.mirror.url + '/ubuntu', 'dist': 'noble'}
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+
+    def test_all_components_and_architectures(self):
+        """'all' expands from the Release file and the results are merged"""
+        started = time.monotonic()
+        response = self.app.get('/api/packages', query_string=dict(self.params, component='all', arch='all'))
+        elapsed = time.monotonic() - started
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+
+        self.assertIsNone(data['url'])
+        self.assertEqual(len(data['sources']), 4)
+        self.assertEqual(data['total_packages'], 3)
+        # Four tool builds plus a single copy of the arch: all package
+        self.assertEqual(data['total_versions'], 5)
+
+        tool = next(pkg for pkg in data['packages'] if pkg['name'] == 'tool-universe')
+        self.assertEqual(
+            sorted((v['component'], v['architecture']) for v in tool['versions']),
+            [('universe', 'amd64'), ('universe', 'arm64')]
+        )
+        # Each Packages file is delayed (twice with the .gz fallback); loading
+        # them one after the other would take at least 8 delays
+        self.assertLess(elapsed, 8 * SlowMirror.delay)
+
+    def test_explicit_lists_and_missing_files(self):
+        """Comma-separated selections work and missing files are reported"""
+        response = self.app.get('/api/packages', query_string=dict(self.params, component='main,contrib', arch='amd64'))
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([s['component'] for s in data['sources']], ['main'])
+        self.assertEqual(data['missing'], [{'component': 'contrib', 'arch': 'amd64'}])
+
+    def test_merged_index_is_reused(self):
+        """A repeated merged load returns the same merged index"""
+        first, _, _ = load_index(self.params['repo'], 'noble', ['main', 'universe'], ['amd64'])
+        second, _, _ = load_index(self.params['repo'], 'noble', ['main', 'universe'], ['amd64'])
+        self.assertIs(first, second)
+        self.assertTrue(first.merged)
+
+    def test_selection_larger_than_index_cache(self):
+        """A merge of more files than the index cache holds is reused without parsing them again"""
+        max_entries = parsed_indexes.max_entries
+        parsed_indexes.max_entries = 2
+        try:
+            with mock.patch.object(app_module, 'build_packages_index',
+                                   wraps=app_module.build_packages_index) as build:
+                first = load_index(self.params['repo'], 'noble', ['main', 'universe'], ['amd64', 'arm64'])[0]
+                self.assertEqual(build.call_count, 4)
+                second = load_index(self.params['repo'], 'noble', ['main', 'universe'], ['amd64', 'arm64'])[0]
+                self.assertEqual(build.call_count, 4)
+            self.assertIs(first, second)
+        finally:
+            parsed_indexes.max_entries = max_entries
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import os
+import sys
+import gzip
+import io
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from lib.apt_parser import AptParser, PackageRecord
+from lib.upstream import iter_gunzip, open_stream
+
+PACKAGES = """Package: hello
+Version: 2.10-3
+Architecture: amd64
+Filename: pool/main/h/hello/hello_2.10-3_amd64.deb
+Description: example package based on GNU hello
+ The GNU hello program produces a familiar, friendly greeting.
+ .
+ It allows non-programmers to use a classic computer science tool.
+
+Package: incomplete
+Version: 1.0
+
+Package: zlib1g
+Version: 1:1.2.13.dfsg-1
+Filename: pool/main/z/zlib/zlib1g_1.2.13.dfsg-1_amd64.deb
+"""
+
+EXPECTED = [
+    {'name': 'hello', 'version': '2.10-3', 'filename': 'pool/main/h/hello/hello_2.10-3_amd64.deb'},
+    {'name': 'zlib1g', 'version': '1:1.2.13.dfsg-1', 'filename': 'pool/main/z/zlib/zlib1g_1.2.13.dfsg-1_amd64.deb'},
+]
+
+
+class TestIterPackages(unittest.TestCase):
+    """Test the streaming AptParser.iter_packages API"""
+
+    def test_text_stream(self):
+        """Text streams yield the same packages as parse_packages"""
+        self.assertEqual(list(AptParser.iter_packages(io.StringIO(PACKAGES))), EXPECTED)
+        self.assertEqual(AptParser.parse_packages(PACKAGES), EXPECTED)
+
+    def test_binary_stream_without_trailing_newline(self):
+        """Binary streams are decoded and the last stanza needs no blank line"""
+        data = PACKAGES.rstrip('\n').encode('utf-8')
+        self.assertEqual(list(AptParser.iter_packages(io.BytesIO(data))), EXPECTED)
+
+    def test_yields_lazily(self):
+        """The first package is available before the stream is exhausted"""
+        lines = iter(PACKAGES.splitlines(keepends=True))
+        packages = AptParser.iter_packages(lines)
+        self.assertEqual(next(packages)['name'], 'hello')
+        self.assertGreater(len(list(lines)), 0)
+
+    def test_live_gzip_stream(self):
+        """Packages can be parsed straight from a chunked gzip download"""
+        compressed = gzip.compress(PACKAGES.encode('utf-8'))
+        chunks = (compressed[i:i + 7] for i in range(0, len(compressed), 7))
+        stream = open_stream(iter_gunzip(chunks))
+        self.assertEqual(list(AptParser.iter_packages(stream)), EXPECTED)
+
+
+
+class TestIterRecords(unittest.TestCase):
+    """Test compact PackageRecord parsing with field projection"""
+
+    def test_all_fields_are_captured(self):
+        """By default every field, including multi-line ones, is kept"""
+        record = next(AptParser.iter_records(io.StringIO(PACKAGES)))
+        self.assertIsInstance(record, PackageRecord)
+        self.assertEqual(record.to_dict(), EXPECTED[0])
+        self.assertEqual(record.get('Architecture'), 'amd64')
+        self.assertEqual(record.get('Description').splitlines(), [
+            'example package based on GNU hello',
+            ' The GNU hello program produces a familiar, friendly greeting.',
+            ' .',
+            ' It allows non-programmers to use a classic computer science tool.',
+        ])
+        self.assertEqual(list(record.fields())[:2], ['Package', 'Version'])
+
+    def test_projection(self):
+        """Only the requested fields are kept besides the required ones"""
+        records = list(AptParser.iter_records(io.StringIO(PACKAGES), fields=['Architecture']))
+        self.assertEqual([r.name for r in records], ['hello', 'zlib1g'])
+        self.assertEqual(records[0].keys, ('Architecture',))
+        self.assertIsNone(records[0].get('Description'))
+        self.assertEqual(records[1].keys, ())
+
+    def test_layouts_and_values_are_shared(self):
+        """Records share their field-name tuple and interned repeated values"""
+        content = '\n'.join(
+            f'Package: p{i}\nVersion: 1\nArchitecture: amd64\nSection: utils\nFilename: p{i}.deb\n'
+            for i in range(3)
+        )
+        records = list(AptParser.iter_records(io.BytesIO(content.encode('utf-8'))))
+        self.assertIs(records[0].keys, records[2].keys)
+        self.assertIs(records[0].get('Section'), records[2].get('Section'))
+        self.assertFalse(hasattr(records[0], '__dict__'))
+
+
+class TestFindStanza(unittest.TestCase):
+    """Test looking up a single stanza in a Packages file"""
+
+    def test_find_by_name_and_filename(self):
+        """The matching stanza is returned with every field; other names and files give None"""
+        body = ('Version: 0\nPackage: zlib1g\nFilename: other.deb\n\n' + PACKAGES).encode('utf-8')
+        stanza = AptParser.find_stanza(body, 'zlib1g', 'pool/main/z/zlib/zlib1g_1.2.13.dfsg-1_amd64.deb')
+        self.assertEqual(stanza['Version'], '1:1.2.13.dfsg-1')
+        self.assertEqual(AptParser.find_stanza(body, 'zlib1g', 'other.deb'), {
+            'Version': '0', 'Package': 'zlib1g', 'Filename': 'other.deb',
+        })
+        self.assertEqual(AptParser.find_stanza(body, 'hello', 'pool/main/h/hello/hello_2.10-3_amd64.deb')
+                         ['Description'].count('\n'), 3)
+        self.assertIsNone(AptParser.find_stanza(body, 'zlib', 'other.deb'))
+        self.assertIsNone(AptParser.find_stanza(body, 'hello', 'other.deb'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+import unittest
+import os
+import sys
+import difflib
+import gzip
+import hashlib
+import lzma
+from unittest import mock
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, fetch_packages_file, index_cache, parsed_indexes
+from lib.pdiff import PDiffError, PDiffIndex, apply_ed_patch
+from mirror import LocalMirror
+
+DIST_PATH = '/debian/dists/sid'
+BINARY_PATH = DIST_PATH + '/main/binary-amd64'
+
+
+def make_packages(versions):
+    """A Packages file with one stanza per (name, version)"""
+    return ''.join(
+        f"Package: {name}\nVersion: {version}\nFilename: pool/main/{name}_{version}_amd64.deb\n\n"
+        for name, version in versions
+    ).encode('utf-8')
+
+
+def ed_script(old, new):
+    """Build a ``diff --ed`` style script turning ``old`` into ``new``"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    opcodes = difflib.SequenceMatcher(a=old_lines, b=new_lines, autojunk=False).get_opcodes()
+    script = []
+    # ed scripts address the file bottom-up
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        if tag == 'equal':
+            continue
+        if tag == 'insert':
+            script.append(f'{i1}a\n'.encode())
+        elif tag == 'delete':
+            script.append((f'{i1 + 1}d\n' if i2 - i1 == 1 else f'{i1 + 1},{i2}d\n').encode())
+            continue
+        else:
+            script.append((f'{i1 + 1}c\n' if i2 - i1 == 1 else f'{i1 + 1},{i2}c\n').encode())
+        script.extend(new_lines[j1:j2])
+        script.append(b'.\n')
+    return b''.join(script)
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class TestApplyEdPatch(unittest.TestCase):
+    """Test the ed script interpreter"""
+
+    def test_add_change_delete(self):
+        """Append, change and delete commands are applied bottom-up"""
+        lines = [b'a\n', b'b\n', b'c\n', b'd\n']
+        apply_ed_patch(lines, b'4a\ne\n.\n2,3c\nB\n.\n1d\n')
+        self.assertEqual(lines, [b'B\n', b'd\n', b'e\n'])
+
+    def test_single_dot_lines(self):
+        """Lines consisting of a single dot use the s/.// escape"""
+        lines = [b'a\n']
+        apply_ed_patch(lines, b'1a\n..\n.\ns/.//\na\nz\n.\n')
+        self.assertEqual(lines, [b'a\n', b'.\n', b'z\n'])
+
+    def test_invalid_scripts(self):
+        """Out of range addresses and unknown commands are rejected"""
+        with self.assertRaises(PDiffError):
+            apply_ed_patch([b'a\n'], b'5d\n')
+        with self.assertRaises(PDiffError):
+            apply_ed_patch([b'a\n'], b'1x\n')
+        with self.assertRaises(PDiffError):
+            apply_ed_patch([b'a\n'], b'1a\nunterminated\n')
+
+
+class TestPDiffIndex(unittest.TestCase):
+    """Test parsing Packages.diff/Index and planning patches"""
+
+    INDEX = """SHA256-Current: cccc 300
+SHA256-History:
+ aaaa 100 2024-01-01-0000.00
+ bbbb 200 2024-01-02-0000.00
+SHA256-Patches:
+ 1111 10 2024-01-01-0000.00
+ 2222 20 2024-01-02-0000.00
+SHA256-Download:
+ 3333 5 2024-01-01-0000.00.gz
+ 4444 6 2024-01-02-0000.00.gz
+"""
+
+    def test_sequential_patches(self):
+        """Classic indexes apply every patch from the known state onwards"""
+        index = PDiffIndex.parse(self.INDEX)
+        self.assertEqual(index.current, ('cccc', 300))
+        self.assertEqual(index.downloads['2024-01-02-0000.00.gz'], ('4444', 6))
+        self.assertEqual(index.plan('aaaa'), ['2024-01-01-0000.00', '2024-01-02-0000.00'])
+        self.assertEqual(index.plan('bbbb'), ['2024-01-02-0000.00'])
+        self.assertEqual(index.plan('cccc'), [])
+        self.assertIsNone(index.plan('ffff'))
+
+    def test_merged_patches(self):
+        """Merged indexes need a single patch from any known state"""
+        index = PDiffIndex.parse('X-Patch-Precedence: merged\n' + self.INDEX)
+        self.assertEqual(index.plan('aaaa'), ['2024-01-01-0000.00'])
+
+
+class TestPDiffRefresh(unittest.TestCase):
+    """Test refreshing a cached Packages file with PDiffs through /api/packages"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        parsed_indexes.clear()
+
+        versions = [(f'pkg{i:03d}', '1.0') for i in range(300)]
+        self.old = make_packages(versions)
+        versions[10] = ('pkg010', '1.1')
+        versions.append(('pkg999', '0.1'))
+        self.new = make_packages(versions)
+        self.patch = ed_script(self.old, self.new)
+
+        self.mirror = LocalMirror({
+            DIST_PATH + '/Release': self.release(self.old),
+            BINARY_PATH + '/Packages.xz': lzma.compress(self.old),
+        }).__enter__()
+        self.params = {'repo': self.mirror.url + '/debian', 'dist': 'sid',
+                       'component': 'main', 'arch': 'amd64'}
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+
+    def release(self, packages, diff_index=None):
+        files = {'Packages': packages, 'Packages.xz': lzma.compress(packages)}
+        if diff_index is not None:
+            files['Packages.diff/Index'] = diff_index
+        lines = ['Codename: sid', 'Components: main', 'Architectures: amd64', 'SHA256:']
+        lines += [f' {sha256(data)} {len(data)} main/binary-amd64/{name}' for name, data in files.items()]
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def publish_update(self, current=None):
+        """Publish the new Packages file together with a PDiff from the old one"""
+        name = '2024-01-01-0000.00'
+        compressed_patch = gzip.compress(self.patch)
+        diff_index = (
+            f"SHA256-Current: {current or sha256(self.new)} {len(self.new)}\n"
+            f"SHA256-History:\n {sha256(self.old)} {len(self.old)} {name}\n"
+            f"SHA256-Patches:\n {sha256(self.patch)} {len(self.patch)} {name}\n"
+            f"SHA256-Download:\n {sha256(compressed_patch)} {len(compressed_patch)} {name}.gz\n"
+        ).encode('utf-8')
+        self.mirror.files.update({
+            DIST_PATH + '/Release': self.release(self.new, diff_index),
+            BINARY_PATH + '/Packages.xz': lzma.compress(self.new),
+            BINARY_PATH + '/Packages.diff/Index': diff_index,
+            BINARY_PATH + f'/Packages.diff/{name}.gz': compressed_patch,
+        })
+        # Let the cached Release file expire
+        index_cache.get(self.mirror.url + DIST_PATH + '/Release').fetched_at -= index_cache.ttl + 1
+
+    def load(self):
+        return self.app.get('/api/packages', query_string=dict(self.params, q='pkg010')).get_json()
+
+    def test_refresh_applies_patch(self):
+        """Only the patch is downloaded and the result is verified"""
+        self.assertEqual(self.load()['packages'][0]['versions'][0]['version'], '1.0')
+        self.publish_update()
+
+        data = self.load()
+        self.assertEqual(data['packages'][0]['versions'][0]['version'], '1.1')
+        self.assertEqual(data['total_packages'], 301)
+        self.assertEqual(self.mirror.hits(BINARY_PATH + '/Packages.xz'), 1)
+        self.assertEqual(self.mirror.hits(BINARY_PATH + '/Packages.diff/2024-01-01-0000.00.gz'), 1)
+
+    def test_inconsistent_index_falls_back_to_full_download(self):
+        """An index that does not lead to the Release hash is not used"""
+        self.load()
+        self.publish_update(current='0' * 64)
+
+        data = self.load()
+        self.assertEqual(data['packages'][0]['versions'][0]['version'], '1.1')
+        self.assertEqual(self.mirror.hits(BINARY_PATH + '/Packages.xz'), 2)
+        self.assertEqual(self.mirror.hits(BINARY_PATH + '/Packages.diff/2024-01-01-0000.00.gz'), 0)
+
+    def test_unchanged_base_is_not_stored_again(self):
+        """Looking up a cached copy leaves the PDiff base pointer (and the disk store) alone"""
+        self.load()
+        with mock.patch.object(index_cache, 'put', wraps=index_cache.put) as put:
+            for _ in range(3):
+                fetch_packages_file(self.params['repo'], 'sid', 'main', 'amd64')
+        put.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
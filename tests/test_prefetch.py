@@ -0,0 +1,172 @@
+import unittest
+import os
+import sys
+import random
+import tempfile
+import threading
+import time
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, fetch_release, index_cache, load_selection, parsed_indexes
+from lib.prefetch import PrefetchScheduler, PrefetchTarget, parse_targets
+from mirror import LocalMirror
+
+RELEASE = b"""Origin: Debian
+Suite: stable
+Codename: bookworm
+Date: Sat, 10 Jun 2023 08:53:33 UTC
+Architectures: amd64
+Components: main
+"""
+
+PACKAGES = b"""Package: bash
+Version: 5.2.15-2
+Filename: pool/main/b/bash/bash_5.2.15-2_amd64.deb
+"""
+
+
+class TestParseTargets(unittest.TestCase):
+    """Test parsing the PREFETCH_REPOS setting"""
+
+    def test_entries(self):
+        """Entries are separated by semicolons or newlines"""
+        targets = parse_targets('https://a/debian bookworm main amd64;\n https://b/ubuntu noble main,universe all \n')
+        self.assertEqual(targets, [
+            PrefetchTarget('https://a/debian', 'bookworm', 'main', 'amd64'),
+            PrefetchTarget('https://b/ubuntu', 'noble', 'main,universe', 'all'),
+        ])
+        self.assertEqual(parse_targets(''), [])
+
+    def test_incomplete_entry(self):
+        """Entries without components and architectures are rejected"""
+        with self.assertRaises(ValueError):
+            parse_targets('https://a/debian bookworm')
+
+
+class TestPrefetchScheduler(unittest.TestCase):
+    """Test when the scheduler reloads Packages files"""
+
+    def setUp(self):
+        self.release = RELEASE
+        self.loads = []
+        self.target = PrefetchTarget('https://a/debian', 'bookworm', 'main', 'amd64')
+        self.scheduler = PrefetchScheduler(
+            [self.target], fetch_release=lambda repo, dist: self.release,
+            load=lambda *selection: self.loads.append(selection)
+        )
+
+    def test_reloads_only_when_release_changes(self):
+        """An unchanged Release file does not trigger another load"""
+        self.assertTrue(self.scheduler.poll(self.target))
+        self.assertFalse(self.scheduler.poll(self.target))
+        self.release = RELEASE.replace(b'08:53:33', b'14:21:07')
+        self.assertTrue(self.scheduler.poll(self.target))
+        self.assertEqual(self.loads, [('https://a/debian', 'bookworm', 'main', 'amd64')] * 2)
+
+    def test_failed_load_is_retried(self):
+        """A failed load leaves the fingerprint unset so the next poll tries again"""
+        def failing_load(*selection):
+            raise OSError('mirror unreachable')
+        self.scheduler.load = failing_load
+        self.assertFalse(self.scheduler._poll_logged(self.target))
+        self.assertNotIn(self.target, self.scheduler.fingerprints)
+
+    def test_jitter(self):
+        """Poll intervals vary within the jitter fraction"""
+        scheduler = PrefetchScheduler([], None, None, interval=100, jitter=0.2, rng=random.Random(1))
+        delays = [scheduler.next_delay() for _ in range(200)]
+        self.assertTrue(all(80 <= delay <= 120 for delay in delays))
+        self.assertGreater(max(delays) - min(delays), 20)
+
+    def test_concurrency_limit(self):
+        """No more than max_workers polls run at the same time"""
+        lock = threading.Lock()
+        active = []
+        peak = []
+
+        def slow_release(repo, dist):
+            with lock:
+                active.append(dist)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(dist)
+            return RELEASE
+
+        targets = [PrefetchTarget('https://a/debian', f'dist{i}', 'main', 'amd64') for i in range(6)]
+        scheduler = PrefetchScheduler(targets, slow_release, lambda *selection: None,
+                                      interval=0.01, jitter=0, max_workers=2)
+        scheduler.start()
+        time.sleep(0.3)
+        scheduler.stop()
+        self.assertEqual(len(scheduler.fingerprints), 6)
+        self.assertEqual(max(peak), 2)
+
+    @unittest.skipIf(os.name != 'posix', 'file locks are only used on POSIX')
+    def test_single_poller_per_lock_file(self):
+        """Schedulers sharing a lock file poll one at a time and take over when the poller stops"""
+        polls = {'first': [], 'second': []}
+        with tempfile.TemporaryDirectory() as directory:
+            lock_path = os.path.join(directory, 'prefetch.lock')
+            schedulers = {}
+            for name in polls:
+                schedulers[name] = PrefetchScheduler(
+                    [self.target], lambda repo, dist, name=name: polls[name].append(dist) or RELEASE,
+                    lambda *selection: None, interval=0.01, jitter=0, lock_path=lock_path
+                )
+                schedulers[name].lock_retry = 0.05
+            schedulers['first'].start()
+            time.sleep(0.1)
+            schedulers['second'].start()
+            time.sleep(0.2)
+            self.assertTrue(polls['first'])
+            self.assertEqual(polls['second'], [])
+            schedulers['first'].stop()
+            time.sleep(0.3)
+            schedulers['second'].stop()
+            self.assertTrue(polls['second'])
+
+
+class TestPrefetchWarmsIndex(unittest.TestCase):
+    """Test that a poll leaves the index ready for /api/packages"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        parsed_indexes.clear()
+        self.mirror = LocalMirror({
+            '/debian/dists/bookworm/Release': RELEASE,
+            '/debian/dists/bookworm/main/binary-amd64/Packages': PACKAGES,
+        }).__enter__()
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+
+    def test_requests_hit_warm_index(self):
+        """After a poll the first user request needs no upstream download"""
+        repo = self.mirror.url + '/debian'
+        scheduler = PrefetchScheduler(
+            [PrefetchTarget(repo, 'bookworm', 'main', 'amd64')],
+            fetch_release=lambda repo, dist: fetch_release(repo, dist, revalidate=True),
+            load=load_selection
+        )
+        scheduler.poll(scheduler.targets[0])
+        requests_before = len(self.mirror.requests)
+
+        response = self.app.get('/api/packages', query_string={
+            'repo': repo, 'dist': 'bookworm', 'component': 'main', 'arch': 'amd64'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['total_packages'], 1)
+        self.assertEqual(len(self.mirror.requests), requests_before)
+
+        # A later poll revalidates the Release file but does not reload
+        self.assertFalse(scheduler.poll(scheduler.targets[0]))
+        self.assertEqual(self.mirror.hits('/debian/dists/bookworm/main/binary-amd64/Packages'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
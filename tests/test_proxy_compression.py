@@ -0,0 +1,143 @@
+import unittest
+import os
+import sys
+import gzip
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, index_cache, parsed_indexes
+from mirror import LocalMirror
+
+PACKAGES_PATH = '/debian/dists/bookworm/main/binary-amd64/Packages'
+
+PACKAGES = ''.join(
+    f"Package: pkg{i}\nVersion: 1.{i}-1\nFilename: pool/main/p/pkg{i}/pkg{i}_1.{i}-1_amd64.deb\n\n"
+    for i in range(2000)
+).encode('utf-8')
+
+GZIP = {'Accept-Encoding': 'gzip, deflate, br'}
+
+
+class TestProxyCompression(unittest.TestCase):
+    """Test content negotiation and conditional requests on /proxy"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.packages_gz = gzip.compress(PACKAGES)
+        cls.mirror = LocalMirror({
+            PACKAGES_PATH: PACKAGES,
+            PACKAGES_PATH + '.gz': cls.packages_gz,
+        }).__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mirror.__exit__(None, None, None)
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+
+    def get(self, path, headers=None):
+        return self.app.get('/proxy', query_string={'url': self.mirror.url + path}, headers=headers or {})
+
+    def test_upstream_gzip_is_passed_through(self):
+        """Gzip clients receive the upstream .gz bytes without re-encoding, also from the cache"""
+        first = self.get(PACKAGES_PATH + '.gz', GZIP)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(first.data, self.packages_gz)
+        self.assertIn('Accept-Encoding', first.headers['Vary'])
+
+        second = self.get(PACKAGES_PATH + '.gz', GZIP)
+        self.assertEqual(second.headers['X-Cache'], 'HIT')
+        self.assertEqual(second.data, self.packages_gz)
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+
+    def test_identity_clients_get_inflated_body(self):
+        """Clients without gzip support still get the decompressed text"""
+        gzipped = self.get(PACKAGES_PATH + '.gz', GZIP)
+        plain = self.get(PACKAGES_PATH + '.gz')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(plain.data, PACKAGES)
+        self.assertNotEqual(plain.headers['ETag'], gzipped.headers['ETag'])
+
+        index_cache.clear()
+        response = self.get(PACKAGES_PATH + '.gz')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(response.data, PACKAGES)
+
+    def test_plain_file_is_compressed(self):
+        """Plain upstream files are gzipped on the fly, with the same bytes once cached"""
+        first = self.get(PACKAGES_PATH, GZIP)
+        self.assertEqual(first.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(first.data), PACKAGES)
+        self.assertLess(len(first.data), len(PACKAGES) // 5)
+
+        second = self.get(PACKAGES_PATH, GZIP)
+        self.assertEqual(second.headers['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+
+    def test_if_none_match(self):
+        """A client that has the current copy gets a 304, also after upstream revalidation"""
+        first = self.get(PACKAGES_PATH + '.gz', GZIP)
+        first.get_data()
+        etag = first.headers['ETag']
+        self.assertIn('max-age=', self.get(PACKAGES_PATH + '.gz', GZIP).headers['Cache-Control'])
+
+        response = self.get(PACKAGES_PATH + '.gz', dict(GZIP, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        index_cache.get(self.mirror.url + PACKAGES_PATH + '.gz').fetched_at -= index_cache.ttl + 1
+        response = self.get(PACKAGES_PATH + '.gz', dict(GZIP, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['X-Cache'], 'REVALIDATED')
+
+        response = self.get(PACKAGES_PATH + '.gz', {'If-None-Match': '"other"'})
+        self.assertEqual(response.status_code, 200)
+
+
+class TestApiCompression(unittest.TestCase):
+    """Test compression and ETags on JSON API responses"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        parsed_indexes.clear()
+        self.mirror = LocalMirror({PACKAGES_PATH: PACKAGES}).__enter__()
+        self.params = {
+            'repo': self.mirror.url + '/debian',
+            'dist': 'bookworm',
+            'component': 'main',
+            'arch': 'amd64',
+            'per_page': 100,
+        }
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+
+    def test_gzip_and_not_modified(self):
+        """Large JSON pages are gzipped and repeat requests get a 304"""
+        response = self.app.get('/api/packages', query_string=self.params, headers=GZIP)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        self.assertIn(b'"total_packages"', gzip.decompress(response.data))
+
+        again = self.app.get('/api/packages', query_string=self.params,
+                             headers=dict(GZIP, **{'If-None-Match': response.headers['ETag']}))
+        self.assertEqual(again.status_code, 304)
+
+    def test_small_responses_are_not_compressed(self):
+        """Small bodies and clients without gzip support get identity responses"""
+        self.assertNotIn('Content-Encoding', self.app.get('/config', headers=GZIP).headers)
+        response = self.app.get('/api/packages', query_string=self.params)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('ETag', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
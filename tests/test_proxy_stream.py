@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+import gzip
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, index_cache
+from lib.apt_parser import AptParser
+from lib.upstream import iter_gunzip
+from mirror import LocalMirror
+
+PACKAGES_PATH = '/debian/dists/bookworm/main/binary-amd64/Packages'
+
+
+def make_packages(count):
+    """Build a synthetic Packages file with ``count`` stanzas"""
+    stanzas = []
+    for i in range(count):
+        stanzas.append(
+            f"Package: pkg{i:05d}\n"
+            f"Version: 1.{i}-1\n"
+            f"Architecture: amd64\n"
+            f"Filename: pool/main/p/pkg{i:05d}/pkg{i:05d}_1.{i}-1_amd64.deb\n"
+        )
+    return '\n'.join(stanzas).encode('utf-8')
+
+
+class TestProxyStream(unittest.TestCase):
+    """Test the streaming /proxy endpoint against a local mirror"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.packages = make_packages(2000)
+        cls.mirror = LocalMirror({
+            PACKAGES_PATH: cls.packages,
+            PACKAGES_PATH + '.gz': gzip.compress(cls.packages),
+            '/debian/dists/bookworm/Release.gz': b'Origin: Debian\n',
+        }).__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mirror.__exit__(None, None, None)
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+
+    def test_plain_file_is_streamed(self):
+        """A plain Packages file is passed through unchanged as a stream"""
+        response = self.app.get('/proxy', query_string={'url': self.mirror.url + PACKAGES_PATH})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.data, self.packages)
+
+    def test_gzip_file_is_inflated_incrementally(self):
+        """A gzipped Packages file is decompressed on the fly"""
+        response = self.app.get('/proxy', query_string={'url': self.mirror.url + PACKAGES_PATH + '.gz'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.data, self.packages)
+        self.assertEqual(len(AptParser.parse_packages(response.data.decode('utf-8'))), 2000)
+
+    def test_corrupt_gzip_returns_error(self):
+        """Content that is not gzip still produces a 500 before streaming starts"""
+        response = self.app.get('/proxy', query_string={'url': self.mirror.url + '/debian/dists/bookworm/Release.gz'})
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('Error decompressing', response.get_json()['error'])
+
+    def test_missing_file_passes_status_through(self):
+        """Upstream 404 responses keep their status code"""
+        response = self.app.get('/proxy', query_string={'url': self.mirror.url + '/debian/missing'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_iter_gunzip_handles_small_chunks_and_members(self):
+        """Decompression works across chunk boundaries and gzip members"""
+        data = gzip.compress(b'first\n') + gzip.compress(b'second\n')
+        chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+        self.assertEqual(b''.join(iter_gunzip(chunks)), b'first\nsecond\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import unittest
+import os
+import sys
+import bz2
+import gzip
+import hashlib
+import lzma
+from unittest import mock
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, index_cache, parsed_indexes
+from lib.apt_parser import AptParser
+from mirror import LocalMirror
+
+PACKAGES = ''.join(
+    f"Package: pkg{i}\nVersion: 1.{i}\nFilename: pool/main/p/pkg{i}/pkg{i}_1.{i}_amd64.deb\n\n"
+    for i in range(200)
+).encode('utf-8')
+
+VARIANTS = {
+    '': PACKAGES,
+    '.gz': gzip.compress(PACKAGES),
+    '.xz': lzma.compress(PACKAGES),
+    '.bz2': bz2.compress(PACKAGES),
+}
+
+DIST_PATH = '/debian/dists/bookworm'
+
+
+def make_release(variants, by_hash=False):
+    """A Release file listing the given Packages variants in its SHA256 section"""
+    lines = [
+        'Origin: Debian',
+        'Suite: stable',
+        'Codename: bookworm',
+        'Architectures: amd64',
+        'Components: main',
+    ]
+    if by_hash:
+        lines.append('Acquire-By-Hash: yes')
+    lines.append('MD5Sum:')
+    for extension, data in variants.items():
+        lines.append(f' {hashlib.md5(data).hexdigest()} {len(data)} main/binary-amd64/Packages{extension}')
+    lines.append('SHA256:')
+    for extension, data in variants.items():
+        lines.append(f' {hashlib.sha256(data).hexdigest()} {len(data)} main/binary-amd64/Packages{extension}')
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class TestParseReleaseChecksums(unittest.TestCase):
+    """Test parsing of the checksum sections of Release files"""
+
+    def test_checksum_index(self):
+        """Each listed path maps to its size and hash"""
+        info = AptParser.parse_release_file(make_release(VARIANTS).decode('utf-8'))
+        checksums = AptParser.parse_release_checksums(info)
+        self.assertEqual(len(checksums), 4)
+        self.assertEqual(checksums['main/binary-amd64/Packages.xz'],
+                         (len(VARIANTS['.xz']), hashlib.sha256(VARIANTS['.xz']).hexdigest()))
+        md5sums = AptParser.parse_release_checksums(info, 'MD5Sum')
+        self.assertEqual(md5sums['main/binary-amd64/Packages'][1], hashlib.md5(PACKAGES).hexdigest())
+        # Fields before the checksum sections are unaffected
+        self.assertEqual(info['Components'], ['main'])
+
+
+class TestReleaseChecksumSelection(unittest.TestCase):
+    """Test that Packages files are chosen and cached using Release checksums"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        parsed_indexes.clear()
+        self.smallest = min(VARIANTS, key=lambda extension: len(VARIANTS[extension]))
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+
+    def start_mirror(self, files):
+        self.mirror = LocalMirror(files).__enter__()
+        self.params = {'repo': self.mirror.url + '/debian', 'dist': 'bookworm',
+                       'component': 'main', 'arch': 'amd64'}
+
+    def test_smallest_variant_is_used(self):
+        """The smallest listed compression is downloaded and decompressed"""
+        files = {DIST_PATH + '/Release': make_release(VARIANTS)}
+        for extension, data in VARIANTS.items():
+            files[f'{DIST_PATH}/main/binary-amd64/Packages{extension}'] = data
+        self.start_mirror(files)
+
+        data = self.app.get('/api/packages', query_string=self.params).get_json()
+        self.assertTrue(data['url'].endswith('/Packages' + self.smallest))
+        self.assertEqual(data['total_packages'], 200)
+        self.assertEqual(self.mirror.hits(f'{DIST_PATH}/main/binary-amd64/Packages'), 1 if self.smallest == '' else 0)
+
+    def test_by_hash_and_unchanged_files(self):
+        """by-hash locations are used, and unchanged hashes skip the download"""
+        digest = hashlib.sha256(VARIANTS['.xz']).hexdigest()
+        by_hash_path = f'{DIST_PATH}/main/binary-amd64/by-hash/SHA256/{digest}'
+        self.start_mirror({
+            DIST_PATH + '/Release': make_release({'.xz': VARIANTS['.xz']}, by_hash=True),
+            by_hash_path: VARIANTS['.xz'],
+        })
+
+        data = self.app.get('/api/packages', query_string=self.params).get_json()
+        self.assertEqual(data['total_packages'], 200)
+        self.assertEqual(self.mirror.hits(by_hash_path), 1)
+
+        # The Release file goes stale but is unchanged: nothing is downloaded again
+        release_entry = index_cache.get(self.mirror.url + DIST_PATH + '/Release')
+        release_entry.fetched_at -= index_cache.ttl + 1
+        parsed_indexes.clear()
+        data = self.app.get('/api/packages', query_string=self.params).get_json()
+        self.assertEqual(data['total_packages'], 200)
+        self.assertEqual(self.mirror.hits(by_hash_path), 1)
+        self.assertEqual(self.mirror.hits(DIST_PATH + '/Release'), 2)
+
+    def test_release_is_parsed_once(self):
+        """Warm requests and merged selections reuse the parsed Release file"""
+        files = {DIST_PATH + '/Release': make_release(VARIANTS)}
+        for extension, data in VARIANTS.items():
+            files[f'{DIST_PATH}/main/binary-amd64/Packages{extension}'] = data
+        self.start_mirror(files)
+        with mock.patch.object(AptParser, 'parse_release_file', wraps=AptParser.parse_release_file) as parse:
+            self.app.get('/api/packages', query_string=self.params)
+            self.app.get('/api/packages', query_string=dict(self.params, q='pkg1'))
+            data = self.app.get('/api/packages', query_string=dict(self.params, component='all',
+                                                                     arch='amd64,arm64')).get_json()
+        self.assertEqual(data['missing'], [{'component': 'main', 'arch': 'arm64'}])
+        self.assertEqual(parse.call_count, 1)
+
+    def test_fallbacks(self):
+        """Unserved or corrupt variants fall back to the next candidate"""
+        self.start_mirror({
+            DIST_PATH + '/Release': make_release(VARIANTS),
+            # The smallest variants are missing or do not match their checksum
+            f'{DIST_PATH}/main/binary-amd64/Packages.xz': lzma.compress(b'Package: other\n'),
+            f'{DIST_PATH}/main/binary-amd64/Packages': PACKAGES,
+        })
+        data = self.app.get('/api/packages', query_string=self.params).get_json()
+        self.assertTrue(data['url'].endswith('/Packages'))
+        self.assertEqual(data['total_packages'], 200)
+
+
+class TestStreamedIndex(unittest.TestCase):
+    """Test that Packages files larger than the cache budget are parsed while downloading"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        index_cache.clear()
+        parsed_indexes.clear()
+        self.max_bytes = index_cache.max_bytes
+        index_cache.max_bytes = len(PACKAGES) // 2
+
+    def tearDown(self):
+        index_cache.max_bytes = self.max_bytes
+
+    def test_large_file_is_streamed(self):
+        """The body is parsed from the download, not cached, and the index is reused"""
+        gz_path = f'{DIST_PATH}/main/binary-amd64/Packages.gz'
+        files = {
+            DIST_PATH + '/Release': make_release({'': PACKAGES, '.gz': VARIANTS['.gz']}),
+            gz_path: VARIANTS['.gz'],
+        }
+        with LocalMirror(files) as mirror:
+            params = {'repo': mirror.url + '/debian', 'dist': 'bookworm', 'component': 'main', 'arch': 'amd64'}
+            data = self.app.get('/api/packages', query_string=params).get_json()
+            self.assertEqual(data['total_packages'], 200)
+            self.assertTrue(data['url'].endswith('/Packages.gz'))
+            self.assertIsNone(index_cache.get('SHA256:' + hashlib.sha256(VARIANTS['.gz']).hexdigest()))
+            self.app.get('/api/packages', query_string=dict(params, q='pkg1'))
+            self.assertEqual(mirror.hits(gz_path), 1)
+
+    def test_checksum_mismatch(self):
+        """A streamed file that does not match the Release file is not kept under its checksum"""
+        corrupt = gzip.compress(PACKAGES.replace(b'pkg0\n', b'pkgX\n', 1))
+        with LocalMirror({
+            DIST_PATH + '/Release': make_release({'': PACKAGES, '.gz': VARIANTS['.gz']}),
+            f'{DIST_PATH}/main/binary-amd64/Packages.gz': corrupt,
+        }) as mirror:
+            repo = mirror.url + '/debian'
+            response = self.app.get('/api/packages', query_string={
+                'repo': repo, 'dist': 'bookworm', 'component': 'main', 'arch': 'amd64'
+            })
+            self.assertEqual(response.status_code, 502)
+            version = 'SHA256:' + hashlib.sha256(VARIANTS['.gz']).hexdigest()
+            index_key = AptParser.build_packages_url(repo, 'bookworm', 'main', 'amd64')
+            self.assertIsNone(parsed_indexes.get(index_key, version))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+import os
+import sys
+import gzip
+import io
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, index_cache, parsed_indexes
+from benchmarks.fixtures import generate_packages
+from lib.apt_parser import AptParser
+from lib.package_index import INDEX_FIELDS, PackageIndex, SearchError, TrigramIndex, parse_query
+from mirror import LocalMirror
+
+PACKAGES = """Package: openssl
+Version: 3.0.11-1
+Maintainer: Debian OpenSSL Team <pkg-openssl-devel@alioth-lists.debian.net>
+Provides: libssl-tools
+Description: Secure Sockets Layer toolkit - cryptographic utility
+Filename: pool/main/o/openssl/openssl_3.0.11-1_amd64.deb
+
+Package: libssl3
+Version: 3.0.11-1
+Maintainer: Debian OpenSSL Team <pkg-openssl-devel@alioth-lists.debian.net>
+Description: Secure Sockets Layer toolkit - shared libraries
+Filename: pool/main/o/openssl/libssl3_3.0.11-1_amd64.deb
+
+Package: curl
+Version: 7.88.1-10
+Maintainer: Alessandro Ghedini <ghedo@debian.org>
+Description: command line tool for transferring data with URL syntax
+Filename: pool/main/c/curl/curl_7.88.1-10_amd64.deb
+
+Package: libcurl4
+Version: 7.88.1-10
+Maintainer: Alessandro Ghedini <ghedo@debian.org>
+Provides: libcurl-ssl
+Description: easy-to-use client-side URL transfer library (OpenSSL flavour)
+Filename: pool/main/c/curl/libcurl4_7.88.1-10_amd64.deb
+"""
+
+
+class TestTrigramIndex(unittest.TestCase):
+    """Test the trigram index against a linear scan"""
+
+    def test_matches_linear_scan(self):
+        """Substring and prefix lookups return exactly what a scan finds"""
+        records = AptParser.iter_records(io.BytesIO(generate_packages(2000)), INDEX_FIELDS)
+        names = PackageIndex(records)._lower_names
+        index = TrigramIndex(names)
+        for query in ['lib1', 'core', 'utilslib12', '-gtk', 'lib', 'b', 'zz', 'nothing-like-this']:
+            expected = [i for i, name in enumerate(names) if query in name]
+            self.assertEqual(index.search(query), expected, query)
+            expected = [i for i, name in enumerate(names) if name.startswith(query)]
+            self.assertEqual(index.search(query, prefix=True), expected, query)
+
+    def test_restricted_search(self):
+        """Searching within earlier matches keeps them in ascending order"""
+        index = TrigramIndex(['abcdef', 'xbcdex', 'bcdbcd', 'abc'])
+        self.assertEqual(index.search('bcd'), [0, 1, 2])
+        self.assertEqual(index.search('bcd', within=[1, 2, 3]), [1, 2])
+        self.assertEqual(index.search('ab', within=[1, 3]), [3])
+
+
+class TestSearchQueries(unittest.TestCase):
+    """Test field, prefix and combined queries on a PackageIndex"""
+
+    def setUp(self):
+        self.index = PackageIndex(AptParser.iter_records(io.StringIO(PACKAGES), INDEX_FIELDS))
+
+    def names(self, query):
+        return [self.index.names[i] for i in self.index.search(query)]
+
+    def test_parse_query(self):
+        self.assertEqual(parse_query('  SSL  description:^Secure '),
+                         [('name', 'ssl', False), ('description', 'secure', True)])
+        with self.assertRaises(SearchError):
+            parse_query('homepage:example')
+
+    def test_name_substring_and_prefix(self):
+        self.assertEqual(self.names('ssl'), ['libssl3', 'openssl'])
+        self.assertEqual(self.names('^lib'), ['libcurl4', 'libssl3'])
+        self.assertEqual(self.names('name:^curl'), ['curl'])
+
+    def test_field_queries(self):
+        self.assertEqual(self.names('description:openssl'), ['libcurl4'])
+        self.assertEqual(self.names('maintainer:ghedini'), ['curl', 'libcurl4'])
+        self.assertEqual(self.names('provides:ssl'), ['libcurl4', 'openssl'])
+
+    def test_terms_are_combined(self):
+        self.assertEqual(self.names('lib description:secure'), ['libssl3'])
+        self.assertEqual(self.names('curl maintainer:openssl'), [])
+
+
+class TestSearchApi(unittest.TestCase):
+    """Test search queries through /api/packages"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        index_cache.clear()
+        parsed_indexes.clear()
+        self.mirror = LocalMirror({
+            '/debian/dists/bookworm/main/binary-amd64/Packages.gz': gzip.compress(PACKAGES.encode('utf-8')),
+        }).__enter__()
+        self.params = {
+            'repo': self.mirror.url + '/debian',
+            'dist': 'bookworm',
+            'component': 'main',
+            'arch': 'amd64',
+        }
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+
+    def test_field_query(self):
+        response = self.app.get('/api/packages', query_string=dict(self.params, q='maintainer:openssl'))
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual([pkg['name'] for pkg in data['packages']], ['libssl3', 'openssl'])
+
+    def test_unknown_field(self):
+        response = self.app.get('/api/packages', query_string=dict(self.params, q='homepage:curl'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('homepage', response.get_json()['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import os
+import runpy
+import subprocess
+import sys
+from unittest import mock
+
+# Add the parent directory to the sys.path to import the app module
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from lib.upstream import TIMEOUT
+
+CONFIG = os.path.join(ROOT, 'gunicorn.conf.py')
+SETTINGS = ('BIND', 'PORT', 'WEB_CONCURRENCY', 'GUNICORN_THREADS', 'GUNICORN_TIMEOUT',
+            'GUNICORN_GRACEFUL_TIMEOUT', 'ACCESS_LOG')
+
+
+def load_config(**environment):
+    clean = {key: value for key, value in os.environ.items() if key not in SETTINGS}
+    with mock.patch.dict(os.environ, dict(clean, **environment), clear=True):
+        return runpy.run_path(CONFIG)
+
+
+class TestServerConfig(unittest.TestCase):
+    """Test the gunicorn settings in gunicorn.conf.py"""
+
+    def test_defaults(self):
+        """Threaded workers, sized by CPU count, outlast an upstream read"""
+        config = load_config()
+        self.assertEqual(config['worker_class'], 'gthread')
+        self.assertEqual(config['bind'], '0.0.0.0:5000')
+        self.assertTrue(1 <= config['workers'] <= 8)
+        self.assertTrue(4 <= config['threads'] <= 32)
+        self.assertGreater(config['timeout'], sum(TIMEOUT))
+        self.assertGreaterEqual(config['graceful_timeout'], config['timeout'])
+        self.assertIsNone(config['accesslog'])
+
+    def test_environment_overrides(self):
+        """Worker counts, timeouts and the address come from the environment"""
+        config = load_config(PORT='8080', WEB_CONCURRENCY='3', GUNICORN_THREADS='16',
+                             GUNICORN_TIMEOUT='90', ACCESS_LOG='-')
+        self.assertEqual(config['bind'], '0.0.0.0:8080')
+        self.assertEqual((config['workers'], config['threads'], config['timeout']), (3, 16, 90))
+        self.assertEqual(config['accesslog'], '-')
+        self.assertEqual(load_config(BIND='127.0.0.1:9000', PORT='8080')['bind'], '127.0.0.1:9000')
+
+    def test_worker_exit_stops_prefetch(self):
+        """Exiting workers stop their prefetch scheduler"""
+        scheduler = mock.Mock()
+        config = load_config()
+        with mock.patch.dict(sys.modules, {'app': mock.Mock(prefetch_scheduler=scheduler)}):
+            config['worker_exit'](None, None)
+        scheduler.stop.assert_called_once_with(wait=False)
+
+    def test_master_imports_no_application_code(self):
+        """Loading the settings leaves app.py and lib/ to the workers, so a reload picks up changes"""
+        script = ('import runpy, sys; runpy.run_path(sys.argv[1]); '
+                  'print(",".join(name for name in sys.modules if name == "app" or name.startswith("lib.")))')
+        output = subprocess.run([sys.executable, '-c', script, CONFIG], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout
+        self.assertEqual(output.strip(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
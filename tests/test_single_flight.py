@@ -0,0 +1,199 @@
+import unittest
+import os
+import sys
+import gzip
+import threading
+import time
+from unittest import mock
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, index_cache, parsed_indexes, proxy_streams
+from lib.apt_parser import AptParser
+from lib.cache import SingleFlight
+from lib.upstream import SharedStream
+from mirror import LocalMirror
+
+PACKAGES_PATH = '/debian/dists/bookworm/main/binary-amd64/Packages'
+
+PACKAGES = ''.join(
+    f"Package: pkg{i}\nVersion: 1.{i}-1\nFilename: pool/main/p/pkg{i}/pkg{i}_1.{i}-1_amd64.deb\n\n"
+    for i in range(3000)
+).encode('utf-8')
+
+
+def run_concurrently(function, count):
+    """Call ``function`` from ``count`` threads at once and return the results"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        results[i] = function()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test deduplication of concurrent calls"""
+
+    def test_concurrent_calls_share_one_run(self):
+        """Callers arriving during a run get its result instead of running again"""
+        flights = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return object()
+
+        results = run_concurrently(lambda: flights.do('key', slow), 8)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertFalse(flights.in_flight('key'))
+
+    def test_errors_are_shared(self):
+        """Waiters receive the exception raised by the running call"""
+        flights = SingleFlight()
+
+        def failing():
+            time.sleep(0.1)
+            raise ValueError('upstream down')
+
+        def call():
+            try:
+                flights.do('key', failing)
+            except ValueError as e:
+                return str(e)
+
+        self.assertEqual(run_concurrently(call, 4), ['upstream down'] * 4)
+
+
+class TestSharedStream(unittest.TestCase):
+    """Test one body read by several consumers"""
+
+    def test_late_reader_gets_whole_body(self):
+        """A reader joining mid-stream still starts at the first chunk"""
+        stream = SharedStream(iter([b'a', b'b', b'c']))
+        first = stream.reader()
+        self.assertEqual(next(first), b'a')
+        second = stream.reader()
+        self.assertEqual(b''.join(first), b'bc')
+        self.assertEqual(b''.join(second), b'abc')
+        self.assertTrue(stream.complete)
+
+    def test_abandoned_stream(self):
+        """Once every reader leaves early the source is closed and no one can join"""
+        closed = []
+
+        def chunks():
+            try:
+                yield b'a'
+                yield b'b'
+            finally:
+                closed.append(True)
+
+        finished = []
+        stream = SharedStream(chunks(), on_finish=finished.append)
+        reader = stream.reader()
+        next(reader)
+        reader.close()
+        self.assertEqual(closed, [True])
+        self.assertEqual(finished, [stream])
+        self.assertIsNone(stream.reader())
+
+    def test_buffer_is_bounded(self):
+        """Past max_buffer no one can join and chunks every reader has are dropped"""
+        stream = SharedStream(iter([b'x'] * 100), max_buffer=10)
+        first, second = stream.reader(), stream.reader()
+        kept = []
+        for _ in range(50):
+            next(first)
+            next(second)
+            kept.append(len(stream.buffer))
+        self.assertFalse(stream.joinable)
+        self.assertIsNone(stream.reader())
+        self.assertLessEqual(max(kept[11:]), 1)
+        # A reader that falls behind holds on to what it has not read yet
+        for _ in range(20):
+            next(first)
+        self.assertEqual(len(stream.buffer), 20)
+        second.close()
+        self.assertEqual(len(b''.join(first)), 30)
+        self.assertEqual(stream.buffer, [])
+        self.assertTrue(stream.complete)
+
+
+class TestCoalescedRequests(unittest.TestCase):
+    """Test that concurrent identical requests share one upstream download"""
+
+    def setUp(self):
+        index_cache.clear()
+        parsed_indexes.clear()
+        self.mirror = LocalMirror({
+            PACKAGES_PATH: PACKAGES,
+            PACKAGES_PATH + '.gz': gzip.compress(PACKAGES),
+        }, delay=0.2).__enter__()
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+
+    def test_proxy_requests_share_download(self):
+        """A burst of /proxy requests for one file makes one upstream request"""
+        url = self.mirror.url + PACKAGES_PATH + '.gz'
+
+        def get():
+            response = app.test_client().get('/proxy', query_string={'url': url})
+            return response.status_code, response.data
+
+        results = run_concurrently(get, 8)
+        self.assertEqual(results, [(200, PACKAGES)] * 8)
+        self.assertEqual(self.mirror.hits(PACKAGES_PATH + '.gz'), 1)
+        self.assertEqual(index_cache.get(url).body, PACKAGES)
+        self.assertNotIn(url, proxy_streams)
+
+    def test_large_proxy_body_is_not_kept(self):
+        """A body larger than the cache budget is not kept in memory while it is streamed"""
+        url = self.mirror.url + PACKAGES_PATH
+        max_bytes = index_cache.max_bytes
+        index_cache.max_bytes = len(PACKAGES) // 4
+        try:
+            response = app.test_client().get('/proxy', query_string={'url': url}, buffered=False)
+            body = iter(response.response)
+            received = b''
+            while len(received) < len(PACKAGES) // 2:
+                received += next(body)
+            stream = proxy_streams[url][0]
+            self.assertLessEqual(sum(len(chunk) for chunk in stream.buffer), 64 * 1024)
+            self.assertFalse(stream.joinable)
+            # A request arriving now downloads the file on its own
+            late = app.test_client().get('/proxy', query_string={'url': url})
+            self.assertEqual(late.data, PACKAGES)
+            self.assertEqual(self.mirror.hits(PACKAGES_PATH), 2)
+            received += b''.join(body)
+            response.close()
+        finally:
+            index_cache.max_bytes = max_bytes
+        self.assertEqual(received, PACKAGES)
+        self.assertIsNone(index_cache.get(url))
+
+    def test_api_requests_share_download_and_parse(self):
+        """A burst of /api/packages requests downloads and parses the file once"""
+        params = {'repo': self.mirror.url + '/debian', 'dist': 'bookworm', 'component': 'main', 'arch': 'amd64'}
+        with mock.patch.object(AptParser, 'iter_records', wraps=AptParser.iter_records) as iter_records:
+            results = run_concurrently(
+                lambda: app.test_client().get('/api/packages', query_string=params).get_json()['total_packages'], 6
+            )
+        self.assertEqual(results, [3000] * 6)
+        self.assertEqual(self.mirror.hits(PACKAGES_PATH), 1)
+        self.assertEqual(iter_records.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+import time
+
+# Add the parent directory to the sys.path to import the app module
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, index_cache
+from lib.upstream import UpstreamError, configure_pool, get_session, open_upstream
+from mirror import LocalMirror
+
+
+class TestUpstreamPool(unittest.TestCase):
+    """Test that upstream requests reuse pooled keep-alive connections"""
+
+    def setUp(self):
+        self.mirror = LocalMirror({
+            '/debian/dists/bookworm/Release': b'Origin: Debian\n',
+            '/debian/dists/bookworm/main/binary-amd64/Packages': b'Package: hello\n',
+        }).__enter__()
+
+    def tearDown(self):
+        self.mirror.__exit__(None, None, None)
+
+    def test_sequential_requests_share_a_connection(self):
+        """Back-to-back requests to one mirror reuse the same connection"""
+        for path in ('/debian/dists/bookworm/Release',
+                     '/debian/dists/bookworm/main/binary-amd64/Packages',
+                     '/debian/dists/bookworm/Release'):
+            response = open_upstream(self.mirror.url + path)
+            response.content
+            response.close()
+        self.assertEqual(len(set(self.mirror.clients)), 1)
+
+    def test_proxy_requests_share_a_connection(self):
+        """Release and Packages fetched through /proxy reuse one connection"""
+        client = app.test_client()
+        index_cache.clear()
+        client.get('/proxy', query_string={'url': self.mirror.url + '/debian/dists/bookworm/Release'}).get_data()
+        client.get('/proxy', query_string={
+            'url': self.mirror.url + '/debian/dists/bookworm/main/binary-amd64/Packages'
+        }).get_data()
+        self.assertEqual(len(self.mirror.clients), 2)
+        self.assertEqual(len(set(self.mirror.clients)), 1)
+
+    def test_configure_pool_sets_limits(self):
+        """Pool size and per-host limits are applied to the shared session"""
+        previous = get_session()
+        try:
+            session = configure_pool(pool_hosts=3, per_host=7)
+            adapter = session.get_adapter('https://deb.debian.org/')
+            self.assertEqual(adapter._pool_connections, 3)
+            self.assertEqual(adapter._pool_maxsize, 7)
+            self.assertTrue(adapter._pool_block)
+            self.assertEqual(adapter.pool_timeout, 10)
+            self.assertIs(get_session(), session)
+        finally:
+            configure_pool()
+            self.assertIsNot(get_session(), previous)
+
+    def test_busy_pool_times_out(self):
+        """Requests give up with a 503 when every connection to a mirror stays busy"""
+        client = app.test_client()
+        index_cache.clear()
+        release_url = self.mirror.url + '/debian/dists/bookworm/Release'
+        try:
+            configure_pool(per_host=1, pool_timeout=0.2)
+            held = open_upstream(release_url)
+            try:
+                started = time.monotonic()
+                with self.assertRaises(UpstreamError) as raised:
+                    open_upstream(self.mirror.url + '/debian/dists/bookworm/main/binary-amd64/Packages')
+                self.assertEqual(raised.exception.status_code, 503)
+                self.assertLess(time.monotonic() - started, 5)
+                self.assertEqual(client.get('/proxy', query_string={'url': release_url}).status_code, 503)
+            finally:
+                held.close()
+            self.assertEqual(client.get('/proxy', query_string={'url': release_url}).status_code, 200)
+        finally:
+            configure_pool()
+
+
+if __name__ == '__main__':
+    unittest.main()